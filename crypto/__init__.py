@@ -1,24 +1,39 @@
-from crypto.crypto_logger import CryptoLogger
-from crypto.crypto_exception import CryptoException
-from crypto.key_generator import KeyGenerator
-from crypto.generator import Generator
-from crypto.cipher_core import CipherCore
-from crypto.crypto_core import CryptoCoreCLI
-from crypto.file_processor import FileProcessor
+import importlib
 
-# Новые импорты для режимов
-from crypto.modes import CBCMode, CFBMode, OFBMode, CTRMode
+# Подмодули загружаются при первом обращении к имени (PEP 562): импорт пакета
+# не тянет psutil, asyncio, pycryptodome и CLI, пока они не понадобятся
+_EXPORTS = {
+    'CryptoLogger': 'crypto.crypto_logger',
+    'CryptoException': 'crypto.crypto_exception',
+    'KeyGenerator': 'crypto.key_generator',
+    'KeyDerivation': 'crypto.kdf',
+    'Generator': 'crypto.generator',
+    'CipherCore': 'crypto.cipher_core',
+    'CipherContext': 'crypto.cipher_core',
+    'CryptoCoreCLI': 'crypto.crypto_core',
+    'FileProcessor': 'crypto.file_processor',
+    'EncryptedFile': 'crypto.encrypted_file',
+    'Container': 'crypto.container',
+    'ContainerReader': 'crypto.container',
+    'AsyncCipherStream': 'crypto.async_cipher',
+    # Режимы
+    'CBCMode': 'crypto.modes',
+    'CFBMode': 'crypto.modes',
+    'OFBMode': 'crypto.modes',
+    'CTRMode': 'crypto.modes'
+}
 
-__all__ = [
-    'CryptoLogger',
-    'CryptoException',
-    'KeyGenerator',
-    'Generator',
-    'CipherCore',
-    'CryptoCoreCLI',
-    'FileProcessor',
-    'CBCMode',
-    'CFBMode',
-    'OFBMode',
-    'CTRMode'
-]
\ No newline at end of file
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
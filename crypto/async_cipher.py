@@ -0,0 +1,158 @@
+import asyncio
+from crypto.cipher_core import CipherCore
+
+_END_OF_STREAM = object()
+
+
+class AsyncCipherStream:
+    """
+    Асинхронное шифрование/дешифрование потоков для asyncio-сервисов
+
+    Источник (asyncio.StreamReader или асинхронный итератор байтов) читается
+    фоновой задачей и нарезается на фрагменты chunk_size. Фрагменты
+    обрабатываются в пуле потоков (executor), поэтому цикл событий не
+    блокируется. Очередь между чтением и шифрованием ограничена
+    max_in_flight фрагментами: при медленном потребителе чтение источника
+    приостанавливается (обратное давление).
+
+    Пример:
+        stream = AsyncCipherStream(key, 'ctr')
+        async for piece in stream.encrypt(request.content):
+            await response.write(piece)
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, key: bytes, mode: str = 'ctr', iv: bytes = None,
+                 chunk_size: int = CHUNK_SIZE, max_in_flight: int = 4,
+                 executor=None):
+        """
+        Args:
+            key: ключ шифрования
+            mode: режим работы ('ecb', 'cbc', 'cfb', 'ofb', 'ctr')
+            iv: вектор инициализации; при дешифровании без IV он читается
+                из первых 16 байт потока
+            chunk_size: размер обрабатываемого фрагмента (кратен 16 байтам)
+            max_in_flight: максимальное число прочитанных, но еще не
+                           обработанных фрагментов
+            executor: пул для CPU-работы (None - пул цикла событий по умолчанию)
+        """
+        if chunk_size <= 0 or chunk_size % CipherCore.BLOCK_SIZE != 0:
+            raise ValueError(
+                f"Chunk size must be a positive multiple of "
+                f"{CipherCore.BLOCK_SIZE} bytes. Got {chunk_size}"
+            )
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+
+        self.key = key
+        self.mode = mode.lower()
+        self.iv = iv
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight
+        self.executor = executor
+
+    async def _iterate(self, source):
+        """Единый асинхронный итератор для StreamReader и async-итераторов"""
+        if hasattr(source, '__aiter__'):
+            async for data in source:
+                yield data
+        else:
+            while True:
+                data = await source.read(self.chunk_size)
+                if not data:
+                    return
+                yield data
+
+    async def _read_chunks(self, source, queue: asyncio.Queue, skip: int):
+        """Нарезка источника на фрагменты chunk_size (блокируется при полной очереди)"""
+        try:
+            buffer = bytearray()
+            async for data in self._iterate(source):
+                buffer += data
+                while len(buffer) >= skip + self.chunk_size:
+                    await queue.put(bytes(buffer[:skip + self.chunk_size]))
+                    del buffer[:skip + self.chunk_size]
+                    skip = 0
+            if buffer:
+                await queue.put(bytes(buffer))
+            await queue.put(_END_OF_STREAM)
+        except Exception as e:
+            await queue.put(e)
+
+    async def _process(self, source, encrypt: bool):
+        """Общий конвейер: чтение -> ограниченная очередь -> executor"""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.max_in_flight)
+        read_iv = not encrypt and self.mode != 'ecb' and self.iv is None
+        reader = asyncio.ensure_future(self._read_chunks(
+            source, queue, CipherCore.BLOCK_SIZE if read_iv else 0
+        ))
+
+        async def next_item():
+            item = await queue.get()
+            if isinstance(item, Exception):
+                raise item
+            return item
+
+        try:
+            # IV вызова хранится локально: self.iv остается настройкой потока,
+            # иначе следующий encrypt() повторил бы IV (двойной гаммы в CTR/OFB)
+            iv = self.iv
+            chunk = await next_item()
+            if read_iv:
+                if chunk is _END_OF_STREAM or len(chunk) < CipherCore.BLOCK_SIZE:
+                    raise ValueError("Invalid IV in stream: expected 16 bytes")
+                iv, chunk = chunk[:CipherCore.BLOCK_SIZE], chunk[CipherCore.BLOCK_SIZE:]
+
+            cipher = CipherCore(self.key, self.mode, iv)
+            if encrypt:
+                iv = cipher.get_iv()
+                if iv is not None:
+                    yield iv
+            transform = cipher.encrypt_chunk if encrypt else cipher.decrypt_chunk
+
+            if chunk is _END_OF_STREAM:
+                chunk = b''
+            else:
+                # Держим один фрагмент, пока не станет ясно, последний ли он
+                while True:
+                    following = await next_item()
+                    if following is _END_OF_STREAM:
+                        break
+                    yield await loop.run_in_executor(
+                        self.executor, transform, chunk, False
+                    )
+                    chunk = following
+
+            result = await loop.run_in_executor(self.executor, transform, chunk, True)
+            if result:
+                yield result
+        finally:
+            reader.cancel()
+
+    def encrypt(self, source):
+        """
+        Шифрование потока: асинхронный итератор фрагментов шифртекста
+
+        Для режимов кроме ECB первым фрагментом выдается IV - формат
+        совпадает с файлами FileProcessor. Если IV не задан в конструкторе,
+        каждый вызов генерирует новый.
+        """
+        return self._process(source, True)
+
+    def decrypt(self, source):
+        """Дешифрование потока: асинхронный итератор фрагментов открытого текста"""
+        return self._process(source, False)
+
+
+async def encrypt_stream(source, key: bytes, mode: str = 'ctr', **kwargs):
+    """Асинхронное шифрование потока (см. AsyncCipherStream)"""
+    async for piece in AsyncCipherStream(key, mode, **kwargs).encrypt(source):
+        yield piece
+
+
+async def decrypt_stream(source, key: bytes, mode: str = 'ctr', **kwargs):
+    """Асинхронное дешифрование потока (см. AsyncCipherStream)"""
+    async for piece in AsyncCipherStream(key, mode, **kwargs).decrypt(source):
+        yield piece
@@ -0,0 +1,62 @@
+import hashlib
+import hmac
+
+
+class StreamAuthenticator:
+    """
+    Потоковый HMAC-SHA256 для схемы encrypt-then-MAC
+
+    MAC вычисляется по мере записи/чтения шифртекста (заголовок, IV и все
+    фрагменты), поэтому отдельный второй проход по файлу не нужен. Ключ MAC
+    получается из ключа шифрования через HMAC с меткой домена: один и тот же
+    ключ не используется напрямую и для AES, и для HMAC.
+    """
+
+    TAG_SIZE = 32  # HMAC-SHA256
+    _MAC_KEY_LABEL = b'CryptoCore encrypt-then-MAC HMAC-SHA256 key'
+
+    def __init__(self, key: bytes):
+        mac_key = hmac.digest(key, self._MAC_KEY_LABEL, 'sha256')
+        self._mac = hmac.new(mac_key, digestmod=hashlib.sha256)
+
+    def update(self, data: bytes):
+        """Добавление очередной части аутентифицируемых данных"""
+        self._mac.update(data)
+
+    def finalize(self) -> bytes:
+        """Тег по всем переданным данным"""
+        return self._mac.digest()
+
+    @staticmethod
+    def compare(expected: bytes, tag: bytes) -> bool:
+        """Сравнение тегов за постоянное время"""
+        return tag is not None and hmac.compare_digest(expected, tag)
+
+    def verify(self, tag: bytes):
+        """Проверка тега за постоянное время"""
+        if not self.compare(self._mac.digest(), tag):
+            raise ValueError(
+                "Authentication failed: wrong key or the data has been modified"
+            )
+
+    def wrap_encrypt(self, transform):
+        """Функция фрагмента шифрования, добавляющая шифртекст в MAC"""
+        def encrypt_chunk(chunk, final=False):
+            result = transform(chunk, final)
+            self._mac.update(result)
+            return result
+        return encrypt_chunk
+
+    def wrap_decrypt(self, transform, tag: bytes):
+        """
+        Функция фрагмента дешифрования, добавляющая шифртекст в MAC
+
+        Тег проверяется до дешифрования последнего фрагмента, поэтому
+        при подмене данных ошибка паддинга не маскирует ошибку аутентификации.
+        """
+        def decrypt_chunk(chunk, final=False):
+            self._mac.update(chunk)
+            if final:
+                self.verify(tag)
+            return transform(chunk, final)
+        return decrypt_chunk
@@ -0,0 +1,207 @@
+import fnmatch
+import os
+import time
+from crypto.cipher_core import CipherCore
+from crypto.crypto_logger import CryptoLogger
+from crypto.file_processor import FileProcessor
+from crypto.kdf import KeyDerivation
+from crypto.key_generator import KeyGenerator
+from crypto.metrics import Metrics
+
+
+def _process_one(input_path: str, output_path: str, key: bytes, mode: str,
+                 encrypt: bool, iv: bytes, chunk_size: int, password: str = None,
+                 kdf: str = KeyDerivation.DEFAULT_KDF, kdf_params: tuple = None,
+                 key_length: int = KeyGenerator.KEY_LENGTH,
+                 authenticate: bool = False, container: bool = False,
+                 sync: bool = False) -> dict:
+    """Обработка одного файла пакета (выполняется в процессе пула)"""
+    start_time = time.time()
+    try:
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        FileProcessor.process_file(input_path, output_path, key, mode, encrypt,
+                                   iv=iv, chunk_size=chunk_size, password=password,
+                                   kdf=kdf, kdf_params=kdf_params,
+                                   key_length=key_length,
+                                   authenticate=authenticate,
+                                   container=container, sync=sync)
+        error = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+
+    return {
+        'input': input_path,
+        'output': output_path,
+        # Объем неудачного файла не входит в сводку и пропускную способность
+        'bytes': os.path.getsize(input_path) if error is None else 0,
+        'elapsed': time.time() - start_time,
+        'error': error
+    }
+
+
+def _process_pooled(*task) -> dict:
+    """_process_one в процессе пула: метрики файла возвращаются родителю"""
+    Metrics.reset()
+    result = _process_one(*task)
+    result['metrics'] = Metrics.snapshot()
+    return result
+
+
+class BatchProcessor:
+    """Пакетная обработка каталогов в пуле процессов"""
+
+    @staticmethod
+    def _matches(relative_path: str, patterns: list) -> bool:
+        """Совпадает ли относительный путь или имя файла с одним из шаблонов"""
+        name = os.path.basename(relative_path)
+        return any(fnmatch.fnmatch(relative_path, pattern) or
+                   fnmatch.fnmatch(name, pattern)
+                   for pattern in patterns)
+
+    @staticmethod
+    def collect_files(input_dir: str, include: list = None, exclude: list = None,
+                      skip_dir: str = None) -> list:
+        """
+        Рекурсивный обход каталога
+
+        Возвращает список (относительный путь, размер), отсортированный по
+        убыванию размера: крупные файлы запускаются первыми, мелкие
+        заполняют простаивающие процессы в конце пакета.
+        """
+        skip_dir = os.path.abspath(skip_dir) if skip_dir else None
+        files = []
+
+        for root, dirs, names in os.walk(input_dir):
+            dirs[:] = sorted(d for d in dirs
+                             if os.path.abspath(os.path.join(root, d)) != skip_dir)
+            for name in names:
+                path = os.path.join(root, name)
+                relative_path = os.path.relpath(path, input_dir).replace(os.sep, '/')
+                if include and not BatchProcessor._matches(relative_path, include):
+                    continue
+                if exclude and BatchProcessor._matches(relative_path, exclude):
+                    continue
+                if os.path.isfile(path):
+                    files.append((relative_path, os.path.getsize(path)))
+
+        files.sort(key=lambda item: (-item[1], item[0]))
+        return files
+
+    @staticmethod
+    def default_output_dir(input_dir: str, encrypt: bool, mode: str) -> str:
+        """Каталог результатов по умолчанию рядом с исходным"""
+        input_dir = os.path.normpath(input_dir)
+        return input_dir + (f'.{mode}.enc' if encrypt else '.dec')
+
+    @staticmethod
+    def output_name(relative_path: str, encrypt: bool, mode: str) -> str:
+        """Имя файла результата с зеркалированием структуры каталогов"""
+        if encrypt:
+            return relative_path + f'.{mode}.enc'
+        for suffix in (f'.{mode}.enc', '.enc'):
+            if relative_path.endswith(suffix):
+                return relative_path[:-len(suffix)]
+        return relative_path + '.dec'
+
+    @staticmethod
+    def process_directory(input_dir: str, output_dir: str, key: bytes, mode: str,
+                          encrypt: bool, iv: bytes = None, include: list = None,
+                          exclude: list = None, jobs: int = 1,
+                          chunk_size: int = None, password: str = None,
+                          kdf: str = KeyDerivation.DEFAULT_KDF,
+                          kdf_params: tuple = None,
+                          key_length: int = KeyGenerator.KEY_LENGTH,
+                          authenticate: bool = False,
+                          container: bool = False, sync: bool = False) -> dict:
+        """
+        Шифрование/дешифрование всех файлов каталога
+
+        Ошибка в отдельном файле не прерывает пакет: она попадает в сводку,
+        а результат пишется атомарно (OutputFile), поэтому частичный файл не
+        появляется и прежний не портится. Аварийное завершение процесса пула
+        (BrokenProcessPool) тоже записывается ошибкой каждого незавершенного
+        файла. При шифровании по
+        паролю параметры KDF калибруются один раз на весь пакет, соль у
+        каждого файла своя.
+
+        Returns:
+            сводка: число файлов, суммарный объем, время, пропускная
+            способность и список ошибок по файлам
+        """
+        if not os.path.isdir(input_dir):
+            raise NotADirectoryError(f"Input directory not found: {input_dir}")
+
+        output_dir = output_dir or BatchProcessor.default_output_dir(
+            input_dir, encrypt, mode
+        )
+        if password is not None and encrypt and kdf_params is None:
+            kdf_params = KeyDerivation.calibrate(kdf)
+
+        files = BatchProcessor.collect_files(input_dir, include, exclude,
+                                             skip_dir=output_dir)
+        tasks = [(os.path.join(input_dir, relative_path),
+                  os.path.join(output_dir, BatchProcessor.output_name(
+                      relative_path, encrypt, mode)),
+                  key, mode, encrypt, iv, chunk_size, password, kdf, kdf_params,
+                  key_length, authenticate, container, sync)
+                 for relative_path, _ in files]
+
+        CryptoLogger.log(
+            f"Batch {'encryption' if encrypt else 'decryption'} ({mode}): "
+            f"{len(tasks)} files, {sum(size for _, size in files)} bytes, "
+            f"{jobs} jobs: {input_dir} -> {output_dir}",
+            False
+        )
+
+        start_time = time.time()
+        results = []
+        if jobs <= 1:
+            results = [_process_one(*task) for task in tasks]
+        else:
+            # multiprocessing загружается только при параллельной обработке
+            from concurrent.futures import ProcessPoolExecutor, as_completed
+            with ProcessPoolExecutor(max_workers=jobs,
+                                     initializer=CipherCore.init_worker,
+                                     initargs=(CipherCore.worker_state(mode),)) as pool:
+                futures = {pool.submit(_process_pooled, *task): task for task in tasks}
+                for future in as_completed(futures):
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # Например, BrokenProcessPool после гибели процесса пула
+                        input_path, output_path = futures[future][:2]
+                        results.append({
+                            'input': input_path,
+                            'output': output_path,
+                            'bytes': 0,
+                            'elapsed': 0.0,
+                            'error': f"{type(e).__name__}: {e}"
+                        })
+                        continue
+                    Metrics.merge(result.pop('metrics'))
+                    results.append(result)
+        elapsed = time.time() - start_time
+
+        failures = [result for result in results if result['error']]
+        total_bytes = sum(result['bytes'] for result in results)
+        summary = {
+            'input_dir': input_dir,
+            'output_dir': output_dir,
+            'files': len(results),
+            'succeeded': len(results) - len(failures),
+            'failed': len(failures),
+            'bytes': total_bytes,
+            'elapsed': elapsed,
+            'throughput_mbps': (total_bytes * 8) / elapsed / 1e6 if elapsed > 0 else 0,
+            'failures': [(result['input'], result['error']) for result in failures]
+        }
+
+        CryptoLogger.log(
+            f"Batch completed: {summary['succeeded']}/{summary['files']} files, "
+            f"{summary['throughput_mbps']:.2f} Mbps, {elapsed:.2f} seconds",
+            bool(failures)
+        )
+        for path, error in summary['failures']:
+            CryptoLogger.log(f"Batch failure: {path}: {error}", True)
+
+        return summary
@@ -0,0 +1,701 @@
+"""
+Микробенчмарки CryptoCore
+
+Запуск: python -m crypto.benchmark (сравнение с прежними реализациями)
+        cryptocore bench [--json out.json] [--baseline base.json] (набор замеров)
+        cryptocore bench --startup (время импорта, бюджет STARTUP_BUDGETS_MS)
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import psutil
+from crypto.async_cipher import AsyncCipherStream
+from crypto.cipher_core import CipherCore
+from crypto.file_processor import FileProcessor
+from crypto.generator import Generator
+from crypto.key_generator import KeyGenerator
+from crypto.modes import CBCMode, CFBMode, OFBMode, CTRMode
+from crypto.modes.base_mode import BaseMode
+
+
+def _legacy_xor(a, b) -> bytes:
+    """Прежняя побайтовая реализация XOR (для сравнения)"""
+    return bytes(x ^ y for x, y in zip(a, b))
+
+
+def _legacy_random_bytes(num_bytes: int) -> bytes:
+    """Прежний побитовый генератор: один вызов SHA-1 на бит (для сравнения)"""
+    random_bits = bytearray(num_bytes)
+    free_memory = psutil.virtual_memory().available
+    time_entropy = time.time_ns()
+
+    for bit_number in range(num_bytes * 8):
+        count = bit_number % 1000
+        if count == 0:
+            free_memory = psutil.virtual_memory().available
+            time_entropy = time.time_ns()
+        entropy = free_memory ^ time_entropy * count
+        bit = hashlib.sha1(str(entropy).encode()).digest()[0] % 2
+        random_bits[bit_number // 8] |= bit << (7 - bit_number % 8)
+
+    return bytes(random_bits)
+
+
+def _measure(func, repeat: int = 3) -> float:
+    """Лучшее время выполнения из нескольких повторов, в секундах"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark_xor(size: int = 1024 * 1024, repeat: int = 3) -> list:
+    """
+    Сравнение общего XOR-примитива BaseMode с побайтовым XOR
+
+    Для каждого режима измеряется шифрование буфера размером size
+    с текущей реализацией и с подменой BaseMode._xor_bytes на прежнюю.
+    Возвращает список словарей с результатами.
+    """
+    key = os.urandom(16)
+    iv = os.urandom(16)
+    data = os.urandom(size)
+    results = []
+
+    cases = [('xor-16', lambda: BaseMode._xor_bytes(data[:16], iv),
+              lambda: _legacy_xor(data[:16], iv)),
+             ('xor-span', lambda: BaseMode._xor_bytes(data, data),
+              lambda: _legacy_xor(data, data))]
+    for mode_class in (CBCMode, CFBMode, OFBMode, CTRMode):
+        mode = mode_class(key, iv)
+        cases.append((mode_class.__name__, lambda m=mode: m.encrypt(data), None))
+
+    for name, current, legacy in cases:
+        current_time = _measure(current, repeat)
+        if legacy is None:
+            original = BaseMode.__dict__['_xor_bytes']
+            BaseMode._xor_bytes = staticmethod(_legacy_xor)
+            try:
+                legacy_time = _measure(current, repeat)
+            finally:
+                BaseMode._xor_bytes = original
+        else:
+            legacy_time = _measure(legacy, repeat)
+
+        results.append({
+            'name': name,
+            'legacy_s': legacy_time,
+            'current_s': current_time,
+            'speedup': legacy_time / current_time if current_time > 0 else 0.0
+        })
+
+    return results
+
+
+def benchmark_ctr(size: int = 4 * 1024 * 1024, repeat: int = 3) -> list:
+    """
+    Сравнение пакетной генерации гаммы CTR с поблочной
+
+    Поблочный вариант повторяет прежнюю реализацию: _increment_counter
+    и отдельный вызов AES на каждые 16 байт.
+    """
+    key = os.urandom(16)
+    iv = os.urandom(16)
+    data = os.urandom(size)
+    mode = CTRMode(key, iv)
+    block_count = size // mode.BLOCK_SIZE
+
+    def per_block():
+        keystream = b''.join(
+            mode._encrypt_block(mode._increment_counter(iv, i))
+            for i in range(block_count)
+        )
+        return mode._xor_bytes(data, keystream)
+
+    legacy_time = _measure(per_block, repeat)
+    current_time = _measure(lambda: mode.encrypt(data), repeat)
+    return [{
+        'name': 'CTR-batch',
+        'legacy_s': legacy_time,
+        'current_s': current_time,
+        'speedup': legacy_time / current_time if current_time > 0 else 0.0
+    }]
+
+
+def benchmark_generator(legacy_size: int = 4096,
+                        size: int = 4 * 1024 * 1024) -> list:
+    """
+    Пропускная способность генератора случайных байтов до и после HMAC_DRBG
+
+    Прежний генератор слишком медленный для больших объемов, поэтому он
+    измеряется на legacy_size байтах; сравниваются скорости в МБ/с.
+    """
+    legacy_time = _measure(lambda: _legacy_random_bytes(legacy_size), repeat=1)
+    current_time = _measure(lambda: Generator.generate_random_bytes(size))
+    salt_time = _measure(lambda: Generator.generate_random_bytes(16), repeat=100)
+    return [
+        {'name': 'legacy', 'mb_per_s': legacy_size / legacy_time / 1e6},
+        {'name': 'hmac-drbg', 'mb_per_s': size / current_time / 1e6},
+        {'name': 'salt-16B', 'mb_per_s': 16 / salt_time / 1e6}
+    ]
+
+
+def benchmark_derive_key(password: str = 'benchmark-password') -> list:
+    """
+    Сравнение derive_key с эталонной побайтовой реализацией
+
+    Результаты обеих реализаций сверяются побайтно: при расхождении
+    выбрасывается AssertionError.
+    """
+    salt = KeyGenerator.generate_salt()
+    start = time.perf_counter()
+    reference = KeyGenerator._derive_key_reference(password, salt)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    derived = KeyGenerator.derive_key(password, salt)
+    current_time = time.perf_counter() - start
+
+    assert derived == reference, "derive_key differs from the reference implementation"
+    return [{
+        'name': 'derive_key',
+        'legacy_s': legacy_time,
+        'current_s': current_time,
+        'speedup': legacy_time / current_time if current_time > 0 else 0.0
+    }]
+
+
+def benchmark_event_loop(uploads: int = 8, size: int = 2 * 1024 * 1024,
+                         mode: str = 'cbc') -> list:
+    """
+    Задержка цикла событий при одновременных загрузках
+
+    Тикер каждую миллисекунду измеряет, насколько позже запланированного
+    он был разбужен. Сравниваются синхронный CipherCore.encrypt внутри
+    корутины и AsyncCipherStream.
+    """
+    key = os.urandom(16)
+    payload = os.urandom(size)
+
+    async def source():
+        for offset in range(0, size, 64 * 1024):
+            await asyncio.sleep(0)
+            yield payload[offset:offset + 64 * 1024]
+
+    async def blocking_upload():
+        chunks = [chunk async for chunk in source()]
+        return CipherCore(key, mode).encrypt(b''.join(chunks))
+
+    async def async_upload():
+        return [piece async for piece in AsyncCipherStream(key, mode).encrypt(source())]
+
+    async def run(upload):
+        lags = []
+        done = False
+
+        async def ticker():
+            while not done:
+                expected = time.perf_counter() + 0.001
+                await asyncio.sleep(0.001)
+                lags.append(max(0.0, time.perf_counter() - expected))
+
+        tick_task = asyncio.ensure_future(ticker())
+        start = time.perf_counter()
+        await asyncio.gather(*(upload() for _ in range(uploads)))
+        elapsed = time.perf_counter() - start
+        done = True
+        await tick_task
+
+        lags.sort()
+        return {
+            'elapsed_s': elapsed,
+            'max_lag_ms': lags[-1] * 1000 if lags else 0.0,
+            'p99_lag_ms': lags[int(len(lags) * 0.99)] * 1000 if lags else 0.0
+        }
+
+    results = []
+    for name, upload in (('blocking', blocking_upload), ('async', async_upload)):
+        row = asyncio.run(run(upload))
+        row['name'] = name
+        results.append(row)
+    return results
+
+
+SUITE_MODES = ('ecb', 'cbc', 'cfb', 'ofb', 'ctr')
+SUITE_KEY_SIZES = (128, 192, 256)
+SUITE_SIZES = ('64B', '4KiB', '64KiB', '1MiB')
+SUITE_PATHS = ('memory', 'file')
+SUITE_OPS = ('encrypt', 'decrypt')
+SUITE_RNG_SIZES = ('16B', '64KiB', '1MiB')
+
+# Бюджет времени импорта (мс, медиана -X importtime): пакет без подмодулей,
+# ядро шифра и модуль CLI, загружаемый при каждом запуске cryptocore
+STARTUP_BUDGETS_MS = {'crypto': 20.0, 'crypto.cipher_core': 100.0, 'cryptocore': 150.0}
+
+_SIZE_UNITS = {'B': 1, 'KB': 10 ** 3, 'MB': 10 ** 6, 'GB': 10 ** 9,
+               'KIB': 2 ** 10, 'MIB': 2 ** 20, 'GIB': 2 ** 30}
+
+
+def parse_size(text: str) -> int:
+    """Размер из строки вида '64B', '4KiB', '1MB', '1GB' или числа байт"""
+    value = text.strip().upper()
+    for unit in sorted(_SIZE_UNITS, key=len, reverse=True):
+        if value.endswith(unit):
+            number = value[:-len(unit)].strip()
+            break
+    else:
+        number, unit = value, 'B'
+    try:
+        size = int(float(number) * _SIZE_UNITS[unit])
+    except ValueError:
+        raise ValueError(f"Invalid size: {text}")
+    if size <= 0:
+        raise ValueError(f"Size must be positive: {text}")
+    return size
+
+
+def format_size(size: int) -> str:
+    """Короткая запись размера для имени замера"""
+    for unit, factor in (('GiB', 2 ** 30), ('MiB', 2 ** 20), ('KiB', 2 ** 10)):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{unit}"
+    return f"{size}B"
+
+
+def _samples(func, warmup: int, repeat: int) -> list:
+    """Время каждого из repeat запусков после warmup прогревочных, в секундах"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _summary(name: str, samples: list, size: int = None, **fields) -> dict:
+    """Медиана, p95 (ближайший ранг) и пропускная способность по медиане"""
+    ordered = sorted(samples)
+    median = statistics.median(ordered)
+    return {
+        'name': name,
+        **fields,
+        'size': size,
+        'repeat': len(samples),
+        'median_s': median,
+        'p95_s': ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)],
+        'min_s': ordered[0],
+        'mb_per_s': size / median / 1e6 if size and median > 0 else None
+    }
+
+
+def _write_random_file(path: str, size: int):
+    """Файл со случайными данными, записываемый фрагментами по 1 МиБ"""
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining > 0:
+            chunk = min(remaining, 1024 * 1024)
+            f.write(os.urandom(chunk))
+            remaining -= chunk
+
+
+def _cipher_cases(modes, key_sizes, sizes, paths, ops, workdir: str):
+    """
+    Замеры шифра: (имя, поля, размер, функция)
+
+    В памяти измеряется CipherCore.encrypt/decrypt, для файлов - полный
+    путь FileProcessor.process_file с чтением и записью на диск.
+    """
+    for size in sizes:
+        plain_path = os.path.join(workdir, f'plain-{size}')
+        data = os.urandom(size) if 'memory' in paths else None
+        if 'file' in paths:
+            _write_random_file(plain_path, size)
+
+        for mode in modes:
+            for key_bits in key_sizes:
+                key = os.urandom(key_bits // 8)
+                cipher = CipherCore(key, mode)
+                enc_path = os.path.join(workdir, f'enc-{mode}-{key_bits}-{size}')
+                dec_path = os.path.join(workdir, 'dec')
+
+                for path in paths:
+                    if path == 'memory':
+                        ciphertext = cipher.encrypt(data) if 'decrypt' in ops else None
+                        funcs = {
+                            'encrypt': lambda c=cipher: c.encrypt(data),
+                            'decrypt': lambda c=cipher, ct=ciphertext: c.decrypt(ct)
+                        }
+                    else:
+                        if 'decrypt' in ops:
+                            FileProcessor.process_file(plain_path, enc_path, key,
+                                                       mode, True)
+                        funcs = {
+                            'encrypt': lambda k=key, m=mode: FileProcessor.process_file(
+                                plain_path, os.path.join(workdir, 'enc'), k, m, True),
+                            'decrypt': lambda k=key, m=mode, e=enc_path:
+                                FileProcessor.process_file(e, dec_path, k, m, False)
+                        }
+
+                    for op in ops:
+                        name = (f"cipher/{mode}/aes{key_bits}/{path}/{op}/"
+                                f"{format_size(size)}")
+                        fields = {'group': 'cipher', 'mode': mode,
+                                  'key_bits': key_bits, 'path': path, 'op': op}
+                        yield name, fields, size, funcs[op]
+
+                if os.path.exists(enc_path):
+                    os.remove(enc_path)
+
+        if os.path.exists(plain_path):
+            os.remove(plain_path)
+
+
+def run_suite(modes=SUITE_MODES, key_sizes=SUITE_KEY_SIZES, sizes=SUITE_SIZES,
+              paths=SUITE_PATHS, ops=SUITE_OPS, rng_sizes=SUITE_RNG_SIZES,
+              warmup: int = 1, repeat: int = 5, include_kdf: bool = True,
+              progress=None) -> dict:
+    """
+    Набор воспроизводимых замеров пропускной способности
+
+    Перебирает режимы, размеры ключа, размеры данных и пути (память/файл),
+    а также derive_key и Generator. Каждый замер выполняется warmup раз
+    вхолостую и repeat раз с записью времени.
+
+    Args:
+        sizes: размеры данных (числа байт или строки вида '64B', '1GB')
+        progress: функция, вызываемая с каждой готовой строкой результата
+
+    Returns:
+        {'meta': параметры запуска и окружения, 'results': список замеров}
+    """
+    if warmup < 0 or repeat < 1:
+        raise ValueError("warmup must be >= 0 and repeat >= 1")
+
+    sizes = [parse_size(size) if isinstance(size, str) else size for size in sizes]
+    rng_sizes = [parse_size(size) if isinstance(size, str) else size
+                 for size in rng_sizes]
+    results = []
+
+    def record(row):
+        results.append(row)
+        if progress:
+            progress(row)
+
+    # Логи FileProcessor на каждый запуск искажают замеры файлового пути
+    from crypto.crypto_logger import CryptoLogger
+    log = CryptoLogger.log
+    CryptoLogger.log = staticmethod(lambda message, is_error=False: None)
+    try:
+        with tempfile.TemporaryDirectory(prefix='cryptocore-bench-') as workdir:
+            for name, fields, size, func in _cipher_cases(modes, key_sizes, sizes,
+                                                          paths, ops, workdir):
+                record(_summary(name, _samples(func, warmup, repeat), size, **fields))
+    finally:
+        CryptoLogger.log = log
+
+    if include_kdf:
+        salt = KeyGenerator.generate_salt()
+        record(_summary('kdf/derive_key',
+                        _samples(lambda: KeyGenerator._derive(
+                            'benchmark-password', salt, KeyGenerator.ITERATIONS),
+                            warmup, repeat),
+                        group='kdf'))
+
+    for size in rng_sizes:
+        record(_summary(f'rng/generator/{format_size(size)}',
+                        _samples(lambda n=size: Generator.generate_random_bytes(n),
+                                 warmup, repeat),
+                        size, group='rng'))
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'backend': CipherCore.DEFAULT_BACKEND,
+            'warmup': warmup,
+            'repeat': repeat
+        },
+        'results': results
+    }
+
+
+def compare_with_baseline(report: dict, baseline: dict,
+                          tolerance: float = 0.10) -> list:
+    """
+    Сравнение медиан с сохраненным отчетом
+
+    Для каждого замера, присутствующего в обоих отчетах, в строку
+    результата добавляются baseline_median_s и change (относительное
+    изменение медианы). Возвращает список имен замеров, медиана которых
+    выросла больше чем на tolerance.
+    """
+    baseline_rows = {row['name']: row for row in baseline.get('results', [])}
+    regressions = []
+    for row in report['results']:
+        base = baseline_rows.get(row['name'])
+        if base is None or not base.get('median_s'):
+            continue
+        row['baseline_median_s'] = base['median_s']
+        row['change'] = row['median_s'] / base['median_s'] - 1
+        if row['change'] > tolerance:
+            row['regression'] = True
+            regressions.append(row['name'])
+    return regressions
+
+
+def print_suite(results: list, file=None):
+    """Вывод набора замеров в виде таблицы"""
+    print(f"{'case':<44} {'median, ms':>11} {'p95, ms':>10} {'MB/s':>9} {'vs base':>9}",
+          file=file)
+    for row in results:
+        throughput = f"{row['mb_per_s']:.1f}" if row.get('mb_per_s') else '-'
+        change = f"{row['change'] * 100:+.1f}%" if 'change' in row else '-'
+        marker = '  REGRESSION' if row.get('regression') else ''
+        print(f"{row['name']:<44} {row['median_s'] * 1000:>11.3f} "
+              f"{row['p95_s'] * 1000:>10.3f} {throughput:>9} {change:>9}{marker}",
+              file=file)
+
+
+def _parse_importtime(output: str, module: str) -> tuple:
+    """
+    Разбор вывода -X importtime
+
+    Returns:
+        (суммарное время импорта module в мкс, [(прямой подмодуль, мкс)])
+    """
+    children = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|', 2)
+        if not cumulative.strip().isdigit():
+            continue  # заголовок таблицы
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == module:
+                return int(cumulative), children
+            children = []
+        elif depth == 1:
+            children.append((name.strip(), int(cumulative)))
+    raise ValueError(f"Module {module} not found in -X importtime output")
+
+
+def measure_startup(modules=tuple(STARTUP_BUDGETS_MS), repeat: int = 5,
+                    budget_scale: float = 1.0) -> list:
+    """
+    Время импорта модулей в чистом интерпретаторе (python -X importtime)
+
+    Каждый замер - отдельный процесс, поэтому уже загруженные модули не
+    искажают результат. Для каждого модуля возвращаются медиана и минимум,
+    самые дорогие прямые подмодули и превышение бюджета STARTUP_BUDGETS_MS.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    rows = []
+    for module in modules:
+        samples = []
+        children = []
+        for _ in range(repeat):
+            process = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                cwd=root, capture_output=True, text=True
+            )
+            if process.returncode != 0:
+                raise ValueError(f"import {module} failed: {process.stderr.strip()}")
+            total, children = _parse_importtime(process.stderr, module)
+            samples.append(total / 1000)
+
+        median = statistics.median(samples)
+        budget = STARTUP_BUDGETS_MS.get(module)
+        if budget is not None:
+            budget *= budget_scale
+        rows.append({
+            'name': f'startup import {module}',
+            'module': module,
+            'median_ms': median,
+            'min_ms': min(samples),
+            'budget_ms': budget,
+            'over_budget': budget is not None and median > budget,
+            'top_imports': [{'module': name, 'ms': us / 1000} for name, us in
+                            sorted(children, key=lambda child: -child[1])[:5]]
+        })
+    return rows
+
+
+def print_startup(rows: list, file=None):
+    """Вывод времени импорта и бюджета"""
+    print(f"{'module':<24} {'median, ms':>11} {'min, ms':>9} {'budget, ms':>11}  heaviest imports",
+          file=file)
+    for row in rows:
+        budget = f"{row['budget_ms']:.0f}" if row['budget_ms'] is not None else '-'
+        heaviest = ', '.join(f"{item['module']} {item['ms']:.1f}"
+                             for item in row['top_imports'][:3])
+        marker = '  OVER BUDGET' if row['over_budget'] else ''
+        print(f"{row['module']:<24} {row['median_ms']:>11.1f} {row['min_ms']:>9.1f} "
+              f"{budget:>11}  {heaviest}{marker}", file=file)
+
+
+def bench_main(argv: list = None) -> int:
+    """
+    Точка входа `cryptocore bench`
+
+    Возвращает код завершения: 1, если по сравнению с baseline
+    обнаружена регрессия.
+    """
+    parser = argparse.ArgumentParser(
+        prog='cryptocore bench',
+        description='CryptoCore throughput benchmark suite'
+    )
+    parser.add_argument('--modes', nargs='+', default=list(SUITE_MODES),
+                        choices=SUITE_MODES, help='Cipher modes to sweep')
+    parser.add_argument('--key-sizes', nargs='+', type=int,
+                        default=list(SUITE_KEY_SIZES), choices=SUITE_KEY_SIZES,
+                        help='AES key sizes in bits')
+    parser.add_argument('--sizes', nargs='+', default=list(SUITE_SIZES),
+                        help='Payload sizes, e.g. 64B 4KiB 1MiB 1GB '
+                             '(default: 64B 4KiB 64KiB 1MiB)')
+    parser.add_argument('--paths', nargs='+', default=list(SUITE_PATHS),
+                        choices=SUITE_PATHS, help='In-memory and/or file I/O path')
+    parser.add_argument('--ops', nargs='+', default=list(SUITE_OPS),
+                        choices=SUITE_OPS, help='Operations to time')
+    parser.add_argument('--rng-sizes', nargs='*', default=list(SUITE_RNG_SIZES),
+                        help='Generator request sizes (empty to skip)')
+    parser.add_argument('--no-kdf', action='store_true',
+                        help='Skip derive_key timing')
+    parser.add_argument('--backend', default=CipherCore.DEFAULT_BACKEND,
+                        choices=list(CipherCore.BACKENDS),
+                        help='Cipher mode implementation to measure')
+    parser.add_argument('--warmup', type=int, default=1,
+                        help='Untimed warmup runs per case (default: 1)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Timed repetitions per case (default: 5)')
+    parser.add_argument('--json', metavar='PATH',
+                        help='Write the JSON report to PATH ("-" for stdout); '
+                             'the file can later be used as --baseline')
+    parser.add_argument('--baseline', metavar='PATH',
+                        help='Compare medians with a previously saved JSON report')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Allowed median slowdown vs baseline (default: 0.10)')
+    parser.add_argument('--startup', action='store_true',
+                        help='Measure import time with -X importtime instead of '
+                             'throughput; exit 1 if a module exceeds its budget')
+    parser.add_argument('--startup-budget-scale', type=float, default=1.0,
+                        help='Multiply startup budgets, e.g. 2 on slow CI machines')
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        return _startup_main(args)
+
+    CipherCore.DEFAULT_BACKEND = args.backend
+    try:
+        baseline = None
+        if args.baseline:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        report = run_suite(args.modes, args.key_sizes, args.sizes, args.paths,
+                           args.ops, args.rng_sizes, args.warmup, args.repeat,
+                           not args.no_kdf)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    regressions = []
+    if baseline is not None:
+        regressions = compare_with_baseline(report, baseline, args.tolerance)
+        report['meta']['baseline'] = args.baseline
+        report['meta']['tolerance'] = args.tolerance
+        report['regressions'] = regressions
+
+    # При выводе JSON в stdout таблица уходит в stderr
+    print_suite(report['results'], sys.stderr if args.json == '-' else sys.stdout)
+
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.tolerance:.0%} "
+              f"vs {args.baseline}:", file=sys.stderr)
+        for name in regressions:
+            print(f"  {name}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _startup_main(args) -> int:
+    """cryptocore bench --startup: время импорта и проверка бюджета"""
+    try:
+        rows = measure_startup(repeat=args.repeat,
+                               budget_scale=args.startup_budget_scale)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    print_startup(rows, sys.stderr if args.json == '-' else sys.stdout)
+    report = {
+        'meta': {'python': platform.python_version(), 'repeat': args.repeat,
+                 'budget_scale': args.startup_budget_scale},
+        'startup': rows
+    }
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    elif args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    over = [row['module'] for row in rows if row['over_budget']]
+    if over:
+        print(f"Import time over budget: {', '.join(over)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def print_results(title: str, results: list):
+    """Вывод результатов в виде таблицы"""
+    print(title)
+    print(f"{'case':<12} {'legacy, ms':>12} {'current, ms':>12} {'speedup':>9}")
+    for row in results:
+        print(f"{row['name']:<12} {row['legacy_s'] * 1000:>12.2f} "
+              f"{row['current_s'] * 1000:>12.2f} {row['speedup']:>8.1f}x")
+
+
+def main():
+    print_results("XOR primitive (1 MiB per mode)", benchmark_xor())
+    print_results("CTR keystream (4 MiB)", benchmark_ctr())
+
+    print_results("Key derivation (100000 iterations)", benchmark_derive_key())
+
+    print("Random generator throughput")
+    for row in benchmark_generator():
+        print(f"{row['name']:<12} {row['mb_per_s']:>12.4f} MB/s")
+
+    print("Event loop latency (8 concurrent 2 MiB CBC uploads)")
+    print(f"{'case':<12} {'elapsed, ms':>12} {'p99 lag, ms':>12} {'max lag, ms':>12}")
+    for row in benchmark_event_loop():
+        print(f"{row['name']:<12} {row['elapsed_s'] * 1000:>12.1f} "
+              f"{row['p99_lag_ms']:>12.2f} {row['max_lag_ms']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,216 @@
+import hmac
 import os
+import threading
+import time
+from collections import OrderedDict
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad, unpad
-from crypto.modes import CBCMode, CFBMode, OFBMode, CTRMode
+from Crypto.Util.strxor import strxor
+from crypto import modes
+from crypto.generator import Generator
+from crypto.modes.base_mode import BaseMode
+from crypto.metrics import Metrics
+
+_pad = Metrics.timed('pad', 'ecb', pad)
+_unpad = Metrics.timed('pad', 'ecb', unpad)
+
+_BLOCK = 16
+_COUNTER_MASK = 2 ** 128 - 1
+_STRXOR_MIN = 1024  # короче вызов C через ctypes дороже длинной арифметики
+
+
+def _xor(a: bytes, b: bytes) -> bytes:
+    """XOR буферов одинаковой длины"""
+    if len(a) >= _STRXOR_MIN:
+        return strxor(a, b)
+    return BaseMode._xor_bytes(a, b)
+
+
+def _blocks(length: int) -> int:
+    return -(-length // _BLOCK)
+
+
+def _zero_fill(data: bytes) -> bytes:
+    """Дополнение нулями до целого числа блоков (хвост потом отрезается)"""
+    return data + bytes(-len(data) % _BLOCK)
+
+
+def _split(data: bytes, lengths: list, sizes: list = None) -> list:
+    """Разрезание склеенного результата: sizes - занятое место, lengths - длина"""
+    result = []
+    offset = 0
+    for length, size in zip(lengths, sizes or lengths):
+        result.append(data[offset:offset + length])
+        offset += size
+    return result
+
+
+def _chained_lanes(ecb, blocks: list, ivs: list, feedback: str) -> list:
+    """
+    Сцепленные режимы для многих коротких сообщений одновременно
+
+    Сообщения (дополненные до целых блоков) идут по убыванию длины, шаг j
+    обрабатывает j-й блок всех сообщений, где он есть, одним вызовом AES:
+    число вызовов равно длине самого длинного сообщения в блоках, а не
+    сумме длин. feedback: 'cbc' - C = E(P xor C'), 'cfb' - C = P xor E(C'),
+    'ofb' - O = E(O'), C = P xor O.
+    """
+    order = sorted(range(len(blocks)), key=lambda i: -len(blocks[i]))
+    lanes = [blocks[i] for i in order]
+    chain = b''.join(ivs[i] for i in order)
+    columns = []
+    count = len(lanes)
+    for start in range(0, len(lanes[0]), _BLOCK):
+        while len(lanes[count - 1]) <= start:
+            count -= 1
+        plain = b''.join(lane[start:start + _BLOCK] for lane in lanes[:count])
+        chain = chain[:count * _BLOCK]
+        if feedback == 'cbc':
+            chain = output = ecb.encrypt(_xor(plain, chain))
+        elif feedback == 'cfb':
+            chain = output = _xor(plain, ecb.encrypt(chain))
+        else:
+            chain = ecb.encrypt(chain)
+            output = _xor(plain, chain)
+        columns.append(output)
+
+    result = [None] * len(blocks)
+    for position, index in enumerate(order):
+        offset = position * _BLOCK
+        result[index] = b''.join(column[offset:offset + _BLOCK]
+                                 for column in columns[:len(lanes[position]) // _BLOCK])
+    return result
+
+
+def _ctr_keystream(ecb, ivs: list, lengths: list) -> bytes:
+    """Гамма CTR всех сообщений одним вызовом AES (весь IV - big-endian счетчик)"""
+    counters = []
+    for iv, length in zip(ivs, lengths):
+        base = int.from_bytes(iv, 'big')
+        counters += [((base + i) & _COUNTER_MASK).to_bytes(_BLOCK, 'big')
+                     for i in range(_blocks(length))]
+    return ecb.encrypt(b''.join(counters))
+
+
+def _transform_many(ecb, mode: str, records: list, ivs: list, encrypt: bool) -> list:
+    """Пакетное шифрование/дешифрование, побайтно совпадающее с режимами crypto.modes"""
+    lengths = [len(record) for record in records]
+    if mode == 'ecb':
+        if encrypt:
+            padded = [pad(record, _BLOCK) for record in records]
+            sizes = [len(block) for block in padded]
+            return _split(ecb.encrypt(b''.join(padded)), sizes)
+        if any(length % _BLOCK for length in lengths):
+            raise ValueError("Data length must be multiple of block size")
+        return [unpad(block, _BLOCK)
+                for block in _split(ecb.decrypt(b''.join(records)), lengths)]
+
+    if mode == 'cbc' and not encrypt:
+        if any(length % _BLOCK for length in lengths):
+            raise ValueError("Data length must be multiple of block size")
+        previous = b''.join(iv + record[:-_BLOCK] if record else b''
+                            for iv, record in zip(ivs, records))
+        plaintext = _xor(ecb.decrypt(b''.join(records)), previous)
+        return [unpad(block, _BLOCK) for block in _split(plaintext, lengths)]
+
+    filled = [_zero_fill(record) for record in records]
+    sizes = [len(block) for block in filled]
+    if mode == 'ctr':
+        keystream = _ctr_keystream(ecb, ivs, lengths)
+        return _split(_xor(b''.join(filled), keystream), lengths, sizes)
+    if mode == 'cfb' and not encrypt:
+        registers = b''.join(iv + block[:-_BLOCK] if block else b''
+                             for iv, block in zip(ivs, filled))
+        keystream = ecb.encrypt(registers)
+        return _split(_xor(b''.join(filled), keystream), lengths, sizes)
+
+    if mode == 'cbc':
+        filled = [pad(record, _BLOCK) for record in records]
+    results = _chained_lanes(ecb, filled, ivs, mode)
+    return results if mode == 'cbc' else [result[:length] for result, length
+                                          in zip(results, lengths)]
+
+
+class KeyScheduleCache:
+    """
+    Ограниченный LRU-кэш развернутых ключей AES (объекты AES ECB pycryptodome)
+
+    ECB-объект не хранит состояния между вызовами, поэтому один экземпляр
+    разделяется всеми CipherCore с этим ключом, в том числе из разных
+    потоков. Записи индексируются HMAC ключа на случайном секрете процесса:
+    сами ключи не становятся ключами словаря и не сравниваются при поиске.
+    Вытесненная или удаленная clear() запись освобождает расписание ключа.
+    """
+
+    def __init__(self, max_keys: int = 256):
+        """
+        Args:
+            max_keys: число ключей в кэше (0 - кэш отключен)
+        """
+        self.max_keys = max_keys
+        self.hits = 0
+        self.misses = 0
+        self._secret = os.urandom(32)
+        self._schedules = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes):
+        """Объект AES ECB для ключа: из кэша или новый"""
+        if self.max_keys <= 0:
+            return AES.new(key, AES.MODE_ECB)
+        index = hmac.digest(self._secret, key, 'sha256')
+        with self._lock:
+            cipher = self._schedules.get(index)
+            if cipher is not None:
+                self._schedules.move_to_end(index)
+                self.hits += 1
+                return cipher
+            self.misses += 1
+
+        cipher = AES.new(key, AES.MODE_ECB)
+        with self._lock:
+            self._schedules[index] = cipher
+            self._schedules.move_to_end(index)
+            while len(self._schedules) > self.max_keys:
+                self._schedules.popitem(last=False)
+        return cipher
+
+    def clear(self):
+        """Удаление всех расписаний ключей (например, при смене ключей)"""
+        with self._lock:
+            self._schedules.clear()
+
+    def __len__(self) -> int:
+        return len(self._schedules)
 
 
 class CipherCore:
     BLOCK_SIZE = 16
 
-    def __init__(self, key: bytes, mode: str = 'ecb', iv: bytes = None):
+    # Реализации режимов: эталонные (crypto.modes) и нативные (pycryptodome).
+    # Имена классов, а не сами классы: импортируется только модуль выбранного режима
+    BACKENDS = ('auto', 'native', 'reference')
+    DEFAULT_BACKEND = 'auto'
+    REFERENCE_MODES = {'cbc': 'CBCMode', 'cfb': 'CFBMode', 'ofb': 'OFBMode',
+                       'ctr': 'CTRMode'}
+    NATIVE_MODES = {'cbc': 'NativeCBCMode', 'cfb': 'NativeCFBMode',
+                    'ofb': 'NativeOFBMode', 'ctr': 'NativeCTRMode'}
+
+    # Результаты самопроверки нативных режимов для backend='auto' (по режиму)
+    _native_verified = {}
+
+    # Развернутые ключи AES, общие для всех объектов процесса
+    SCHEDULES = KeyScheduleCache()
+
+    # Пакетная обработка: сообщения до LANE_BYTES шифруются вместе. Сцепленные
+    # режимы (шифрование CBC/CFB, OFB) делают вызов AES на каждый блок самого
+    # длинного сообщения, поэтому вместе идут не меньше LANE_MIN_RECORDS и не
+    # меньше половины этого числа блоков сообщений; остальные - по одному
+    LANE_BYTES = 512
+    LANE_MIN_RECORDS = 4
+
+    def __init__(self, key: bytes, mode: str = 'ecb', iv: bytes = None,
+                 backend: str = None):
         """
         Инициализация cipher core с поддержкой разных режимов
 
@@ -15,6 +218,10 @@ class CipherCore:
             key: ключ шифрования (16, 24, или 32 байта для AES)
             mode: режим работы ('ecb', 'cbc', 'cfb', 'ofb', 'ctr')
             iv: вектор инициализации (требуется для режимов кроме ECB)
+            backend: 'native' - режимы pycryptodome, 'reference' - эталонные
+                     реализации crypto.modes, 'auto' - нативные, если при
+                     первом использовании они побайтно совпали с эталонными
+                     (None - DEFAULT_BACKEND)
         """
         if len(key) not in [16, 24, 32]:
             raise ValueError(
@@ -22,34 +229,78 @@ class CipherCore:
             )
         self.key = key
         self.mode = mode.lower()
+        self.backend = (backend or self.DEFAULT_BACKEND).lower()
+        if self.backend not in self.BACKENDS:
+            raise ValueError(
+                f"Unsupported backend: {backend}. "
+                f"Supported: {', '.join(self.BACKENDS)}"
+            )
 
         # Генерация IV для режимов, которые его требуют
         if self.mode != 'ecb' and iv is None:
-            self.iv = os.urandom(self.BLOCK_SIZE)
+            self.iv = Generator.generate_random_bytes(self.BLOCK_SIZE)
         else:
             self.iv = iv
 
-        # Инициализация соответствующего режима
-        if self.mode == 'ecb':
-            self._cipher = AES.new(self.key, AES.MODE_ECB)
-        elif self.mode == 'cbc':
-            if self.iv is None:
-                raise ValueError("IV required for CBC mode")
-            self._mode_instance = CBCMode(self.key, self.iv)
-        elif self.mode == 'cfb':
-            if self.iv is None:
-                raise ValueError("IV required for CFB mode")
-            self._mode_instance = CFBMode(self.key, self.iv)
-        elif self.mode == 'ofb':
-            if self.iv is None:
-                raise ValueError("IV required for OFB mode")
-            self._mode_instance = OFBMode(self.key, self.iv)
-        elif self.mode == 'ctr':
-            if self.iv is None:
-                raise ValueError("IV required for CTR mode")
-            self._mode_instance = CTRMode(self.key, self.iv)
-        else:
+        # Инициализация режима: ECB и эталонные режимы берут развернутый ключ из
+        # SCHEDULES, нативные создают свой объект pycryptodome на каждое сообщение
+        if self.mode != 'ecb' and self.mode not in self.REFERENCE_MODES:
             raise ValueError(f"Unsupported mode: {mode}")
+        self._cipher = CipherCore.SCHEDULES.get(self.key)
+        if self.mode != 'ecb':
+            if self.iv is None:
+                raise ValueError(f"IV required for {self.mode.upper()} mode")
+            self._mode_instance = self._mode_class()(self.key, self.iv, self._cipher)
+
+    def _mode_class(self):
+        """Класс режима для выбранного backend"""
+        if self.backend == 'reference' or (
+                self.backend == 'auto' and not CipherCore._native_matches(self.mode)):
+            return getattr(modes, self.REFERENCE_MODES[self.mode])
+        return getattr(modes, self.NATIVE_MODES[self.mode])
+
+    @staticmethod
+    def _native_matches(mode: str) -> bool:
+        """
+        Однократная проверка нативного режима на известных ответах
+
+        При расхождении с векторами SP 800-38A режим до конца процесса
+        обслуживается эталонным классом, расхождение пишется в лог.
+        Процессы пула получают результат от родителя (worker_state).
+        """
+        verified = CipherCore._native_verified.get(mode)
+        if verified is None:
+            from crypto.differential import known_answers_match
+            with Metrics.paused():
+                verified = known_answers_match(mode)
+            CipherCore._native_verified[mode] = verified
+            if not verified:
+                from crypto.crypto_logger import CryptoLogger
+                CryptoLogger.log(
+                    f"Native {mode} mode differs from the reference implementation, "
+                    f"using the reference backend",
+                    True
+                )
+        return verified
+
+    @staticmethod
+    def worker_state(mode: str = None) -> dict:
+        """
+        Настройки backend для процессов пула (initializer=CipherCore.init_worker)
+
+        Проверка режима выполняется один раз в родителе; при spawn процессы
+        получают также --backend, заданный в родителе.
+        """
+        if mode in CipherCore.NATIVE_MODES and CipherCore.DEFAULT_BACKEND == 'auto':
+            CipherCore._native_matches(mode)
+        return {'backend': CipherCore.DEFAULT_BACKEND,
+                'native_verified': dict(CipherCore._native_verified)}
+
+    @staticmethod
+    def init_worker(state: dict):
+        """Инициализация процесса пула настройками из worker_state"""
+        CipherCore.DEFAULT_BACKEND = state['backend']
+        CipherCore._native_verified.update(state['native_verified'])
 
     def encrypt(self, data: bytes) -> bytes:
         """Шифрование данных в выбранном режиме"""
@@ -67,6 +318,165 @@ class CipherCore:
         else:
             return self._mode_instance.decrypt(data)
 
+    def _batch_ivs(self, count: int, ivs: list) -> list:
+        if self.mode == 'ecb':
+            return [None] * count
+        if ivs is None:
+            # Один запрос к генератору на весь пакет
+            data = Generator.generate_random_bytes(count * self.BLOCK_SIZE)
+            return [data[i:i + self.BLOCK_SIZE]
+                    for i in range(0, len(data), self.BLOCK_SIZE)]
+        ivs = list(ivs)
+        if len(ivs) != count:
+            raise ValueError(f"Expected {count} IVs, got {len(ivs)}")
+        if any(iv is None or len(iv) != self.BLOCK_SIZE for iv in ivs):
+            raise ValueError(f"IV must be {self.BLOCK_SIZE} bytes")
+        return [bytes(iv) for iv in ivs]
+
+    def _transform_records(self, records: list, ivs: list, encrypt: bool) -> list:
+        start = time.perf_counter()
+        if self.mode == 'ecb':
+            results = _transform_many(self._cipher, 'ecb', records, ivs, encrypt)
+        else:
+            results = [None] * len(records)
+            if self.backend != 'reference':
+                short = [i for i, record in enumerate(records)
+                         if len(record) <= self.LANE_BYTES]
+                chained = self.mode == 'ofb' or (encrypt and self.mode != 'ctr')
+                if short and chained:
+                    steps = max(len(records[i]) for i in short) // self.BLOCK_SIZE + 1
+                    if len(short) < max(self.LANE_MIN_RECORDS, steps // 2):
+                        short = []
+                if short:
+                    batch = _transform_many(self._cipher, self.mode,
+                                            [records[i] for i in short],
+                                            [ivs[i] for i in short], encrypt)
+                    for i, result in zip(short, batch):
+                        results[i] = result
+
+            # Длинные сообщения и backend='reference' - отдельным объектом режима
+            mode_class = None
+            for i, result in enumerate(results):
+                if result is None:
+                    mode_class = mode_class or self._mode_class()
+                    instance = mode_class(self.key, ivs[i], self._cipher)
+                    results[i] = (instance.encrypt(records[i]) if encrypt
+                                  else instance.decrypt(records[i]))
+
+        Metrics.record('cipher', self.mode, time.perf_counter() - start,
+                       sum(len(record) for record in records))
+        return results
+
+    def encrypt_many(self, records: list, ivs: list = None) -> list:
+        """
+        Шифрование множества независимых сообщений одним вызовом
+
+        Каждое сообщение шифруется так же, как encrypt() объекта с его IV
+        (PKCS7 для ECB/CBC). Короткие сообщения обрабатываются вместе
+        небольшим числом вызовов AES, IV запрашиваются у генератора одним
+        блоком. Состояние объекта не меняется, поэтому один объект можно
+        использовать из нескольких потоков.
+
+        Args:
+            records: сообщения (bytes-like)
+            ivs: IV для каждого сообщения (None - случайные; для ECB не нужны)
+
+        Returns:
+            [(iv, шифртекст)], iv=None для ECB
+        """
+        records = [bytes(record) for record in records]
+        ivs = self._batch_ivs(len(records), ivs)
+        return list(zip(ivs, self._transform_records(records, ivs, encrypt=True)))
+
+    def decrypt_many(self, records: list, ivs: list = None) -> list:
+        """
+        Дешифрование множества независимых сообщений одним вызовом
+
+        Args:
+            records: пары (iv, шифртекст), как их возвращает encrypt_many,
+                     или только шифртексты, если IV переданы в ivs
+            ivs: IV для каждого сообщения (None - берутся из пар records)
+
+        Returns:
+            открытые тексты в порядке records; неверный паддинг в любом
+            из сообщений - ValueError для всего вызова
+        """
+        records = list(records)
+        if ivs is None:
+            ivs = [iv for iv, _ in records]
+            records = [ciphertext for _, ciphertext in records]
+        records = [bytes(record) for record in records]
+        ivs = self._batch_ivs(len(records), ivs)
+        return self._transform_records(records, ivs, encrypt=False)
+
+    def encrypt_chunk(self, chunk: bytes, final: bool = False) -> bytes:
+        """
+        Потоковое шифрование очередного фрагмента
+
+        Состояние сцепления (предыдущий блок, регистр, счетчик) переносится
+        между вызовами. Длина промежуточных фрагментов должна быть кратна
+        размеру блока, PKCS7 паддинг применяется только к последнему (final=True).
+        """
+        if self.mode == 'ecb':
+            if final:
+                chunk = _pad(bytes(chunk), self.BLOCK_SIZE)
+            elif len(chunk) % self.BLOCK_SIZE != 0:
+                raise ValueError(
+                    "Intermediate chunk length must be multiple of block size"
+                )
+            return self._cipher.encrypt(chunk)
+        return self._mode_instance.encrypt_chunk(chunk, final)
+
+    def decrypt_chunk(self, chunk: bytes, final: bool = False) -> bytes:
+        """Потоковое дешифрование очередного фрагмента (паддинг снимается в последнем)"""
+        if self.mode == 'ecb':
+            decrypted = self._cipher.decrypt(chunk)
+            return _unpad(decrypted, self.BLOCK_SIZE) if final else decrypted
+        return self._mode_instance.decrypt_chunk(chunk, final)
+
+    def reset(self):
+        """Сброс потокового состояния к исходному IV"""
+        if self.mode != 'ecb':
+            self._mode_instance.reset()
+
+    def encryptor(self) -> 'CipherContext':
+        """Инкрементальный контекст шифрования: update(chunk) / finalize()"""
+        return CipherContext(CipherCore(self.key, self.mode, self.iv, self.backend),
+                             encrypt=True)
+
+    def decryptor(self) -> 'CipherContext':
+        """Инкрементальный контекст дешифрования: update(chunk) / finalize()"""
+        return CipherContext(CipherCore(self.key, self.mode, self.iv, self.backend),
+                             encrypt=False)
+
+    def get_state(self):
+        """Потоковое состояние режима (None для ECB)"""
+        if self.mode == 'ecb':
+            return None
+        return self._mode_instance.get_state()
+
+    def set_state(self, state):
+        """Восстановление потокового состояния, например для чтения с середины потока"""
+        if self.mode != 'ecb':
+            self._mode_instance.set_state(state)
+
+    def set_iv(self, iv: bytes):
+        """
+        Смена IV для следующего сообщения без пересоздания объекта
+
+        Потоковое состояние сбрасывается к новому IV. Эталонные режимы
+        переиспользуют развернутый ключ из SCHEDULES; нативным режимам
+        pycryptodome для нового IV нужен новый объект AES.new (ключ
+        разворачивается заново, один раз на сообщение, а не на фрагмент).
+        Для ECB не действует.
+        """
+        if self.mode == 'ecb':
+            return
+        if iv is None or len(iv) != self.BLOCK_SIZE:
+            raise ValueError(f"IV must be {self.BLOCK_SIZE} bytes")
+        self.iv = iv
+        self._mode_instance.set_iv(iv)
+
     def get_iv(self) -> bytes:
         """Получить IV (для режимов кроме ECB)"""
         if self.mode == 'ecb':
@@ -80,8 +490,61 @@ class CipherCore:
             'hex': self.key.hex(),
             'algorithm': 'AES',
             'key_size': len(self.key) * 8,
-            'mode': self.mode
+            'mode': self.mode,
+            'backend': self.backend
         }
         if self.mode != 'ecb':
             info['iv'] = self.iv.hex()
-        return info
\ No newline at end of file
+        return info
+
+
+class CipherContext:
+    """
+    Инкрементальное шифрование/дешифрование сообщения, поступающего частями
+
+    Фрагменты могут иметь произвольную длину: неполный блок переносится
+    в следующий вызов update(). Состояние режима (предыдущий блок CBC/CFB,
+    регистр OFB, счетчик CTR) сохраняется между вызовами. При дешифровании
+    ECB/CBC последний блок удерживается до finalize(), где снимается паддинг.
+    """
+
+    PADDED_MODES = ('ecb', 'cbc')
+
+    def __init__(self, cipher: CipherCore, encrypt: bool):
+        self._cipher = cipher
+        self._cipher.reset()
+        self._transform = cipher.encrypt_chunk if encrypt else cipher.decrypt_chunk
+        self._hold_last_block = not encrypt and cipher.mode in self.PADDED_MODES
+        self._buffer = bytearray()
+        self._finalized = False
+
+    @property
+    def iv(self) -> bytes:
+        """IV сообщения (None для ECB)"""
+        return self._cipher.get_iv()
+
+    def update(self, data: bytes) -> bytes:
+        """Обработка очередной части сообщения, возвращает готовые блоки"""
+        if self._finalized:
+            raise ValueError("Cipher context is already finalized")
+
+        self._buffer += data
+        ready = len(self._buffer) - len(self._buffer) % CipherCore.BLOCK_SIZE
+        if self._hold_last_block and ready == len(self._buffer):
+            ready -= CipherCore.BLOCK_SIZE
+        if ready <= 0:
+            return b''
+
+        chunk = bytes(self._buffer[:ready])
+        del self._buffer[:ready]
+        return self._transform(chunk, False)
+
+    def finalize(self) -> bytes:
+        """Обработка остатка (паддинг/его снятие), после вызова контекст закрыт"""
+        if self._finalized:
+            raise ValueError("Cipher context is already finalized")
+
+        self._finalized = True
+        chunk = bytes(self._buffer)
+        self._buffer.clear()
+        return self._transform(chunk, True)
@@ -0,0 +1,437 @@
+import os
+import struct
+from Crypto.Cipher import AES
+from crypto.authenticator import StreamAuthenticator
+from crypto.cipher_core import CipherCore
+from crypto.crypto_logger import CryptoLogger
+from crypto.kdf import KeyDerivation
+from crypto.output_file import OutputFile
+
+
+def _chunk_cipher(key: bytes, mode: str, iv: bytes, chunk_size: int,
+                  index: int) -> CipherCore:
+    """
+    Шифр для независимой обработки фрагмента index
+
+    CTR продолжает общий поток с блока index * chunk_size / 16. Для
+    CBC/CFB/OFB IV фрагмента - E_K(IV + index): непредсказуемый и разный
+    для каждого фрагмента.
+    """
+    if mode == 'ecb':
+        return CipherCore(key, mode)
+    if mode == 'ctr':
+        cipher = CipherCore(key, mode, iv)
+        cipher.set_state(index * chunk_size // CipherCore.BLOCK_SIZE)
+        return cipher
+
+    counter = (int.from_bytes(iv, 'big') + index) % 2 ** 128
+    chunk_iv = AES.new(key, AES.MODE_ECB).encrypt(counter.to_bytes(16, 'big'))
+    return CipherCore(key, mode, chunk_iv)
+
+
+def _chunk_tag(key: bytes, index: int, ciphertext: bytes) -> bytes:
+    """Тег фрагмента: HMAC по номеру и шифртексту (защита от перестановки)"""
+    authenticator = StreamAuthenticator(key)
+    authenticator.update(struct.pack('>Q', index))
+    authenticator.update(ciphertext)
+    return authenticator.finalize()
+
+
+def _process_chunks(encrypt: bool, key: bytes, mode: str, iv: bytes,
+                    chunk_size: int, authenticated: bool, input_path: str,
+                    output_path: str, chunks: list) -> list:
+    """
+    Обработка группы фрагментов (выполняется в процессе пула)
+
+    chunks - список (номер, смещение во входе, длина, смещение в выходе,
+    последний ли, ожидаемый тег). Возвращает список (номер, длина
+    результата, тег) для построения индекса.
+    """
+    results = []
+    with open(input_path, 'rb') as infile, open(output_path, 'r+b') as outfile:
+        for index, in_offset, length, out_offset, final, expected_tag in chunks:
+            data = os.pread(infile.fileno(), length, in_offset)
+            if len(data) != length:
+                raise ValueError(f"Truncated container chunk {index}")
+            cipher = _chunk_cipher(key, mode, iv, chunk_size, index)
+
+            tag = None
+            if encrypt:
+                result = cipher.encrypt_chunk(data, final)
+                if authenticated:
+                    tag = _chunk_tag(key, index, result)
+            else:
+                if authenticated and not StreamAuthenticator.compare(
+                        _chunk_tag(key, index, data), expected_tag):
+                    raise ValueError(
+                        f"Authentication failed for chunk {index}: "
+                        f"wrong key or the data has been modified"
+                    )
+                result = cipher.decrypt_chunk(data, final)
+
+            os.pwrite(outfile.fileno(), result, out_offset)
+            results.append((index, len(result), tag))
+    return results
+
+
+class Container:
+    """
+    Самоописываемый формат контейнера с индексом фрагментов
+
+    Структура файла (big-endian):
+        заголовок  magic 'CCCF' | version (1) | mode (1) | key bits (2) |
+                   flags (1) | chunk size (4) | IV (16) | kdf length (2) |
+                   заголовок KDF (KeyDerivation, если ключ получен из пароля)
+        фрагменты  шифртекст фрагментов открытого текста по chunk_size байт;
+                   каждый фрагмент шифруется независимо, паддинг ECB/CBC
+                   только у последнего
+        индекс     для каждого фрагмента: смещение (8) | длина шифртекста (4) |
+                   длина открытого текста (4) [| тег HMAC (32)]
+        [тег]      HMAC по заголовку, индексу и концевику (флаг authenticated)
+        концевик   смещение индекса (8) | число фрагментов (4) | magic 'CCIX'
+
+    Заголовок и индекс читаются без ключа, фрагменты можно расшифровывать
+    параллельно и в произвольном порядке.
+    """
+
+    MAGIC = b'CCCF'
+    INDEX_MAGIC = b'CCIX'
+    VERSION = 1
+    MODE_IDS = {'ecb': 0, 'cbc': 1, 'cfb': 2, 'ofb': 3, 'ctr': 4}
+    FLAG_AUTHENTICATED = 0x01
+    CHUNK_SIZE = 1024 * 1024
+    CHUNKS_PER_JOB = 4  # несколько групп фрагментов на процесс для балансировки
+
+    _HEADER = struct.Struct('>4sBBHBI16sH')
+    _ENTRY = struct.Struct('>QII')
+    _FOOTER = struct.Struct('>QI4s')
+
+    @staticmethod
+    def is_container(path: str) -> bool:
+        """Является ли файл контейнером (проверяются magic заголовка и концевика)"""
+        try:
+            with open(path, 'rb') as f:
+                if f.read(4) != Container.MAGIC:
+                    return False
+                f.seek(-Container._FOOTER.size, os.SEEK_END)
+                return f.read(Container._FOOTER.size)[-4:] == Container.INDEX_MAGIC
+        except OSError:
+            return False
+
+    @staticmethod
+    def read_layout(path: str) -> dict:
+        """
+        Разбор заголовка и индекса без расшифровки
+
+        Returns:
+            словарь с параметрами контейнера и списком фрагментов
+            (offset, length, plaintext_length, tag)
+        """
+        mode_names = {value: name for name, value in Container.MODE_IDS.items()}
+        with open(path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            header = f.read(Container._HEADER.size)
+            if len(header) != Container._HEADER.size:
+                raise ValueError("Input is too short to be a container")
+            (magic, version, mode_id, key_bits, flags, chunk_size, iv,
+             kdf_length) = Container._HEADER.unpack(header)
+            if magic != Container.MAGIC:
+                raise ValueError("Input is not a CryptoCore container")
+            if version != Container.VERSION:
+                raise ValueError(f"Unsupported container version: {version}")
+            if mode_id not in mode_names:
+                raise ValueError(f"Unknown mode id in container header: {mode_id}")
+
+            kdf_header = f.read(kdf_length)
+            kdf = None
+            if kdf_length:
+                f.seek(Container._HEADER.size)
+                kdf_name, kdf_params, salt, _ = KeyDerivation.read_header(f)
+                kdf = {'kdf': kdf_name, 'params': list(kdf_params), 'salt': salt.hex()}
+
+            f.seek(file_size - Container._FOOTER.size)
+            footer = f.read(Container._FOOTER.size)
+            index_offset, chunk_count, index_magic = Container._FOOTER.unpack(footer)
+            if index_magic != Container.INDEX_MAGIC:
+                raise ValueError("Container index is missing (truncated file?)")
+
+            authenticated = bool(flags & Container.FLAG_AUTHENTICATED)
+            entry_size = Container._ENTRY.size + \
+                (StreamAuthenticator.TAG_SIZE if authenticated else 0)
+            f.seek(index_offset)
+            index = f.read(entry_size * chunk_count)
+            tag = f.read(StreamAuthenticator.TAG_SIZE) if authenticated else None
+            if len(index) != entry_size * chunk_count:
+                raise ValueError("Truncated container index")
+
+        chunks = []
+        for position in range(0, len(index), entry_size):
+            offset, length, plaintext_length = Container._ENTRY.unpack_from(index, position)
+            chunk_tag = index[position + Container._ENTRY.size:position + entry_size]
+            chunks.append((offset, length, plaintext_length, chunk_tag or None))
+
+        return {
+            'version': version,
+            'mode': mode_names[mode_id],
+            'key_bits': key_bits,
+            'authenticated': authenticated,
+            'chunk_size': chunk_size,
+            'iv': iv if mode_id != Container.MODE_IDS['ecb'] else None,
+            'kdf': kdf,
+            'kdf_header': kdf_header,
+            'header': header + kdf_header,
+            'index': index,
+            'footer': footer,
+            'tag': tag,
+            'chunks': chunks,
+            'plaintext_size': sum(chunk[2] for chunk in chunks)
+        }
+
+    @staticmethod
+    def inspect(path: str) -> dict:
+        """Описание контейнера для инструментов (без ключа и расшифровки)"""
+        layout = Container.read_layout(path)
+        return {
+            'path': path,
+            'version': layout['version'],
+            'mode': layout['mode'],
+            'key_bits': layout['key_bits'],
+            'authenticated': layout['authenticated'],
+            'chunk_size': layout['chunk_size'],
+            'iv': layout['iv'].hex() if layout['iv'] else None,
+            'kdf': layout['kdf'],
+            'chunks': len(layout['chunks']),
+            'plaintext_size': layout['plaintext_size'],
+            'file_size': os.path.getsize(path),
+            'index': [{'offset': offset, 'length': length,
+                       'plaintext_length': plaintext_length}
+                      for offset, length, plaintext_length, _ in layout['chunks']]
+        }
+
+    @staticmethod
+    def _run(tasks: list, jobs: int, arguments: tuple) -> list:
+        """Обработка групп фрагментов в пуле процессов (или в текущем процессе)"""
+        if jobs <= 1 or len(tasks) <= 1:
+            return [result for task in tasks
+                    for result in _process_chunks(*arguments, task)]
+
+        # multiprocessing загружается только при параллельной обработке
+        from concurrent.futures import ProcessPoolExecutor
+        results = []
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks)),
+                                 initializer=CipherCore.init_worker,
+                                 initargs=(CipherCore.worker_state(arguments[2]),)) as pool:
+            futures = [pool.submit(_process_chunks, *arguments, task) for task in tasks]
+            for future in futures:
+                results.extend(future.result())
+        return results
+
+    @staticmethod
+    def _group(chunks: list, jobs: int) -> list:
+        """Разбиение фрагментов на непрерывные группы для процессов пула"""
+        groups = max(1, jobs * Container.CHUNKS_PER_JOB)
+        size = -(-len(chunks) // groups)
+        return [chunks[i:i + size] for i in range(0, len(chunks), size)]
+
+    @staticmethod
+    def _check_key(layout: dict, key: bytes):
+        if len(key) * 8 != layout['key_bits']:
+            raise ValueError(
+                f"Key size mismatch: container uses AES-{layout['key_bits']}, "
+                f"got a {len(key) * 8}-bit key"
+            )
+
+    @staticmethod
+    def encrypt_file(input_path: str, output_path: str, key: bytes, mode: str,
+                     chunk_size: int = CHUNK_SIZE, kdf_header: bytes = b'',
+                     authenticate: bool = False, jobs: int = 1):
+        """
+        Шифрование файла в контейнер
+
+        Длины шифртекстов фрагментов известны заранее (паддинг только у
+        последнего), поэтому фрагменты шифруются параллельно прямо на свои
+        места в выходном файле; индекс дописывается после них.
+        """
+        mode = mode.lower()
+        if mode not in Container.MODE_IDS:
+            raise ValueError(f"Unsupported mode: {mode}")
+        if chunk_size <= 0 or chunk_size % CipherCore.BLOCK_SIZE != 0:
+            raise ValueError(
+                f"Chunk size must be a positive multiple of "
+                f"{CipherCore.BLOCK_SIZE} bytes. Got {chunk_size}"
+            )
+
+        iv = CipherCore(key, mode).get_iv() or bytes(CipherCore.BLOCK_SIZE)
+        flags = Container.FLAG_AUTHENTICATED if authenticate else 0
+        header = Container._HEADER.pack(
+            Container.MAGIC, Container.VERSION, Container.MODE_IDS[mode],
+            len(key) * 8, flags, chunk_size, iv, len(kdf_header)
+        ) + kdf_header
+
+        file_size = os.path.getsize(input_path)
+        chunk_count = max(1, -(-file_size // chunk_size))
+        padded = mode in ('ecb', 'cbc')
+        chunks = []
+        for index in range(chunk_count):
+            offset = index * chunk_size
+            length = min(chunk_size, file_size - offset)
+            final = index == chunk_count - 1
+            chunks.append((index, offset, length, len(header) + offset, final, None))
+
+        last_length = chunks[-1][2]
+        if padded:
+            last_length += CipherCore.BLOCK_SIZE - last_length % CipherCore.BLOCK_SIZE
+        index_offset = len(header) + (chunk_count - 1) * chunk_size + last_length
+
+        with open(output_path, 'wb') as outfile:
+            OutputFile.preallocate(outfile, index_offset)
+            outfile.write(header)
+
+        results = Container._run(Container._group(chunks, jobs), jobs,
+                                 (True, key, mode, iv, chunk_size, authenticate,
+                                  input_path, output_path))
+        results.sort()
+
+        index = b''.join(
+            Container._ENTRY.pack(chunks[i][3], length, chunks[i][2]) + (tag or b'')
+            for i, length, tag in results
+        )
+        footer = Container._FOOTER.pack(index_offset, chunk_count, Container.INDEX_MAGIC)
+        with open(output_path, 'r+b') as outfile:
+            outfile.seek(index_offset)
+            outfile.write(index)
+            if authenticate:
+                outfile.write(Container._layout_tag(key, header, index, footer))
+            outfile.write(footer)
+
+        CryptoLogger.log(
+            f"Container encryption: {file_size} bytes in {chunk_count} chunks "
+            f"of {chunk_size} (mode: {mode}, authenticated: {authenticate})",
+            False
+        )
+
+    @staticmethod
+    def _layout_tag(key: bytes, header: bytes, index: bytes, footer: bytes) -> bytes:
+        """HMAC по заголовку, индексу (с тегами фрагментов) и концевику"""
+        authenticator = StreamAuthenticator(key)
+        for part in (header, index, footer):
+            authenticator.update(part)
+        return authenticator.finalize()
+
+    @staticmethod
+    def open_key(path: str, key: bytes = None, password: str = None) -> tuple:
+        """
+        Разбор контейнера и получение ключа (явного или из пароля по заголовку KDF)
+
+        Returns:
+            (layout, key)
+        """
+        layout = Container.read_layout(path)
+        if password is not None:
+            if not layout['kdf_header']:
+                raise ValueError("Container was not encrypted with a password")
+            with open(path, 'rb') as f:
+                f.seek(Container._HEADER.size)
+                key = KeyDerivation.recover(password, f)
+        if key is None:
+            raise ValueError("Key or password required")
+        Container._check_key(layout, key)
+
+        if layout['authenticated']:
+            expected = Container._layout_tag(key, layout['header'], layout['index'],
+                                             layout['footer'])
+            if not StreamAuthenticator.compare(expected, layout['tag']):
+                raise ValueError(
+                    "Authentication failed: wrong key or the container has been modified"
+                )
+        return layout, key
+
+    @staticmethod
+    def decrypt_file(input_path: str, output_path: str, key: bytes = None,
+                     password: str = None, jobs: int = 1):
+        """
+        Дешифрование контейнера (фрагменты обрабатываются параллельно)
+
+        Позиции открытого текста фрагментов известны из индекса, поэтому
+        процессы пишут результат сразу в свои диапазоны выходного файла.
+        """
+        layout, key = Container.open_key(input_path, key, password)
+        chunks = []
+        position = 0
+        for index, (offset, length, plaintext_length, tag) in enumerate(layout['chunks']):
+            chunks.append((index, offset, length, position,
+                           index == len(layout['chunks']) - 1, tag))
+            position += plaintext_length
+
+        with open(output_path, 'wb') as outfile:
+            OutputFile.preallocate(outfile, position)
+
+        results = Container._run(Container._group(chunks, jobs), jobs,
+                                 (False, key, layout['mode'], layout['iv'],
+                                  layout['chunk_size'], layout['authenticated'],
+                                  input_path, output_path))
+        for index, length, _ in results:
+            if length != layout['chunks'][index][2]:
+                raise ValueError(f"Container chunk {index} has unexpected length")
+
+        CryptoLogger.log(
+            f"Container decryption: {position} bytes in {len(chunks)} chunks "
+            f"(mode: {layout['mode']}, authenticated: {layout['authenticated']})",
+            False
+        )
+
+
+class ContainerReader:
+    """
+    Произвольный доступ к открытому тексту контейнера
+
+    Расшифровываются только фрагменты, пересекающие запрошенный диапазон.
+
+    Пример:
+        with ContainerReader('data.cccf', key) as reader:
+            header = reader.read_at(0, 512)
+    """
+
+    def __init__(self, path: str, key: bytes = None, password: str = None):
+        self._layout, self._key = Container.open_key(path, key, password)
+        self._file = open(path, 'rb')
+        self.size = self._layout['plaintext_size']
+
+    def read_chunk(self, index: int) -> bytes:
+        """Открытый текст фрагмента index (тег проверяется, если он есть)"""
+        chunks = self._layout['chunks']
+        if not 0 <= index < len(chunks):
+            raise IndexError(f"Chunk index out of range: {index}")
+        offset, length, _, tag = chunks[index]
+        data = os.pread(self._file.fileno(), length, offset)
+        if self._layout['authenticated'] and not StreamAuthenticator.compare(
+                _chunk_tag(self._key, index, data), tag):
+            raise ValueError(f"Authentication failed for chunk {index}")
+        cipher = _chunk_cipher(self._key, self._layout['mode'], self._layout['iv'],
+                               self._layout['chunk_size'], index)
+        return cipher.decrypt_chunk(data, index == len(chunks) - 1)
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        """Чтение size байт открытого текста начиная с offset"""
+        if offset < 0 or size < 0:
+            raise ValueError("Offset and size must be non-negative")
+        end = min(offset + size, self.size)
+        chunk_size = self._layout['chunk_size']
+        parts = []
+        position = offset
+        while position < end:
+            index = position // chunk_size
+            start = index * chunk_size
+            plaintext = self.read_chunk(index)
+            parts.append(plaintext[position - start:end - start])
+            position = start + chunk_size
+        return b''.join(parts)
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
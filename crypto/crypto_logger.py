@@ -1,6 +1,7 @@
 import logging
 import datetime
 import os
+import time
 
 
 class CryptoLogger:
@@ -30,7 +31,7 @@ class CryptoLogger:
     def log_performance(operation: str, bytes_processed: int, start_time: float):
         """Логирование производительности"""
         elapsed = time.time() - start_time
-        speed = (bytes_processed * 8) / elapsed / 1e6
+        speed = (bytes_processed * 8) / elapsed / 1e6 if elapsed > 0 else 0
         CryptoLogger.log(
             f"{operation}: {speed:.2f} Mbps, {bytes_processed} bytes, {elapsed:.2f} s"
         )
\ No newline at end of file
@@ -0,0 +1,461 @@
+"""
+Долгоживущий процесс CryptoCore на Unix-сокете (cryptocore serve)
+
+Запросы и ответы передаются кадрами: заголовок '>II' (длина JSON, длина
+полезной нагрузки), JSON с параметрами операции и необязательные байты
+данных. Операции: encrypt/decrypt файла (input/output) или переданных
+в кадре данных, stats, ping, shutdown.
+
+Процесс держит теплыми импортированные модули, результат самопроверки
+нативных режимов, калибровку KDF, ключи по имени (--key-file) и развернутые
+ключи AES (CipherCore.SCHEDULES).
+"""
+
+import argparse
+import json
+import os
+import select
+import signal
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from crypto.authenticator import StreamAuthenticator
+from crypto.cipher_core import CipherCore
+from crypto.crypto_logger import CryptoLogger
+from crypto.file_processor import FileProcessor
+from crypto.kdf import KeyDerivation
+from crypto.key_generator import KeyGenerator
+from crypto.metrics import Metrics
+
+_FRAME = struct.Struct('>II')
+MAX_HEADER_SIZE = 1024 * 1024
+MAX_PAYLOAD_SIZE = 256 * 1024 * 1024
+OPERATIONS = ('encrypt', 'decrypt', 'stats', 'ping', 'shutdown')
+
+
+def default_socket_path() -> str:
+    """Сокет в XDG_RUNTIME_DIR (или во временном каталоге) текущего пользователя"""
+    directory = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(directory, f'cryptocore-{os.getuid()}.sock')
+
+
+def _recv_exact(sock, size: int) -> bytes:
+    buffer = bytearray()
+    while len(buffer) < size:
+        data = sock.recv(min(size - len(buffer), 1024 * 1024))
+        if not data:
+            raise ConnectionError("Connection closed in the middle of a frame")
+        buffer += data
+    return bytes(buffer)
+
+
+def send_frame(sock, header: dict, payload: bytes = b''):
+    """Отправка кадра: длины, JSON-заголовок, данные"""
+    data = json.dumps(header).encode('utf-8')
+    sock.sendall(_FRAME.pack(len(data), len(payload)) + data)
+    if payload:
+        sock.sendall(payload)
+
+
+def recv_frame(sock) -> tuple:
+    """
+    Прием кадра
+
+    Returns:
+        (header, payload) или None, если соединение закрыто между кадрами
+    """
+    first = sock.recv(_FRAME.size)
+    if not first:
+        return None
+    if len(first) < _FRAME.size:
+        first += _recv_exact(sock, _FRAME.size - len(first))
+    header_size, payload_size = _FRAME.unpack(first)
+    if header_size > MAX_HEADER_SIZE or payload_size > MAX_PAYLOAD_SIZE:
+        raise ValueError(f"Frame too large: header {header_size}, payload {payload_size}")
+    header = json.loads(_recv_exact(sock, header_size).decode('utf-8'))
+    payload = _recv_exact(sock, payload_size) if payload_size else b''
+    return header, payload
+
+
+def request(socket_path: str, header: dict, payload: bytes = b'',
+            timeout: float = None) -> tuple:
+    """Один запрос к демону: (заголовок ответа, данные ответа)"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        send_frame(sock, header, payload)
+        response = recv_frame(sock)
+    if response is None:
+        raise ConnectionError("Daemon closed the connection without a response")
+    return response
+
+
+class CryptoDaemon:
+    """
+    Сервер запросов шифрования на Unix-сокете с пулом потоков
+
+    Каждое соединение обслуживается отдельным потоком и может передать
+    несколько запросов подряд; операции выполняются в пуле из workers
+    потоков (pycryptodome и hashlib отпускают GIL на время вычислений).
+    Глубина очереди, время ожидания и задержка запросов доступны через
+    stats и метрики этапов queue/request. SIGTERM/SIGINT или запрос
+    shutdown прекращают прием соединений, дожидаются выполнения уже
+    принятых запросов и удаляют сокет.
+    """
+
+    ACCEPT_TIMEOUT = 0.5  # секунды между проверками флага остановки
+
+    def __init__(self, socket_path: str = None, workers: int = None,
+                 keys: dict = None):
+        """
+        Args:
+            socket_path: путь сокета (None - default_socket_path())
+            workers: размер пула (None - число CPU)
+            keys: ключи по имени для запросов с key_ref
+        """
+        self.socket_path = socket_path or default_socket_path()
+        self.workers = workers or os.cpu_count() or 1
+        self.keys = dict(keys or {})
+        self._kdf_params = {}
+        self._kdf_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers,
+                                        thread_name_prefix='cryptocore-worker')
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._served = 0
+        self._failed = 0
+        self._connections = set()
+        self._stopping = threading.Event()
+        self._started = time.time()
+
+    # Разбор запроса
+
+    def _key(self, header: dict) -> bytes:
+        if header.get('key_ref') is not None:
+            key = self.keys.get(header['key_ref'])
+            if key is None:
+                raise ValueError(f"Unknown key reference: {header['key_ref']}")
+            return key
+        if header.get('key') is not None:
+            return bytes.fromhex(header['key'])
+        return None
+
+    def _kdf_options(self, header: dict) -> dict:
+        """Параметры KDF; калибровка выполняется один раз на KDF и целевое время"""
+        if header.get('password') is None:
+            return {}
+        kdf = header.get('kdf', KeyDerivation.DEFAULT_KDF)
+        target = header.get('kdf_target_ms', KeyDerivation.TARGET_LATENCY * 1000)
+        params = None
+        if header['op'] == 'encrypt':
+            # Калибровка под отдельной блокировкой: параллельные замеры исказили
+            # бы друг друга, а self._lock нужен статистике и во время калибровки
+            with self._kdf_lock:
+                params = self._kdf_params.get((kdf, target))
+                if params is None:
+                    params = KeyDerivation.calibrate(kdf, target / 1000)
+                    self._kdf_params[(kdf, target)] = params
+        return {'password': header['password'], 'kdf': kdf, 'kdf_params': params,
+                'key_length': header.get('key_length', KeyGenerator.KEY_LENGTH)}
+
+    # Операции
+
+    def _process_file(self, header: dict) -> tuple:
+        encrypt = header['op'] == 'encrypt'
+        if not os.path.isabs(header['input']) or not os.path.isabs(header.get('output', '')):
+            raise ValueError("Input and output paths must be absolute")
+        if os.path.isdir(header['input']):
+            raise ValueError("Directories are not supported by the daemon")
+        if os.path.abspath(header['input']) == os.path.abspath(header['output']):
+            raise ValueError("Input and output files cannot be the same")
+        interval = header.get('checkpoint_interval')
+        if (header.get('jobs') or 1) > 1:
+            # fork пула процессов из рабочего потока может унаследовать чужие
+            # захваченные блокировки и зависнуть; параллелизм демона - --workers
+            CryptoLogger.log(
+                "The daemon processes each file in a single process, ignoring jobs",
+                False
+            )
+        FileProcessor.process_file(
+            input_path=header['input'],
+            output_path=header['output'],
+            key=self._key(header),
+            mode=header.get('mode'),
+            encrypt=encrypt,
+            iv=bytes.fromhex(header['iv']) if header.get('iv') else None,
+            chunk_size=header.get('chunk_size'),
+            jobs=1,
+            use_mmap=header.get('mmap', True),
+            authenticate=header.get('auth', False),
+            container=header.get('container', False),
+            checkpoint=header.get('checkpoint', False),
+            resume=header.get('resume', False),
+            checkpoint_interval=interval * 1024 * 1024 if interval else None,
+            sync=header.get('fsync', False),
+            **self._kdf_options(header)
+        )
+        return {'output': header['output']}, b''
+
+    def _process_inline(self, header: dict, payload: bytes) -> tuple:
+        """Данные в кадре: тот же формат, что у файла (IV, шифртекст, тег --auth)"""
+        key = self._key(header)
+        if key is None:
+            raise ValueError("Inline payloads need key or key_ref (passwords work with files)")
+        mode = header.get('mode')
+        if not mode:
+            raise ValueError("Mode is required")
+        authenticate = header.get('auth', False)
+
+        # Ключ берется из общего кэша расписаний, поэтому объект на запрос почти
+        # бесплатен; IV объекта не используется (encrypt_many/decrypt_many
+        # получают IV сообщения), нулевой IV лишь избавляет от запроса к генератору
+        cipher = CipherCore(key, mode, bytes(CipherCore.BLOCK_SIZE))
+        if header['op'] == 'encrypt':
+            [(iv, ciphertext)] = cipher.encrypt_many([payload])
+            result = (iv or b'') + ciphertext
+            if authenticate:
+                authenticator = StreamAuthenticator(key)
+                authenticator.update(result)
+                result += authenticator.finalize()
+            return {}, result
+
+        if authenticate:
+            if len(payload) < StreamAuthenticator.TAG_SIZE:
+                raise ValueError("Input is too short to contain an authentication tag")
+            payload, tag = (payload[:-StreamAuthenticator.TAG_SIZE],
+                            payload[-StreamAuthenticator.TAG_SIZE:])
+            authenticator = StreamAuthenticator(key)
+            authenticator.update(payload)
+            authenticator.verify(tag)
+        iv = None
+        if cipher.mode != 'ecb':
+            if header.get('iv'):
+                iv = bytes.fromhex(header['iv'])
+            else:
+                iv = payload[:CipherCore.BLOCK_SIZE]
+                payload = payload[CipherCore.BLOCK_SIZE:]
+        return {}, cipher.decrypt_many([(iv, payload)])[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            state = {
+                'queue_depth': self._queued,
+                'active': self._active,
+                'workers': self.workers,
+                'served': self._served,
+                'failed': self._failed,
+                'connections': len(self._connections),
+                'uptime_s': time.time() - self._started,
+                'stopping': self._stopping.is_set()
+            }
+        state['metrics'] = Metrics.snapshot()
+        return state
+
+    def _execute(self, header: dict, payload: bytes, submitted: float) -> tuple:
+        """Выполнение в потоке пула с учетом очереди и задержки"""
+        started = time.perf_counter()
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+        operation = header['op']
+        Metrics.record('queue', operation, started - submitted)
+        try:
+            if header.get('input') is not None:
+                response, data = self._process_file(header)
+            else:
+                response, data = self._process_inline(header, payload)
+            ok = True
+            return response, data
+        except Exception as e:
+            ok = False
+            return {'error': f"{type(e).__name__}: {e}"}, b''
+        finally:
+            elapsed = time.perf_counter() - started
+            Metrics.record('request', operation, time.perf_counter() - submitted,
+                           len(payload))
+            with self._lock:
+                self._active -= 1
+                self._served += 1
+                self._failed += 0 if ok else 1
+            CryptoLogger.log(
+                f"Daemon {operation} ({header.get('mode') or 'auto'}) "
+                f"{'ok' if ok else 'failed'}: "
+                f"queued {(started - submitted) * 1000:.1f} ms, "
+                f"processed {elapsed * 1000:.1f} ms",
+                not ok
+            )
+
+    def handle(self, header: dict, payload: bytes) -> tuple:
+        """Обработка одного запроса (вызывается потоком соединения)"""
+        operation = header.get('op')
+        if operation not in OPERATIONS:
+            return {'ok': False, 'error': f"Unsupported operation: {operation}"}, b''
+        if operation == 'ping':
+            return {'ok': True}, b''
+        if operation == 'stats':
+            return {'ok': True, 'stats': self.stats()}, b''
+        if operation == 'shutdown':
+            self.shutdown()
+            return {'ok': True}, b''
+        if self._stopping.is_set():
+            return {'ok': False, 'error': "Daemon is shutting down"}, b''
+
+        submitted = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+            queue_depth = self._queued
+        try:
+            future = self._pool.submit(self._execute, header, payload, submitted)
+        except RuntimeError:
+            with self._lock:
+                self._queued -= 1
+            return {'ok': False, 'error': "Daemon is shutting down"}, b''
+        response, data = future.result()
+        response['ok'] = 'error' not in response
+        response['queue_depth'] = queue_depth
+        response['latency_ms'] = (time.perf_counter() - submitted) * 1000
+        return response, data
+
+    # Сеть
+
+    def _serve_connection(self, connection):
+        with self._lock:
+            self._connections.add(connection)
+        try:
+            while True:
+                # Между запросами: при остановке простаивающее соединение закрывается
+                if not select.select([connection], [], [], self.ACCEPT_TIMEOUT)[0]:
+                    if self._stopping.is_set():
+                        break
+                    continue
+                frame = recv_frame(connection)
+                if frame is None:
+                    break
+                response, data = self.handle(*frame)
+                send_frame(connection, response, data)
+        except (OSError, ValueError) as e:
+            CryptoLogger.log(f"Daemon connection error: {e}", True)
+        finally:
+            with self._lock:
+                self._connections.discard(connection)
+            connection.close()
+
+    def shutdown(self):
+        """Начало плавной остановки (безопасно из обработчика сигнала и из потоков)"""
+        self._stopping.set()
+
+    def serve_forever(self):
+        """Прием соединений до shutdown(), затем завершение принятых запросов"""
+        if os.path.exists(self.socket_path):
+            # Сокет от упавшего процесса удаляется, работающий демон не трогаем
+            try:
+                request(self.socket_path, {'op': 'ping'}, timeout=1)
+                raise RuntimeError(f"Daemon already listening on {self.socket_path}")
+            except (ConnectionError, OSError):
+                os.remove(self.socket_path)
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        previous_umask = os.umask(0o177)  # сокет доступен только владельцу
+        try:
+            server.bind(self.socket_path)
+        finally:
+            os.umask(previous_umask)
+        server.listen()
+        server.settimeout(self.ACCEPT_TIMEOUT)
+
+        handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                handlers[signum] = signal.signal(signum, lambda *_: self.shutdown())
+
+        CryptoLogger.log(
+            f"Daemon listening on {self.socket_path} ({self.workers} workers, "
+            f"{len(self.keys)} named keys)",
+            False
+        )
+        threads = []
+        try:
+            while not self._stopping.is_set():
+                try:
+                    connection, _ = server.accept()
+                except socket.timeout:
+                    continue
+                except InterruptedError:
+                    continue
+                thread = threading.Thread(target=self._serve_connection,
+                                          args=(connection,), daemon=True)
+                thread.start()
+                threads = [t for t in threads if t.is_alive()] + [thread]
+        finally:
+            server.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            CryptoLogger.log(
+                f"Daemon stopping: draining {self._queued + self._active} request(s)",
+                False
+            )
+            self._pool.shutdown(wait=True)
+            for thread in threads:
+                thread.join()
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+            CryptoLogger.log(f"Daemon stopped after {self._served} request(s)", False)
+
+
+def _load_key_files(specs: list) -> dict:
+    """NAME=PATH -> {NAME: ключ}; файл содержит ключ в hex"""
+    keys = {}
+    for spec in specs or []:
+        name, separator, path = spec.partition('=')
+        if not separator or not name:
+            raise ValueError(f"Key file must be given as NAME=PATH: {spec}")
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read().strip().lower().replace(':', '').replace(' ', '')
+        key = bytes.fromhex(text[2:] if text.startswith('0x') else text)
+        if len(key) not in (16, 24, 32):
+            raise ValueError(f"Key {name} must be 16, 24, or 32 bytes (got {len(key)})")
+        keys[name] = key
+    return keys
+
+
+def serve_main(argv: list = None) -> int:
+    """Точка входа `cryptocore serve`"""
+    parser = argparse.ArgumentParser(
+        prog='cryptocore serve',
+        description='Run CryptoCore as a daemon on a local Unix domain socket '
+                    '(requests are sent with `cryptocore client`)'
+    )
+    parser.add_argument('--socket', default=default_socket_path(),
+                        help='Socket path (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker threads (default: number of CPUs)')
+    parser.add_argument('--key-file', action='append', metavar='NAME=PATH',
+                        help='Named key (hex in PATH) that clients reference as '
+                             '--key @NAME (may be repeated)')
+    parser.add_argument('--cipher-cache', type=int,
+                        default=CipherCore.SCHEDULES.max_keys, metavar='KEYS',
+                        help='Expanded AES keys kept in memory (default: %(default)s)')
+    parser.add_argument('--backend', default=CipherCore.DEFAULT_BACKEND,
+                        choices=list(CipherCore.BACKENDS),
+                        help='Cipher mode implementation for all requests')
+    args = parser.parse_args(argv)
+
+    CryptoLogger.setup_logging()
+    try:
+        if args.workers is not None and args.workers < 1:
+            raise ValueError("Number of workers must be at least 1")
+        CipherCore.DEFAULT_BACKEND = args.backend
+        CipherCore.SCHEDULES.max_keys = args.cipher_cache
+        daemon = CryptoDaemon(args.socket, args.workers, _load_key_files(args.key_file))
+        print(f"Listening on {daemon.socket_path} ({daemon.workers} workers)",
+              flush=True)
+        daemon.serve_forever()
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
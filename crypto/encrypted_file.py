@@ -0,0 +1,260 @@
+import io
+import os
+from collections import OrderedDict
+from Crypto.Util.Padding import unpad
+from crypto.authenticator import StreamAuthenticator
+from crypto.cipher_core import CipherCore
+from crypto.kdf import KeyDerivation
+
+
+class EncryptedFile(io.RawIOBase):
+    """
+    Файловый объект для произвольного чтения зашифрованного файла
+
+    Расшифровывает только запрошенные фрагменты, поэтому чтение небольшого
+    диапазона из большого файла стоит нескольких блоков. Поддерживаются
+    режимы с произвольным доступом: CTR (номер блока определяет счетчик),
+    CBC и CFB (достаточно предшествующего блока шифртекста), а также ECB.
+    Расшифрованные фрагменты хранятся в ограниченном LRU-кэше.
+
+    Файлы --password (заголовок KDF перед IV) открываются с password, файлы
+    --auth - с authenticated=True: тег в конце файла не входит в данные и
+    проверяется при открытии одним проходом по файлу.
+
+    Пример:
+        with EncryptedFile('archive.zip.ctr.enc', key, 'ctr') as f:
+            zipfile.ZipFile(f).read('README.txt')
+    """
+
+    SEEKABLE_MODES = ('ecb', 'cbc', 'cfb', 'ctr')
+    CHUNK_SIZE = 64 * 1024
+    CACHE_SIZE = 32  # число фрагментов в кэше
+    _VERIFY_READ_SIZE = 1024 * 1024
+
+    def __init__(self, source, key: bytes, mode: str, iv: bytes = None,
+                 chunk_size: int = CHUNK_SIZE, cache_size: int = CACHE_SIZE,
+                 password: str = None, authenticated: bool = False):
+        """
+        Args:
+            source: путь к файлу или открытый двоичный файловый объект
+            key: ключ шифрования (None при password)
+            mode: режим работы ('ecb', 'cbc', 'cfb', 'ctr')
+            iv: вектор инициализации; если не указан, читается из начала файла
+            chunk_size: размер расшифровываемого фрагмента (кратен 16 байтам)
+            cache_size: максимальное число фрагментов в LRU-кэше
+            password: пароль; ключ получается по заголовку KDF в начале файла
+            authenticated: файл зашифрован с --auth (в конце тег HMAC-SHA256)
+        """
+        super().__init__()
+        mode = mode.lower()
+        if mode not in self.SEEKABLE_MODES:
+            raise ValueError(f"Random access is not supported for mode: {mode}")
+        if chunk_size <= 0 or chunk_size % CipherCore.BLOCK_SIZE != 0:
+            raise ValueError(
+                f"Chunk size must be a positive multiple of "
+                f"{CipherCore.BLOCK_SIZE} bytes. Got {chunk_size}"
+            )
+        if cache_size < 1:
+            raise ValueError("Cache size must be at least 1")
+        if (key is None) == (password is None):
+            raise ValueError("Exactly one of key/password must be given")
+
+        if isinstance(source, (str, bytes, os.PathLike)):
+            self._file = open(source, 'rb')
+            self._owns_file = True
+        else:
+            self._file = source
+            self._owns_file = False
+
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._position = 0
+
+        try:
+            self._open(key, iv, password, authenticated)
+        except BaseException:
+            self.close()
+            raise
+
+    def _open(self, key: bytes, iv: bytes, password: str, authenticated: bool):
+        """Разбор заголовка KDF, IV и тега; проверка тега"""
+        self._file.seek(0, os.SEEK_END)
+        file_size = self._file.tell()
+        self._file.seek(0)
+
+        header_size = 0
+        if password is not None:
+            key = KeyDerivation.recover(password, self._file)
+            header_size = self._file.tell()
+        elif iv is None and \
+                self._file.read(len(KeyDerivation.MAGIC)) == KeyDerivation.MAGIC:
+            raise ValueError(
+                "Input starts with a KDF header (was it encrypted with --password?), "
+                "open it with password"
+            )
+
+        self._data_offset = header_size
+        if self.mode != 'ecb' and iv is None:
+            self._file.seek(header_size)
+            iv = self._file.read(CipherCore.BLOCK_SIZE)
+            if len(iv) != CipherCore.BLOCK_SIZE:
+                raise ValueError(
+                    f"Invalid IV in file: expected 16 bytes, got {len(iv)}"
+                )
+            self._data_offset += CipherCore.BLOCK_SIZE
+
+        payload_end = file_size
+        if authenticated:
+            payload_end -= StreamAuthenticator.TAG_SIZE
+            if payload_end < self._data_offset:
+                raise ValueError("Input is too short to contain an authentication tag")
+            self._verify(key, iv, header_size, payload_end)
+
+        self.iv = iv
+        self._cipher = CipherCore(key, self.mode, iv)
+        self._ciphertext_size = payload_end - self._data_offset
+        self._size = self._plaintext_size()
+
+    def _verify(self, key: bytes, iv: bytes, header_size: int, payload_end: int):
+        """
+        Проверка тега --auth: MAC по заголовку KDF, IV и шифртексту, как в
+        FileProcessor (явно переданный IV тоже аутентифицирован)
+        """
+        authenticator = StreamAuthenticator(key)
+        self._file.seek(0)
+        authenticator.update(self._file.read(header_size))
+        if iv is not None and self._data_offset == header_size:
+            authenticator.update(iv)
+        position = header_size
+        while position < payload_end:
+            data = self._file.read(min(self._VERIFY_READ_SIZE, payload_end - position))
+            if not data:
+                raise ValueError("Input changed while verifying the authentication tag")
+            authenticator.update(data)
+            position += len(data)
+        authenticator.verify(self._file.read(StreamAuthenticator.TAG_SIZE))
+
+    def _plaintext_size(self) -> int:
+        """Размер открытого текста (для ECB/CBC с учетом PKCS7 паддинга)"""
+        if self.mode in ('cfb', 'ctr'):
+            return self._ciphertext_size
+
+        if self._ciphertext_size == 0 or \
+                self._ciphertext_size % CipherCore.BLOCK_SIZE != 0:
+            raise ValueError("Data length must be multiple of block size")
+
+        last_block_index = self._ciphertext_size // CipherCore.BLOCK_SIZE - 1
+        last_block = self._decrypt_range(last_block_index, 1)
+        return self._ciphertext_size - CipherCore.BLOCK_SIZE + \
+            len(unpad(last_block, CipherCore.BLOCK_SIZE))
+
+    def _read_ciphertext(self, offset: int, size: int) -> bytes:
+        """Чтение шифртекста по смещению относительно начала данных"""
+        self._file.seek(self._data_offset + offset)
+        return self._file.read(size)
+
+    def _decrypt_range(self, block_index: int, block_count: int) -> bytes:
+        """Дешифрование block_count блоков, начиная с блока block_index"""
+        offset = block_index * CipherCore.BLOCK_SIZE
+
+        if self.mode == 'ctr':
+            self._cipher.set_state(block_index)
+        elif self.mode in ('cbc', 'cfb'):
+            if block_index == 0:
+                self._cipher.set_state(self.iv)
+            else:
+                self._cipher.set_state(
+                    self._read_ciphertext(offset - CipherCore.BLOCK_SIZE,
+                                          CipherCore.BLOCK_SIZE)
+                )
+
+        data = self._read_ciphertext(offset, block_count * CipherCore.BLOCK_SIZE)
+        # Невыровненным может быть только хвост потока в CFB/CTR
+        return self._cipher.decrypt_chunk(
+            data, final=len(data) % CipherCore.BLOCK_SIZE != 0
+        )
+
+    def _get_chunk(self, chunk_index: int) -> bytes:
+        """Расшифрованный фрагмент из кэша или с диска"""
+        chunk = self._cache.get(chunk_index)
+        if chunk is not None:
+            self.hits += 1
+            self._cache.move_to_end(chunk_index)
+            return chunk
+
+        self.misses += 1
+        blocks_per_chunk = self.chunk_size // CipherCore.BLOCK_SIZE
+        chunk = self._decrypt_range(chunk_index * blocks_per_chunk, blocks_per_chunk)
+        # Отбрасываем паддинг, попавший в последний фрагмент
+        chunk = chunk[:max(0, self._size - chunk_index * self.chunk_size)]
+
+        self._cache[chunk_index] = chunk
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return chunk
+
+    def cache_info(self) -> dict:
+        """Статистика LRU-кэша расшифрованных фрагментов"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._cache),
+            'max_size': self.cache_size,
+            'chunk_size': self.chunk_size
+        }
+
+    def size(self) -> int:
+        """Размер открытого текста"""
+        return self._size
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        self._checkClosed()
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._checkClosed()
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+
+        if position < 0:
+            raise ValueError(f"Negative seek position: {position}")
+        self._position = position
+        return position
+
+    def readinto(self, buffer) -> int:
+        self._checkClosed()
+        view = memoryview(buffer).cast('B')
+        written = 0
+
+        while written < len(view) and self._position < self._size:
+            chunk_index, chunk_offset = divmod(self._position, self.chunk_size)
+            chunk = self._get_chunk(chunk_index)
+            size = min(len(chunk) - chunk_offset, len(view) - written)
+            view[written:written + size] = chunk[chunk_offset:chunk_offset + size]
+            written += size
+            self._position += size
+
+        return written
+
+    def close(self):
+        if not self.closed:
+            if self._owns_file:
+                self._file.close()
+            self._cache.clear()
+        super().close()
@@ -1,24 +1,74 @@
+import mmap
 import os
+import stat
 import time
+import traceback
+from crypto.authenticator import StreamAuthenticator
 from crypto.cipher_core import CipherCore
+from crypto.container import Container
 from crypto.crypto_logger import CryptoLogger
+from crypto.kdf import KeyDerivation
+from crypto.metrics import Metrics
+from crypto.key_generator import KeyGenerator
+from crypto.output_file import OutputFile
+from crypto.parallel_processor import ParallelProcessor
+from crypto.resumable import Checkpoint, ResumableEncryptor
 
 
 class FileProcessor:
+    CHUNK_SIZE = 1024 * 1024  # 1 МиБ, кратно размеру блока AES
+
     @staticmethod
     def process_file(input_path: str, output_path: str, key: bytes,
-                     mode: str, encrypt: bool, iv: bytes = None):
+                     mode: str, encrypt: bool, iv: bytes = None,
+                     chunk_size: int = None, jobs: int = 1, use_mmap: bool = True,
+                     password: str = None, kdf: str = KeyDerivation.DEFAULT_KDF,
+                     kdf_params: tuple = None,
+                     key_length: int = KeyGenerator.KEY_LENGTH,
+                     authenticate: bool = False, container: bool = False,
+                     checkpoint: bool = False, resume: bool = False,
+                     checkpoint_interval: int = None, sync: bool = False):
         """
         Обработка файла с поддержкой разных режимов шифрования
 
         Args:
             input_path: путь к входному файлу
             output_path: путь к выходному файлу
-            key: ключ шифрования
+            key: ключ шифрования (None при использовании password)
             mode: режим работы
             encrypt: True для шифрования, False для дешифрования
             iv: вектор инициализации (для дешифрования)
+            chunk_size: размер фрагмента потоковой обработки (кратен 16 байтам),
+                        ограничивает пиковое потребление памяти
+            jobs: число процессов (шифрование CTR, дешифрование CTR/CBC/CFB)
+            use_mmap: отображать файлы в память (для каналов и пустых файлов
+                      автоматически используется потоковое чтение)
+            password: пароль вместо ключа; при шифровании перед IV пишется
+                      заголовок KDF с солью и параметрами, при дешифровании
+                      ключ восстанавливается по этому заголовку
+            kdf: KDF для шифрования по паролю ('pbkdf2-sha256', 'scrypt', 'custom')
+            kdf_params: параметры KDF (None - калибровка под текущую машину)
+            key_length: длина ключа, получаемого из пароля
+            authenticate: encrypt-then-MAC - HMAC-SHA256 по заголовку, IV и
+                          шифртексту вычисляется в том же проходе и
+                          дописывается в конец файла; при дешифровании тег
+                          проверяется до фиксации результата
+            container: шифрование в самоописываемый контейнер с индексом
+                       фрагментов (Container); при дешифровании контейнер
+                       определяется автоматически, режим берется из заголовка
+            checkpoint: шифрование с контрольными точками (<output>.ckpt):
+                        при сбое частичный результат сохраняется
+            resume: продолжить прерванное шифрование с последней
+                    контрольной точки (включает checkpoint)
+            checkpoint_interval: байт открытого текста между контрольными точками
+            sync: fsync результата перед атомарной фиксацией (OutputFile.write)
+
+        Результат пишется во временный файл и переименовывается в output_path
+        только после успешного завершения (кроме шифрования с контрольными
+        точками, которое продолжает частичный результат на месте).
         """
+        chunk_size = FileProcessor._check_chunk_size(chunk_size)
+
         if not os.path.exists(input_path):
             raise FileNotFoundError(f"Input file not found: {input_path}")
 
@@ -31,16 +81,115 @@ class FileProcessor:
             False
         )
 
+        # Контейнер распознается по заголовку, старые файлы (IV + шифртекст) читаются как раньше
+        container_info = None
+        if not encrypt and Container.is_container(input_path):
+            container_info = Container.inspect(input_path)
+            container = True
+            authenticate = container_info['authenticated']
+            if mode and mode != container_info['mode']:
+                CryptoLogger.log(
+                    f"Container mode {container_info['mode']} overrides "
+                    f"requested mode {mode}",
+                    False
+                )
+            mode = container_info['mode']
+        elif not mode:
+            raise ValueError("Mode is required for files that are not containers")
+
+        resumable = checkpoint or resume
+        if resumable and (container or not encrypt):
+            raise ValueError(
+                "Checkpoints and resume are supported only for encryption "
+                "without --container"
+            )
+        if resumable and jobs and jobs > 1:
+            CryptoLogger.log(
+                "Checkpointed encryption is a single sequential pass, "
+                "falling back to a single process",
+                False
+            )
+            jobs = 1
+
+        if authenticate and jobs and jobs > 1 and not container:
+            CryptoLogger.log(
+                "Authenticated processing is a single sequential pass, "
+                "falling back to a single process",
+                False
+            )
+            jobs = 1
+
+        if jobs and jobs > 1 and not container and \
+                not ParallelProcessor.supports(mode, encrypt):
+            CryptoLogger.log(
+                f"Mode {mode} does not support parallel {operation}, "
+                f"falling back to a single process",
+                False
+            )
+
+        # Заголовок KDF при шифровании по паролю / его длина при дешифровании
+        kdf_header = b''
+        data_offset = 0
+        if password is not None and container_info is None:
+            if resume and os.path.exists(Checkpoint.path_for(output_path)):
+                # Ключ восстанавливается по заголовку KDF уже записанного результата
+                key = None
+            elif encrypt:
+                key, kdf_header = KeyDerivation.prepare(password, kdf, kdf_params,
+                                                        key_length)
+            else:
+                with open(input_path, 'rb') as infile:
+                    key = KeyDerivation.recover(password, infile)
+                    data_offset = infile.tell()
+
         start_time = time.time()
 
+        def parallel_mappable(path: str) -> bool:
+            """Пул отображает файлы в память; каналы и устройства - последовательно"""
+            if ParallelProcessor.can_map(input_path, path):
+                return True
+            CryptoLogger.log(
+                "Parallel processing needs regular files, falling back to a single process",
+                False
+            )
+            return False
+
+        def write(path: str):
+            if container and encrypt:
+                Container.encrypt_file(input_path, path, key, mode, chunk_size,
+                                       kdf_header, authenticate, jobs or 1)
+            elif container:
+                Container.decrypt_file(input_path, path, key, password, jobs or 1)
+            elif jobs and jobs > 1 and ParallelProcessor.supports(mode, encrypt) and \
+                    parallel_mappable(path):
+                ParallelProcessor.process_file(input_path, path, key, mode,
+                                               encrypt, iv, jobs, chunk_size,
+                                               prefix=kdf_header,
+                                               data_offset=data_offset)
+            elif encrypt:
+                FileProcessor._encrypt_file(input_path, path, key, mode,
+                                            chunk_size, use_mmap, kdf_header,
+                                            authenticate)
+            else:
+                FileProcessor._decrypt_file(input_path, path, key, mode, iv,
+                                            chunk_size, use_mmap, data_offset,
+                                            authenticate)
+
         try:
-            if encrypt:
-                FileProcessor._encrypt_file(input_path, output_path, key, mode)
+            if resumable:
+                ResumableEncryptor.encrypt_file(
+                    input_path, output_path, key, mode, chunk_size, kdf_header,
+                    authenticate, resume, password if key is None else None,
+                    checkpoint_interval or ResumableEncryptor.CHECKPOINT_INTERVAL
+                )
             else:
-                FileProcessor._decrypt_file(input_path, output_path, key, mode, iv)
+                # При проверяемом дешифровании результат появляется только
+                # после успешной проверки тегов
+                OutputFile.write(output_path, write, sync)
 
             elapsed = time.time() - start_time
             speed = (file_size * 8) / elapsed / 1e6 if elapsed > 0 else 0
+            Metrics.record_file(operation, mode, elapsed, file_size)
 
             CryptoLogger.log(
                 f"{operation.capitalize()} completed: "
@@ -49,37 +198,219 @@ class FileProcessor:
             )
 
         except Exception as e:
-            if os.path.exists(output_path):
-                os.remove(output_path)
+            # output_path не менялся (временный файл удален), а при шифровании
+            # с контрольными точками частичный результат нужен для --resume
+            Metrics.record_file(operation, mode, time.time() - start_time, file_size,
+                                ok=False)
             CryptoLogger.log(f"Error details: {str(e)}", True)
             raise e
 
     @staticmethod
-    def _encrypt_file(input_path: str, output_path: str, key: bytes, mode: str):
-        """Шифрование файла"""
-        with open(input_path, 'rb') as infile:
-            plaintext = infile.read()
+    def _check_chunk_size(chunk_size: int) -> int:
+        """Проверка размера фрагмента потоковой обработки"""
+        if chunk_size is None:
+            return FileProcessor.CHUNK_SIZE
+        if chunk_size <= 0 or chunk_size % CipherCore.BLOCK_SIZE != 0:
+            raise ValueError(
+                f"Chunk size must be a positive multiple of "
+                f"{CipherCore.BLOCK_SIZE} bytes. Got {chunk_size}"
+            )
+        return chunk_size
+
+    @staticmethod
+    def _stream(infile, outfile, transform, chunk_size: int,
+                length: int = None, mode: str = None) -> tuple:
+        """
+        Потоковая обработка файла фрагментами фиксированного размера
 
+        Читаем на один фрагмент вперед, чтобы знать, какой из них последний:
+        в памяти одновременно находится не более двух фрагментов.
+        length ограничивает объем читаемых данных (None - до конца файла).
+        mode - метка режима для метрик этапов read/write (None - без учета).
+        Возвращает (прочитано байт, записано байт).
+        """
+        bytes_in = 0
+        bytes_out = 0
+        remaining = length
+        read_data = infile.read
+        write = outfile.write
+        if mode is not None:
+            read_data = Metrics.timed('read', mode, read_data)
+            write = Metrics.timed('write', mode, write, count_argument=True)
+
+        def read():
+            nonlocal remaining
+            if remaining is None:
+                return read_data(chunk_size)
+            data = read_data(min(chunk_size, remaining))
+            remaining -= len(data)
+            return data
+
+        chunk = read()
+
+        while True:
+            next_chunk = read()
+            final = not next_chunk
+            result = transform(chunk, final)
+            write(result)
+            bytes_in += len(chunk)
+            bytes_out += len(result)
+            if final:
+                return bytes_in, bytes_out
+            chunk = next_chunk
+
+    @staticmethod
+    def _is_mappable(source, offset: int = 0) -> bool:
+        """
+        Можно ли отобразить файл в память: обычный файл с данными после offset
+
+        source - путь или открытый файл (проверяется именно открытый
+        дескриптор, а не файл, который сейчас лежит по пути).
+        """
+        try:
+            file_stat = os.fstat(source.fileno()) if hasattr(source, 'fileno') \
+                else os.stat(source)
+        except OSError:
+            return False
+        return stat.S_ISREG(file_stat.st_mode) and file_stat.st_size > offset
+
+    @staticmethod
+    def _encrypted_size(mode: str, plaintext_size: int) -> int:
+        """Размер шифртекста без IV (ECB/CBC дополняются PKCS7 до целого блока)"""
+        if mode in ('ecb', 'cbc'):
+            return plaintext_size + CipherCore.BLOCK_SIZE - \
+                plaintext_size % CipherCore.BLOCK_SIZE
+        return plaintext_size
+
+    @staticmethod
+    def _map_transform(infile, in_offset: int, outfile, out_offset: int,
+                       out_size: int, transform, chunk_size: int,
+                       length: int = None, mode: str = None) -> tuple:
+        """
+        Обработка файла через отображение в память
+
+        Входной файл отображается только для чтения, выходной заранее
+        получает размер out_offset + out_size и отображается для записи.
+        Режимы получают срезы memoryview входного отображения, результат
+        записывается прямо в выходное отображение без промежуточных буферов.
+        length - объем обрабатываемых данных (None - до конца файла).
+        mode - метка режима для метрик этапа write (чтение входа происходит
+        через page fault внутри transform и отдельно не учитывается).
+        Возвращает (прочитано байт, записано байт).
+
+        Отображается ровно in_offset + length байт входа: дописанное в файл
+        во время работы не обрабатывается и не переполняет выходное
+        отображение размера out_size.
+        """
+        bytes_in = 0
+        bytes_out = 0
+        clock = time.perf_counter
+        input_size = os.fstat(infile.fileno()).st_size
+        total = input_size - in_offset if length is None else length
+        if input_size < in_offset + total:
+            raise ValueError("Input file shrank during processing")
+        outfile.flush()
+        outfile.truncate(out_offset + out_size)
+
+        with mmap.mmap(infile.fileno(), in_offset + total, access=mmap.ACCESS_READ) as source, \
+                mmap.mmap(outfile.fileno(), 0, access=mmap.ACCESS_WRITE) as target:
+            view = memoryview(source)
+            try:
+                for position in range(0, total, chunk_size):
+                    size = min(chunk_size, total - position)
+                    start = in_offset + position
+                    result = transform(view[start:start + size],
+                                       position + size == total)
+                    end = out_offset + bytes_out + len(result)
+                    if end > out_offset + out_size:
+                        raise ValueError("Output exceeds the size reserved for it")
+                    start = clock()
+                    target[out_offset + bytes_out:end] = result
+                    if mode is not None:
+                        Metrics.record('write', mode, clock() - start, len(result))
+                    bytes_in += size
+                    bytes_out += len(result)
+            except Exception as e:
+                # Кадры трассировки держат срезы отображения (например, при
+                # ошибке паддинга) - без очистки mmap нельзя закрыть
+                traceback.clear_frames(e.__traceback__)
+                raise
+            finally:
+                view.release()
+
+        return bytes_in, bytes_out
+
+    @staticmethod
+    def _encrypt_file(input_path: str, output_path: str, key: bytes, mode: str,
+                      chunk_size: int = CHUNK_SIZE, use_mmap: bool = True,
+                      prefix: bytes = b'', authenticate: bool = False):
+        """Шифрование файла (через mmap или потоковым чтением)"""
         cipher = CipherCore(key, mode)
-        encrypted = cipher.encrypt(plaintext)
+        # IV записывается в начало файла (после заголовка KDF) для режимов кроме ECB
+        header = prefix + (cipher.get_iv() if mode != 'ecb' else b'')
 
-        with open(output_path, 'wb') as outfile:
-            # Записываем IV для режимов кроме ECB
-            if mode != 'ecb':
-                outfile.write(cipher.get_iv())
-            outfile.write(encrypted)
+        transform = Metrics.timed('cipher', mode, cipher.encrypt_chunk)
+        authenticator = None
+        if authenticate:
+            authenticator = StreamAuthenticator(key)
+            authenticator.update(header)
+            transform = authenticator.wrap_encrypt(transform)
+
+        with open(input_path, 'rb') as infile, open(output_path, 'w+b') as outfile:
+            input_stat = os.fstat(infile.fileno())
+            out_size = FileProcessor._encrypted_size(mode, input_stat.st_size)
+            if stat.S_ISREG(input_stat.st_mode):
+                tag_size = StreamAuthenticator.TAG_SIZE if authenticate else 0
+                OutputFile.preallocate(outfile, len(header) + out_size + tag_size)
+            outfile.write(header)
+            if use_mmap and FileProcessor._is_mappable(infile) and \
+                    stat.S_ISREG(os.fstat(outfile.fileno()).st_mode):
+                # Объем входа фиксируется размером на момент открытия
+                bytes_in, bytes_out = FileProcessor._map_transform(
+                    infile, 0, outfile, len(header), out_size,
+                    transform, chunk_size, input_stat.st_size, mode
+                )
+                outfile.seek(0, os.SEEK_END)
+            else:
+                bytes_in, bytes_out = FileProcessor._stream(
+                    infile, outfile, transform, chunk_size, mode=mode
+                )
+
+            if authenticator is not None:
+                # Тег дописывается в конец файла
+                outfile.write(authenticator.finalize())
+            # Зарезервированное сверх записанного (вход изменился во время работы)
+            if stat.S_ISREG(os.fstat(outfile.fileno()).st_mode):
+                outfile.truncate()
 
         CryptoLogger.log(
-            f"Encryption: {len(plaintext)} -> {len(encrypted)} bytes "
+            f"Encryption: {bytes_in} -> {bytes_out} bytes "
             f"(mode: {mode}, iv: {cipher.get_iv().hex() if mode != 'ecb' else 'N/A'})",
             False
         )
 
     @staticmethod
     def _decrypt_file(input_path: str, output_path: str, key: bytes,
-                      mode: str, iv: bytes = None):
-        """Дешифрование файла"""
+                      mode: str, iv: bytes = None, chunk_size: int = CHUNK_SIZE,
+                      use_mmap: bool = True, data_offset: int = 0,
+                      authenticate: bool = False):
+        """Дешифрование файла (через mmap или потоковым чтением)"""
         with open(input_path, 'rb') as infile:
+            file_size = os.fstat(infile.fileno()).st_size
+            authenticator = None
+            tag = None
+            if authenticate:
+                if file_size < data_offset + StreamAuthenticator.TAG_SIZE:
+                    raise ValueError("Input is too short to contain an authentication tag")
+                authenticator = StreamAuthenticator(key)
+                infile.seek(file_size - StreamAuthenticator.TAG_SIZE)
+                tag = infile.read(StreamAuthenticator.TAG_SIZE)
+                # Заголовок KDF тоже аутентифицирован
+                infile.seek(0)
+                authenticator.update(infile.read(data_offset))
+
+            # Пропускаем заголовок KDF
+            infile.seek(data_offset)
             if mode != 'ecb':
                 # Читаем IV из файла если не предоставлен
                 if iv is None:
@@ -90,19 +421,47 @@ class FileProcessor:
                         )
                 else:
                     file_iv = iv
-                ciphertext = infile.read()
             else:
                 file_iv = None
-                ciphertext = infile.read()
 
-        cipher = CipherCore(key, mode, file_iv)
-        decrypted = cipher.decrypt(ciphertext)
+            cipher = CipherCore(key, mode, file_iv)
 
-        with open(output_path, 'wb') as outfile:
-            outfile.write(decrypted)
+            in_offset = infile.tell()
+            payload_size = file_size - in_offset
+            stream_length = None
+            transform = Metrics.timed('cipher', mode, cipher.decrypt_chunk)
+            if authenticator is not None:
+                payload_size -= StreamAuthenticator.TAG_SIZE
+                if payload_size < 0:
+                    raise ValueError("Input is too short to contain an authentication tag")
+                # IV аутентифицирован, даже если передан явно, а не хранится в файле
+                if file_iv is not None:
+                    authenticator.update(file_iv)
+                stream_length = payload_size
+                transform = authenticator.wrap_decrypt(transform, tag)
+
+            with open(output_path, 'w+b') as outfile:
+                # Открытый текст не длиннее шифртекста, лишнее отрезается в конце
+                if stat.S_ISREG(os.fstat(infile.fileno()).st_mode):
+                    OutputFile.preallocate(outfile, payload_size)
+                if use_mmap and payload_size > 0 and \
+                        FileProcessor._is_mappable(infile, in_offset) and \
+                        stat.S_ISREG(os.fstat(outfile.fileno()).st_mode):
+                    bytes_in, bytes_out = FileProcessor._map_transform(
+                        infile, in_offset, outfile, 0, payload_size,
+                        transform, chunk_size, payload_size, mode
+                    )
+                    # Паддинг известен только после последнего блока
+                    outfile.truncate(bytes_out)
+                else:
+                    bytes_in, bytes_out = FileProcessor._stream(
+                        infile, outfile, transform, chunk_size, stream_length, mode
+                    )
+                    if stat.S_ISREG(os.fstat(outfile.fileno()).st_mode):
+                        outfile.truncate()
 
         CryptoLogger.log(
-            f"Decryption: {len(ciphertext)} -> {len(decrypted)} bytes "
+            f"Decryption: {bytes_in} -> {bytes_out} bytes "
             f"(mode: {mode}, iv: {file_iv.hex() if file_iv else 'N/A'})",
             False
-        )
\ No newline at end of file
+        )
@@ -1,59 +1,136 @@
+import hashlib
+import hmac
 import os
+import threading
 import time
-import hashlib
-import psutil
 from typing import Optional
+from .metrics import Metrics
+
+
+class HmacDrbg:
+    """
+    Детерминированный генератор случайных битов HMAC_DRBG (NIST SP 800-90A)
+    на основе HMAC-SHA256
+
+    Засевается энтропией ОС (os.urandom) с добавлением системной энтропии
+    (время, свободная память, PID) в строку персонализации. После
+    RESEED_INTERVAL запросов генератор автоматически пересевается.
+    """
+
+    OUTLEN = 32  # длина выхода HMAC-SHA256
+    SEED_SIZE = 48  # энтропия + nonce
+    RESEED_INTERVAL = 10000  # запросов между пересевами
+    MAX_REQUEST_SIZE = 65536  # байт за один запрос (2^19 бит по стандарту)
+
+    def __init__(self, personalization: bytes = b''):
+        self.pid = os.getpid()
+        self._key = b'\x00' * self.OUTLEN
+        self._value = b'\x01' * self.OUTLEN
+        self._update(os.urandom(self.SEED_SIZE) + personalization)
+        self.reseed_counter = 1
+
+    def _hmac(self, data: bytes) -> bytes:
+        return hmac.digest(self._key, data, 'sha256')
+
+    def _update(self, provided_data: bytes = b''):
+        """Функция обновления внутреннего состояния (K, V)"""
+        self._key = self._hmac(self._value + b'\x00' + provided_data)
+        self._value = self._hmac(self._value)
+        if provided_data:
+            self._key = self._hmac(self._value + b'\x01' + provided_data)
+            self._value = self._hmac(self._value)
+
+    def reseed(self, additional_input: bytes = b''):
+        """Пересев свежей энтропией ОС"""
+        self._update(os.urandom(self.SEED_SIZE) + additional_input)
+        self.reseed_counter = 1
+
+    def generate(self, num_bytes: int) -> bytes:
+        """Генерация num_bytes псевдослучайных байтов (не более MAX_REQUEST_SIZE)"""
+        if num_bytes > self.MAX_REQUEST_SIZE:
+            raise ValueError(
+                f"Request too large: {num_bytes} bytes "
+                f"(max {self.MAX_REQUEST_SIZE} per request)"
+            )
+        if self.reseed_counter > self.RESEED_INTERVAL:
+            self.reseed()
+
+        # HMAC с фиксированным ключом: состояния SHA-256 после ipad/opad
+        # вычисляются один раз на запрос и копируются для каждого блока
+        padded_key = self._key.ljust(hashlib.sha256().block_size, b'\x00')
+        inner = hashlib.sha256(bytes(b ^ 0x36 for b in padded_key))
+        outer = hashlib.sha256(bytes(b ^ 0x5C for b in padded_key))
+
+        blocks = []
+        value = self._value
+        for _ in range(-(-num_bytes // self.OUTLEN)):
+            inner_hash = inner.copy()
+            inner_hash.update(value)
+            outer_hash = outer.copy()
+            outer_hash.update(inner_hash.digest())
+            value = outer_hash.digest()
+            blocks.append(value)
+        self._value = value
+
+        self._update()
+        self.reseed_counter += 1
+        return b''.join(blocks)[:num_bytes]
 
 
 class Generator:
-    @staticmethod
-    def generate_random_bytes(num_bytes: int) -> bytes:
-        """Генерация криптографически безопасных случайных байтов"""
-        return Generator.generate_random_bits(num_bytes * 8)
+    # Состояние DRBG хранится отдельно для каждого потока
+    _local = threading.local()
 
     @staticmethod
-    def generate_random_bits(num_bits: int) -> bytes:
-        """Генерация случайных битов с использованием энтропии системы"""
-        random_bits = bytearray(num_bits // 8)
-
-        free_memory = psutil.virtual_memory().available
-        time_entropy = time.time_ns()
-
-        count = 0
-        bits_generated = 0
-        byte_index = 0
-        bit_index = 0
-
-        while bits_generated < num_bits:
-            if count == 1000:
-                free_memory = psutil.virtual_memory().available
-                time_entropy = time.time_ns()
-                count = 0
-
-            entropy = free_memory ^ time_entropy * count
-            hash_result = Generator._hash(str(entropy))
+    def _system_entropy() -> bytes:
+        """Дополнительная системная энтропия для строки персонализации"""
+        import psutil  # нужен только при засеве, не при импорте модуля
+        return b'|'.join([
+            str(time.time_ns()).encode(),
+            str(psutil.virtual_memory().available).encode(),
+            str(os.getpid()).encode(),
+            str(threading.get_ident()).encode()
+        ])
 
-            for i in range(8):
-                if bits_generated >= num_bits:
-                    break
-
-                bit = (hash_result[i] & 0xFF) % 2
-                random_bits[byte_index] |= (bit << (7 - bit_index))
-
-                bits_generated += 1
-                count += 1
-                bit_index += 1
-
-                if bit_index == 8:
-                    byte_index += 1
-                    bit_index = 0
+    @staticmethod
+    def _get_drbg() -> HmacDrbg:
+        """
+        DRBG текущего потока
+
+        После fork дочерний процесс получил бы копию состояния родителя и
+        повторил бы его выход, поэтому при смене PID генератор засевается заново.
+        """
+        drbg = getattr(Generator._local, 'drbg', None)
+        if drbg is None or drbg.pid != os.getpid():
+            drbg = HmacDrbg(Generator._system_entropy())
+            Generator._local.drbg = drbg
+        return drbg
 
-        return bytes(random_bits)
+    @staticmethod
+    def generate_random_bytes(num_bytes: int) -> bytes:
+        """Генерация криптографически безопасных случайных байтов"""
+        start = time.perf_counter()
+        drbg = Generator._get_drbg()
+        if num_bytes <= HmacDrbg.MAX_REQUEST_SIZE:
+            result = drbg.generate(num_bytes)
+        else:
+            parts = []
+            remaining = num_bytes
+            while remaining > 0:
+                size = min(remaining, HmacDrbg.MAX_REQUEST_SIZE)
+                parts.append(drbg.generate(size))
+                remaining -= size
+            result = b''.join(parts)
+        Metrics.record('rng', 'drbg', time.perf_counter() - start, num_bytes)
+        return result
 
     @staticmethod
-    def _hash(input_str: str) -> bytes:
-        """Хеширование строки с использованием SHA-1"""
-        return hashlib.sha1(input_str.encode()).digest()
+    def generate_random_bits(num_bits: int) -> bytes:
+        """Генерация случайных битов (неполный последний байт дополняется нулями)"""
+        random_bytes = bytearray(Generator.generate_random_bytes(-(-num_bits // 8)))
+        if num_bits % 8:
+            random_bytes[-1] &= (0xFF << (8 - num_bits % 8)) & 0xFF
+        return bytes(random_bytes)
 
     @staticmethod
     def generate_test_file(path: str, size: int):
@@ -63,17 +140,17 @@ class Generator:
         with open(path, 'wb') as f:
             remaining = size
             while remaining > 0:
-                chunk_size = min(remaining, 8192)
+                chunk_size = min(remaining, 1024 * 1024)
                 random_data = Generator.generate_random_bytes(chunk_size)
                 f.write(random_data)
                 remaining -= chunk_size
 
         elapsed = time.time() - start_time
-        speed = (size * 8) / elapsed / 1e6  # Mbps
+        speed = (size * 8) / elapsed / 1e6 if elapsed > 0 else 0  # Mbps
 
         from .crypto_logger import CryptoLogger
         CryptoLogger.log(
             f"Generated test file: {path} "
             f"(size: {size} bytes, speed: {speed:.2f} Mbps)",
             False
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,223 @@
+import hashlib
+import math
+import struct
+import time
+from crypto.key_generator import KeyGenerator
+from crypto.metrics import Metrics
+
+
+class KeyDerivation:
+    """
+    Получение ключей из пароля стандартными KDF с калибровкой стоимости
+
+    Поддерживаются PBKDF2-HMAC-SHA256 и scrypt (реализации hashlib на C),
+    а также собственная схема KeyGenerator. Выбранная KDF и ее параметры
+    записываются в заголовок вместе с солью, поэтому при дешифровании их
+    не нужно угадывать.
+
+    Формат заголовка (big-endian):
+        magic 'CCKD' | version (1) | kdf id (1) | key length (1) |
+        salt length (1) | salt | param1 (4) | param2 (4) | param3 (4)
+    Параметры: PBKDF2 и custom - (iterations, 0, 0), scrypt - (n, r, p).
+    """
+
+    MAGIC = b'CCKD'
+    VERSION = 1
+    KDF_IDS = {'custom': 0, 'pbkdf2-sha256': 1, 'scrypt': 2}
+    DEFAULT_KDF = 'pbkdf2-sha256'
+    TARGET_LATENCY = 0.25  # секунды на одно получение ключа
+
+    SCRYPT_R = 8
+    SCRYPT_P = 1
+    SCRYPT_MAX_MEMORY = 1024 * 1024 * 1024  # ограничение памяти scrypt (128 * r * n)
+    SCRYPT_MAX_P = 16
+
+    # Заголовок приходит из недоверенного файла: параметры сверх этих
+    # пределов отвергаются до получения ключа (иначе файл задает время и
+    # память KDF). Калибровка не выходит за те же пределы.
+    MAX_ITERATIONS = 10_000_000
+
+    _HEADER = struct.Struct('>4sBBBB')
+    _PARAMS = struct.Struct('>III')
+
+    @staticmethod
+    def _check_kdf(kdf: str) -> str:
+        kdf = kdf.lower()
+        if kdf not in KeyDerivation.KDF_IDS:
+            raise ValueError(
+                f"Unsupported KDF: {kdf}. "
+                f"Supported: {', '.join(KeyDerivation.KDF_IDS)}"
+            )
+        return kdf
+
+    @staticmethod
+    def _check_params(kdf: str, params: tuple, key_length: int):
+        """Проверка параметров KDF из заголовка"""
+        if key_length not in (16, 24, 32):
+            raise ValueError(f"Invalid key length in KDF header: {key_length}")
+        if kdf == 'scrypt':
+            n, r, p = params
+            if n < 2 or n & (n - 1) or r < 1 or not 1 <= p <= KeyDerivation.SCRYPT_MAX_P:
+                raise ValueError(f"Invalid scrypt parameters in KDF header: {params}")
+            if 128 * r * n > KeyDerivation.SCRYPT_MAX_MEMORY:
+                raise ValueError(
+                    f"scrypt parameters in KDF header need more than "
+                    f"{KeyDerivation.SCRYPT_MAX_MEMORY // (1024 * 1024)} MiB: {params}"
+                )
+        elif not 1 <= params[0] <= KeyDerivation.MAX_ITERATIONS:
+            raise ValueError(
+                f"KDF iterations in header out of range "
+                f"(1..{KeyDerivation.MAX_ITERATIONS}): {params[0]}"
+            )
+
+    @staticmethod
+    def _scrypt_maxmem(n: int, r: int, p: int) -> int:
+        """Лимит памяти для hashlib.scrypt с запасом на служебные буферы"""
+        return 128 * r * (n + p + 2) + 1024 * 1024
+
+    @staticmethod
+    def derive(password: str, salt: bytes, kdf: str, params: tuple,
+               key_length: int = KeyGenerator.KEY_LENGTH) -> bytes:
+        """
+        Получение ключа
+
+        Args:
+            password: пароль
+            salt: соль
+            kdf: 'pbkdf2-sha256', 'scrypt' или 'custom'
+            params: (iterations, 0, 0) для PBKDF2/custom, (n, r, p) для scrypt
+            key_length: длина ключа в байтах
+        """
+        kdf = KeyDerivation._check_kdf(kdf)
+        password_bytes = password.encode('utf-8')
+
+        if kdf == 'pbkdf2-sha256':
+            return hashlib.pbkdf2_hmac('sha256', password_bytes, salt,
+                                       params[0], key_length)
+        if kdf == 'scrypt':
+            n, r, p = params
+            return hashlib.scrypt(password_bytes, salt=salt, n=n, r=r, p=p,
+                                  maxmem=KeyDerivation._scrypt_maxmem(n, r, p),
+                                  dklen=key_length)
+        return KeyGenerator._derive(password, salt, params[0], key_length)
+
+    @staticmethod
+    def _time(kdf: str, params: tuple) -> float:
+        start = time.perf_counter()
+        KeyDerivation.derive('calibration', b'\x00' * KeyGenerator.SALT_SIZE,
+                             kdf, params)
+        return time.perf_counter() - start
+
+    @staticmethod
+    def calibrate(kdf: str = DEFAULT_KDF,
+                  target_seconds: float = TARGET_LATENCY) -> tuple:
+        """
+        Подбор параметров KDF под целевую задержку на текущей машине
+
+        Время KDF растет линейно с числом итераций (для scrypt - с N), поэтому
+        пробная стоимость удваивается, пока замер не станет достаточно
+        длинным для точной экстраполяции. Для scrypt выбирается наибольшее
+        N = 2^k, укладывающееся в целевое время и лимит памяти.
+        """
+        kdf = KeyDerivation._check_kdf(kdf)
+        if target_seconds <= 0:
+            raise ValueError("Target latency must be positive")
+
+        if kdf == 'scrypt':
+            r, p = KeyDerivation.SCRYPT_R, KeyDerivation.SCRYPT_P
+            probe_n = 2 ** 10
+            elapsed = KeyDerivation._time(kdf, (probe_n, r, p))
+            while elapsed < target_seconds / 8 and probe_n < 2 ** 16:
+                probe_n *= 2
+                elapsed = KeyDerivation._time(kdf, (probe_n, r, p))
+            log_n = int(math.log2(probe_n * target_seconds / elapsed))
+            max_log_n = int(math.log2(KeyDerivation.SCRYPT_MAX_MEMORY // (128 * r)))
+            return 2 ** max(10, min(log_n, max_log_n)), r, p
+
+        probe_iterations = 1000
+        elapsed = KeyDerivation._time(kdf, (probe_iterations, 0, 0))
+        while elapsed < target_seconds / 8 and \
+                probe_iterations < KeyDerivation.MAX_ITERATIONS:
+            probe_iterations *= 2
+            elapsed = KeyDerivation._time(kdf, (probe_iterations, 0, 0))
+        iterations = int(probe_iterations * target_seconds / elapsed)
+        return max(1000, min(iterations, KeyDerivation.MAX_ITERATIONS)), 0, 0
+
+    @staticmethod
+    def encode_header(kdf: str, params: tuple, salt: bytes, key_length: int) -> bytes:
+        """Сериализация KDF, параметров и соли"""
+        kdf = KeyDerivation._check_kdf(kdf)
+        return (KeyDerivation._HEADER.pack(KeyDerivation.MAGIC, KeyDerivation.VERSION,
+                                           KeyDerivation.KDF_IDS[kdf], key_length,
+                                           len(salt)) +
+                salt + KeyDerivation._PARAMS.pack(*params))
+
+    @staticmethod
+    def read_header(infile) -> tuple:
+        """
+        Чтение заголовка KDF из файла (позиция сдвигается за заголовок)
+
+        Returns:
+            (kdf, params, salt, key_length)
+        """
+        header = infile.read(KeyDerivation._HEADER.size)
+        if len(header) != KeyDerivation._HEADER.size:
+            raise ValueError("Input is too short to contain a KDF header")
+
+        magic, version, kdf_id, key_length, salt_length = \
+            KeyDerivation._HEADER.unpack(header)
+        if magic != KeyDerivation.MAGIC:
+            raise ValueError("Input has no KDF header (was it encrypted with --password?)")
+        if version != KeyDerivation.VERSION:
+            raise ValueError(f"Unsupported KDF header version: {version}")
+
+        kdf_names = {value: name for name, value in KeyDerivation.KDF_IDS.items()}
+        if kdf_id not in kdf_names:
+            raise ValueError(f"Unknown KDF id in header: {kdf_id}")
+
+        salt = infile.read(salt_length)
+        params = infile.read(KeyDerivation._PARAMS.size)
+        if len(salt) != salt_length or len(params) != KeyDerivation._PARAMS.size:
+            raise ValueError("Truncated KDF header")
+
+        kdf = kdf_names[kdf_id]
+        params = KeyDerivation._PARAMS.unpack(params)
+        KeyDerivation._check_params(kdf, params, key_length)
+        return kdf, params, salt, key_length
+
+    @staticmethod
+    def prepare(password: str, kdf: str = DEFAULT_KDF, params: tuple = None,
+                key_length: int = KeyGenerator.KEY_LENGTH,
+                target_seconds: float = TARGET_LATENCY) -> tuple:
+        """
+        Новый ключ для шифрования: свежая соль, параметры (калибруются,
+        если не заданы) и заголовок для записи перед данными
+
+        Returns:
+            (key, header)
+        """
+        if key_length not in (16, 24, 32):
+            raise ValueError(
+                f"Key must be 16, 24, or 32 bytes for AES. Got {key_length} bytes"
+            )
+        kdf = KeyDerivation._check_kdf(kdf)
+        if params is None:
+            params = KeyDerivation.calibrate(kdf, target_seconds)
+        salt = KeyGenerator.generate_salt()
+        key = KeyDerivation._derive_measured(password, salt, kdf, params, key_length)
+        return key, KeyDerivation.encode_header(kdf, params, salt, key_length)
+
+    @staticmethod
+    def recover(password: str, infile) -> bytes:
+        """Ключ для дешифрования по заголовку файла (позиция сдвигается за заголовок)"""
+        kdf, params, salt, key_length = KeyDerivation.read_header(infile)
+        return KeyDerivation._derive_measured(password, salt, kdf, params, key_length)
+
+    @staticmethod
+    def _derive_measured(password: str, salt: bytes, kdf: str, params: tuple,
+                         key_length: int) -> bytes:
+        """derive с учетом в метриках этапа kdf (пробы калибровки не учитываются)"""
+        start = time.perf_counter()
+        key = KeyDerivation.derive(password, salt, kdf, params, key_length)
+        Metrics.record('kdf', kdf, time.perf_counter() - start, key_length)
+        return key
@@ -1,56 +1,199 @@
 import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
 from typing import Optional
 from .generator import Generator
 
 
+class DerivedKeyCache:
+    """
+    Ограниченный LRU-кэш производных ключей с временем жизни
+
+    Пароль в кэше не хранится: ключ записи - HMAC пароля на случайном
+    секрете процесса вместе с солью. Производные ключи хранятся в bytearray
+    и затираются нулями при вытеснении, истечении TTL и очистке.
+    """
+
+    def __init__(self, max_size: int = 32, ttl: float = 300.0):
+        if max_size < 1:
+            raise ValueError("Cache size must be at least 1")
+        if ttl <= 0:
+            raise ValueError("Cache TTL must be positive")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._secret = os.urandom(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry_key(self, password: str, salt: bytes) -> tuple:
+        return (hmac.digest(self._secret, password.encode('utf-8'), 'sha256'),
+                bytes(salt))
+
+    @staticmethod
+    def _zeroize(key: bytearray):
+        key[:] = bytes(len(key))
+
+    def get(self, password: str, salt: bytes) -> Optional[bytes]:
+        """Ключ из кэша или None (просроченная запись удаляется)"""
+        entry_key = self._entry_key(password, salt)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            derived_key, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[entry_key]
+                self._zeroize(derived_key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(entry_key)
+            self.hits += 1
+            return bytes(derived_key)
+
+    def put(self, password: str, salt: bytes, derived_key: bytes):
+        """Сохранение ключа с вытеснением наиболее давно использованных записей"""
+        entry_key = self._entry_key(password, salt)
+        with self._lock:
+            old = self._entries.pop(entry_key, None)
+            if old is not None:
+                self._zeroize(old[0])
+            self._entries[entry_key] = (bytearray(derived_key),
+                                        time.monotonic() + self.ttl)
+            while len(self._entries) > self.max_size:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._zeroize(evicted)
+
+    def clear(self):
+        """Удаление всех записей с затиранием ключей"""
+        with self._lock:
+            for derived_key, _ in self._entries.values():
+                self._zeroize(derived_key)
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
 class KeyGenerator:
     KEY_LENGTH = 16  # 256 бит
     SALT_SIZE = 16
     ITERATIONS = 100000
 
+    # Маски циклического сдвига каждого байта 64-байтного дайджеста на 3 бита влево
+    _ROTATE_HIGH_MASK = int.from_bytes(b'\xf8' * 64, 'big')
+    _ROTATE_LOW_MASK = int.from_bytes(b'\x07' * 64, 'big')
+
+    # Кэш производных ключей (включается явно через enable_cache)
+    _cache = None
+
+    @staticmethod
+    def enable_cache(max_size: int = 32, ttl: float = 300.0):
+        """Включение in-process кэша производных ключей"""
+        KeyGenerator.disable_cache()
+        KeyGenerator._cache = DerivedKeyCache(max_size, ttl)
+
+    @staticmethod
+    def disable_cache():
+        """Отключение кэша с затиранием сохраненных ключей"""
+        if KeyGenerator._cache is not None:
+            KeyGenerator._cache.clear()
+        KeyGenerator._cache = None
+
     @staticmethod
     def derive_key(password: str, salt: bytes) -> bytes:
         """Генерация ключа из пароля и соли (адаптация Java кода)"""
+        cache = KeyGenerator._cache
+        if cache is not None:
+            cached = cache.get(password, salt)
+            if cached is not None:
+                return cached
+
         try:
-            # Подготавливаем входные данные: password + salt
-            input_data = password.encode('utf-8') + salt
+            key = KeyGenerator._derive(password, salt, KeyGenerator.ITERATIONS)
+        except Exception as e:
+            from .crypto_exception import CryptoException
+            raise CryptoException("Key generation failed", e)
 
-            # Первое хеширование SHA-512
-            digest = hashlib.sha512()
-            digest.update(input_data)
-            hash_result = digest.digest()
+        if cache is not None:
+            cache.put(password, salt, key)
+        return key
 
-            # Многократные итерации с трансформациями
-            for i in range(KeyGenerator.ITERATIONS):
-                digest = hashlib.sha512()
-                digest.update(hash_result)
-                hash_result = digest.digest()
+    @staticmethod
+    def _derive(password: str, salt: bytes, iterations: int,
+                key_length: int = KEY_LENGTH) -> bytes:
+        """
+        Итерации SHA-512 с побайтовой трансформацией над всем дайджестом сразу
 
-                # Применяем битовые трансформации (аналогично Java коду)
-                transformed_hash = bytearray(hash_result)
-                for j in range(len(transformed_hash)):
-                    # (hash[j] << 3) | ((hash[j] & 0xFF) >>> 5)
-                    original_byte = transformed_hash[j]
-                    left_shifted = (original_byte << 3) & 0xFF
-                    right_shifted = (original_byte & 0xFF) >> 5
-                    transformed_byte = left_shifted | right_shifted
+        Для каждого байта j на итерации i:
+            hash[j] = rotl3(hash[j]) ^ ((i >> (j % 8)) & 0xFF)
+        Циклический сдвиг выполняется для всех 64 байт одной операцией над
+        целым числом (сдвиги + маски), XOR-маска - 8-байтный шаблон,
+        повторенный 8 раз.
+        """
+        high_mask = KeyGenerator._ROTATE_HIGH_MASK
+        low_mask = KeyGenerator._ROTATE_LOW_MASK
+        sha512 = hashlib.sha512
 
-                    # hash[j] ^= (i >> (j % 8)) & 0xFF
-                    xor_value = (i >> (j % 8)) & 0xFF
-                    transformed_byte ^= xor_value
+        hash_result = sha512(password.encode('utf-8') + salt).digest()
 
-                    transformed_hash[j] = transformed_byte & 0xFF
+        for i in range(iterations):
+            value = int.from_bytes(sha512(hash_result).digest(), 'big')
+            rotated = ((value << 3) & high_mask) | ((value >> 5) & low_mask)
+            pattern = bytes([i & 0xFF, (i >> 1) & 0xFF, (i >> 2) & 0xFF,
+                             (i >> 3) & 0xFF, (i >> 4) & 0xFF, (i >> 5) & 0xFF,
+                             (i >> 6) & 0xFF, (i >> 7) & 0xFF])
+            hash_result = (rotated ^ int.from_bytes(pattern * 8, 'big')).to_bytes(64, 'big')
 
-                hash_result = bytes(transformed_hash)
+        # Возвращаем первые key_length байт
+        return hash_result[:key_length]
 
-            # Возвращаем первые KEY_LENGTH байт
-            return hash_result[:KeyGenerator.KEY_LENGTH]
+    @staticmethod
+    def _derive_key_reference(password: str, salt: bytes,
+                              iterations: int = ITERATIONS) -> bytes:
+        """Эталонная побайтовая реализация derive_key (для сверки результатов)"""
+        # Подготавливаем входные данные: password + salt
+        input_data = password.encode('utf-8') + salt
 
-        except Exception as e:
-            from .crypto_exception import CryptoException
-            raise CryptoException("Key generation failed", e)
+        # Первое хеширование SHA-512
+        digest = hashlib.sha512()
+        digest.update(input_data)
+        hash_result = digest.digest()
+
+        # Многократные итерации с трансформациями
+        for i in range(iterations):
+            digest = hashlib.sha512()
+            digest.update(hash_result)
+            hash_result = digest.digest()
+
+            # Применяем битовые трансформации (аналогично Java коду)
+            transformed_hash = bytearray(hash_result)
+            for j in range(len(transformed_hash)):
+                # (hash[j] << 3) | ((hash[j] & 0xFF) >>> 5)
+                original_byte = transformed_hash[j]
+                left_shifted = (original_byte << 3) & 0xFF
+                right_shifted = (original_byte & 0xFF) >> 5
+                transformed_byte = left_shifted | right_shifted
+
+                # hash[j] ^= (i >> (j % 8)) & 0xFF
+                xor_value = (i >> (j % 8)) & 0xFF
+                transformed_byte ^= xor_value
+
+                transformed_hash[j] = transformed_byte & 0xFF
+
+            hash_result = bytes(transformed_hash)
+
+        # Возвращаем первые KEY_LENGTH байт
+        return hash_result[:KeyGenerator.KEY_LENGTH]
 
     @staticmethod
     def generate_salt() -> bytes:
         """Генерация соли с использованием нашего Generator"""
-        return Generator.generate_random_bytes(KeyGenerator.SALT_SIZE)
\ No newline at end of file
+        return Generator.generate_random_bytes(KeyGenerator.SALT_SIZE)
@@ -0,0 +1,267 @@
+"""
+Выполнение манифеста заданий JSONL (cryptocore run-manifest)
+
+Каждая строка манифеста - одна операция в терминах аргументов CLI
+(mode, encrypt/decrypt, key или password, iv, input, output, auth, ...).
+Все задания выполняются в одном процессе пулом потоков; результат каждого
+задания (статус, байты, время, пропускная способность, ошибка) пишется
+строкой JSONL сразу после его завершения.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from crypto.cipher_core import CipherCore
+from crypto.crypto_core import CryptoCoreCLI
+from crypto.crypto_logger import CryptoLogger
+from crypto.file_processor import FileProcessor
+from crypto.kdf import KeyDerivation
+from crypto.metrics import Metrics
+
+# Поля строки манифеста (как dest аргументов CLI; дефисы допускаются)
+FIELDS = ('id', 'algorithm', 'mode', 'encrypt', 'decrypt', 'key', 'password',
+          'kdf', 'kdf_target_ms', 'key_size', 'iv', 'input', 'output',
+          'chunk_size', 'jobs', 'auth', 'container', 'no_mmap', 'fsync')
+
+
+def _hex_field(value: str, name: str) -> bytes:
+    text = value.lower().strip().replace(' ', '').replace(':', '')
+    try:
+        return bytes.fromhex(text[2:] if text.startswith('0x') else text)
+    except ValueError:
+        raise ValueError(f"{name} must be a valid hexadecimal string")
+
+
+class ManifestRunner:
+    """
+    Пул потоков над заданиями манифеста
+
+    Манифест читается построчно, в работе держится не больше
+    2 * concurrency заданий, поэтому размер манифеста не ограничен памятью.
+    Ошибка в строке (разбор, проверка полей, обработка файла) не прерывает
+    выполнение и попадает в результат этой строки. Параметры KDF для
+    шифрования по паролю калибруются один раз на KDF и целевое время.
+    """
+
+    def __init__(self, concurrency: int = 1):
+        if concurrency < 1:
+            raise ValueError("Concurrency must be at least 1")
+        self.concurrency = concurrency
+        self._kdf_params = {}
+        self._kdf_lock = threading.Lock()
+
+    def _kdf_options(self, job: dict, encrypt: bool) -> dict:
+        password = job.get('password')
+        if password is None:
+            return {}
+        if not password:
+            raise ValueError("Password must not be empty")
+        kdf = job.get('kdf', KeyDerivation.DEFAULT_KDF)
+        target = float(job.get('kdf_target_ms', KeyDerivation.TARGET_LATENCY * 1000))
+        if target <= 0:
+            raise ValueError("KDF target time must be positive")
+        params = None
+        if encrypt:
+            # Калибровка под блокировкой: параллельные замеры исказили бы друг друга
+            with self._kdf_lock:
+                params = self._kdf_params.get((kdf, target))
+                if params is None:
+                    params = KeyDerivation.calibrate(kdf, target / 1000)
+                    self._kdf_params[(kdf, target)] = params
+        return {'password': password, 'kdf': kdf, 'kdf_params': params,
+                'key_length': int(job.get('key_size', 128)) // 8}
+
+    def prepare(self, job: dict) -> dict:
+        """Проверка строки манифеста и аргументы FileProcessor.process_file"""
+        job = {name.replace('-', '_'): value for name, value in job.items()}
+        unknown = sorted(set(job) - set(FIELDS))
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        if job.get('algorithm', 'aes') != 'aes':
+            raise ValueError(f"Unsupported algorithm: {job['algorithm']}")
+        if bool(job.get('encrypt')) == bool(job.get('decrypt')):
+            raise ValueError("Exactly one of encrypt/decrypt must be true")
+        if (job.get('key') is None) == (job.get('password') is None):
+            raise ValueError("Exactly one of key/password must be given")
+        if not job.get('input'):
+            raise ValueError("Input is required")
+
+        encrypt = bool(job.get('encrypt'))
+        mode = job.get('mode')
+        if mode is None and encrypt:
+            raise ValueError("Mode is required for encryption")
+        if os.path.isdir(job['input']):
+            raise ValueError("Directories are not supported in manifests")
+        # Имя по умолчанию как у CLI: при дешифровании добавляется .dec, поэтому
+        # исходный открытый текст рядом с .enc не перезаписывается
+        output_path = job.get('output') or CryptoCoreCLI.generate_default_output_path(
+            job['input'], encrypt, mode
+        )
+        if os.path.abspath(job['input']) == os.path.abspath(output_path):
+            raise ValueError("Input and output files cannot be the same")
+
+        iv = None
+        if job.get('iv') and not encrypt:
+            iv = _hex_field(job['iv'], 'IV')
+        return {
+            'input_path': job['input'],
+            'output_path': output_path,
+            'key': _hex_field(job['key'], 'Key') if job.get('key') is not None else None,
+            'mode': mode,
+            'encrypt': encrypt,
+            'iv': iv,
+            'chunk_size': job.get('chunk_size'),
+            'jobs': int(job.get('jobs', 1)),
+            'use_mmap': not job.get('no_mmap', False),
+            'authenticate': bool(job.get('auth', False)),
+            'container': bool(job.get('container', False)),
+            'sync': bool(job.get('fsync', False)),
+            **self._kdf_options(job, encrypt)
+        }
+
+    def run_job(self, line_number: int, line: str) -> dict:
+        """Выполнение одной строки манифеста; исключения попадают в результат"""
+        start_time = time.perf_counter()
+        result = {'line': line_number, 'id': None, 'operation': None, 'mode': None,
+                  'input': None, 'output': None}
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError("Manifest line must be a JSON object")
+            result['id'] = job.get('id')
+            arguments = self.prepare(job)
+            result.update(operation='encrypt' if arguments['encrypt'] else 'decrypt',
+                          mode=arguments['mode'], input=arguments['input_path'],
+                          output=arguments['output_path'])
+            FileProcessor.process_file(**arguments)
+            nbytes = os.path.getsize(arguments['input_path'])
+            error = None
+        except Exception as e:
+            nbytes = 0
+            error = f"{type(e).__name__}: {e}"
+
+        elapsed = time.perf_counter() - start_time
+        result.update({
+            'status': 'error' if error else 'ok',
+            'bytes': nbytes,
+            'elapsed': elapsed,
+            'throughput_mbps': (nbytes * 8) / elapsed / 1e6 if elapsed > 0 else 0,
+            'error': error
+        })
+        return result
+
+    def run(self, manifest, results) -> dict:
+        """
+        Выполнение манифеста
+
+        Args:
+            manifest: итерируемый источник строк JSONL (файл)
+            results: поток для строк результатов (сбрасывается после каждой)
+
+        Returns:
+            сводка: число заданий, успешных, ошибок, объем и время
+        """
+        # Пул потоков загружается только при выполнении манифеста
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        summary = {'jobs': 0, 'succeeded': 0, 'failed': 0, 'bytes': 0}
+        start_time = time.perf_counter()
+
+        def emit(result: dict):
+            results.write(json.dumps(result) + '\n')
+            results.flush()
+            summary['jobs'] += 1
+            summary['succeeded' if result['error'] is None else 'failed'] += 1
+            summary['bytes'] += result['bytes']
+
+        with ThreadPoolExecutor(max_workers=self.concurrency,
+                                thread_name_prefix='cryptocore-manifest') as pool:
+            pending = set()
+            for line_number, line in enumerate(manifest, 1):
+                if not line.strip() or line.lstrip().startswith('#'):
+                    continue
+                if len(pending) >= 2 * self.concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        emit(future.result())
+                pending.add(pool.submit(self.run_job, line_number, line))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    emit(future.result())
+
+        summary['elapsed'] = time.perf_counter() - start_time
+        summary['throughput_mbps'] = (summary['bytes'] * 8 / summary['elapsed'] / 1e6
+                                      if summary['elapsed'] > 0 else 0)
+        CryptoLogger.log(
+            f"Manifest completed: {summary['succeeded']}/{summary['jobs']} jobs, "
+            f"{summary['throughput_mbps']:.2f} Mbps, {summary['elapsed']:.2f} seconds",
+            summary['failed'] > 0
+        )
+        return summary
+
+
+def manifest_main(argv: list = None) -> int:
+    """
+    Точка входа `cryptocore run-manifest`
+
+    Возвращает код завершения: 1, если хотя бы одно задание завершилось ошибкой.
+    """
+    parser = argparse.ArgumentParser(
+        prog='cryptocore run-manifest',
+        description='Run encrypt/decrypt jobs from a JSONL manifest in one process',
+        epilog='Each line is a JSON object with CLI argument names, e.g.\n'
+               '  {"id": "a1", "mode": "ctr", "encrypt": true, '
+               '"key": "00112233445566778899aabbccddeeff",\n'
+               '   "input": "a.bin", "output": "a.bin.enc", "auth": true}\n'
+               'Fields: ' + ', '.join(FIELDS) + '.\n'
+               'Empty lines and lines starting with # are skipped.',
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('manifest', help='Manifest file ("-" for stdin)')
+    parser.add_argument('--results', default='-', metavar='PATH',
+                        help='Results JSONL, one line per finished job in completion '
+                             'order (default: stdout)')
+    parser.add_argument('--concurrency', type=int, default=os.cpu_count() or 1,
+                        metavar='N',
+                        help='Jobs processed at the same time (default: %(default)s)')
+    parser.add_argument('--backend', default=CipherCore.DEFAULT_BACKEND,
+                        choices=list(CipherCore.BACKENDS),
+                        help='Cipher mode implementation for all jobs')
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='Write per-stage metrics after the run '
+                             '(*.prom: Prometheus textfile, otherwise JSON)')
+    args = parser.parse_args(argv)
+
+    CryptoLogger.setup_logging()
+    CipherCore.DEFAULT_BACKEND = args.backend
+    manifest = None
+    results = None
+    try:
+        runner = ManifestRunner(args.concurrency)
+        manifest = sys.stdin if args.manifest == '-' else \
+            open(args.manifest, 'r', encoding='utf-8')
+        results = sys.stdout if args.results == '-' else \
+            open(args.results, 'w', encoding='utf-8')
+        summary = runner.run(manifest, results)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        for stream in (manifest, results):
+            if stream not in (None, sys.stdin, sys.stdout):
+                stream.close()
+        if args.metrics:
+            try:
+                Metrics.write(args.metrics)
+            except (OSError, ValueError) as e:
+                print(f"Warning: cannot write metrics to {args.metrics}: {e}",
+                      file=sys.stderr)
+
+    print(f"Manifest summary: {summary['succeeded']}/{summary['jobs']} jobs, "
+          f"{summary['bytes']} bytes in {summary['elapsed']:.2f} s "
+          f"({summary['throughput_mbps']:.2f} Mbps)", file=sys.stderr)
+    return 0 if summary['failed'] == 0 else 1
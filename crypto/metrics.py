@@ -0,0 +1,306 @@
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами (кумулятивная при экспорте, как в Prometheus)"""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последний - +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list:
+        """[(граница, число наблюдений <= границы)], последняя граница - '+Inf'"""
+        result = []
+        total = 0
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def merge(self, data: dict):
+        """Добавление наблюдений из to_dict() другой гистограммы с теми же границами"""
+        previous = 0
+        for index, (_, total) in enumerate(data['buckets']):
+            self.counts[index] += total - previous
+            previous = total
+        self.sum += data['sum']
+        self.count += data['count']
+
+    def to_dict(self) -> dict:
+        return {
+            'buckets': [[bound, count] for bound, count in self.cumulative()],
+            'sum': self.sum,
+            'count': self.count
+        }
+
+
+class Metrics:
+    """
+    Метрики обработки по этапам и режимам
+
+    Для каждого этапа (read, cipher, pad, write, kdf, rng; у демона также
+    queue и request по операциям) и режима
+    накапливаются время, байты, число вызовов и гистограмма длительности
+    вызова; для файлов целиком - гистограмма длительности и счетчики
+    успешных/ошибочных операций. Значения копятся за весь процесс
+    (например, пакетную обработку каталога) и выгружаются в JSON или
+    textfile для node_exporter.
+
+    Замер - два вызова perf_counter и обновление словаря под блокировкой
+    на фрагмент (по умолчанию 1 МиБ), поэтому метрики включены всегда.
+    Этапы считаются в процессе, выполняющем работу: фрагменты одного файла,
+    обработанные в процессах пула (--jobs, контейнер), попадают только в
+    метрики файла; пакет каталога объединяет снимки своих процессов (merge).
+    При mmap чтение входа происходит через page fault внутри cipher.
+    Время cipher включает pad/unpad последнего фрагмента.
+    """
+
+    ENABLED = True
+    STAGES = ('read', 'cipher', 'pad', 'write', 'kdf', 'rng', 'queue', 'request')
+    PREFIX = 'cryptocore'
+
+    # Границы гистограмм в секундах
+    CALL_BUCKETS = (1e-5, 1e-4, 1e-3, 0.01, 0.1, 1.0, 10.0)
+    FILE_BUCKETS = (0.01, 0.1, 1.0, 10.0, 60.0, 600.0, 3600.0)
+
+    _lock = threading.Lock()
+    _paused = threading.local()  # глубина paused() в текущем потоке
+    _stages = {}  # (stage, mode) -> [секунды, байты, вызовы, Histogram]
+    _files = {}  # (operation, mode) -> {'ok', 'error', 'bytes', 'histogram'}
+
+    @staticmethod
+    def _recording() -> bool:
+        """Включен ли учет в текущем потоке"""
+        return Metrics.ENABLED and not getattr(Metrics._paused, 'depth', 0)
+
+    @staticmethod
+    def record(stage: str, mode: str, seconds: float, nbytes: int = 0):
+        """Учет одного вызова этапа"""
+        if not Metrics._recording():
+            return
+        with Metrics._lock:
+            entry = Metrics._stages.get((stage, mode))
+            if entry is None:
+                entry = [0.0, 0, 0, Histogram(Metrics.CALL_BUCKETS)]
+                Metrics._stages[(stage, mode)] = entry
+            entry[0] += seconds
+            entry[1] += nbytes
+            entry[2] += 1
+            entry[3].observe(seconds)
+
+    @staticmethod
+    def record_file(operation: str, mode: str, seconds: float, nbytes: int,
+                    ok: bool = True):
+        """Учет обработки файла целиком"""
+        if not Metrics._recording():
+            return
+        with Metrics._lock:
+            entry = Metrics._files.get((operation, mode))
+            if entry is None:
+                entry = {'ok': 0, 'error': 0, 'bytes': 0,
+                         'histogram': Histogram(Metrics.FILE_BUCKETS)}
+                Metrics._files[(operation, mode)] = entry
+            entry['ok' if ok else 'error'] += 1
+            if ok:
+                entry['bytes'] += nbytes
+                entry['histogram'].observe(seconds)
+
+    @staticmethod
+    def timed(stage: str, mode: str, func, count_argument: bool = False):
+        """
+        Обертка функции с замером этапа
+
+        Байты считаются по длине результата (read, cipher) или, при
+        count_argument=True, по длине первого аргумента (write).
+        ENABLED проверяется при каждом вызове, поэтому обертки можно
+        создавать при импорте модуля.
+        """
+        clock = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            start = clock()
+            result = func(*args, **kwargs)
+            elapsed = clock() - start
+            data = args[0] if count_argument else result
+            Metrics.record(stage, mode, elapsed, len(data) if data is not None else 0)
+            return result
+        return wrapper
+
+    @staticmethod
+    def merge(snapshot: dict):
+        """Добавление снимка, полученного в другом процессе (например, в пуле пакета)"""
+        if not Metrics.ENABLED:
+            return
+        with Metrics._lock:
+            for item in snapshot['stages']:
+                key = (item['stage'], item['mode'])
+                entry = Metrics._stages.setdefault(
+                    key, [0.0, 0, 0, Histogram(Metrics.CALL_BUCKETS)]
+                )
+                entry[0] += item['seconds']
+                entry[1] += item['bytes']
+                entry[2] += item['calls']
+                entry[3].merge(item['histogram'])
+            for item in snapshot['files']:
+                key = (item['operation'], item['mode'])
+                entry = Metrics._files.setdefault(
+                    key, {'ok': 0, 'error': 0, 'bytes': 0,
+                          'histogram': Histogram(Metrics.FILE_BUCKETS)}
+                )
+                for field in ('ok', 'error', 'bytes'):
+                    entry[field] += item[field]
+                entry['histogram'].merge(item['histogram'])
+
+    @staticmethod
+    @contextmanager
+    def paused():
+        """
+        Отключение учета на время служебной работы (самопроверки, калибровки)
+
+        Действует только в текущем потоке: общий флаг ENABLED не меняется,
+        поэтому одновременные паузы в разных потоках не оставляют учет
+        выключенным и не скрывают работу соседних потоков.
+        """
+        Metrics._paused.depth = getattr(Metrics._paused, 'depth', 0) + 1
+        try:
+            yield
+        finally:
+            Metrics._paused.depth -= 1
+
+    @staticmethod
+    def reset():
+        with Metrics._lock:
+            Metrics._stages.clear()
+            Metrics._files.clear()
+
+    @staticmethod
+    def snapshot() -> dict:
+        """Текущие значения в виде словаря, пригодного для JSON"""
+        with Metrics._lock:
+            stages = [
+                {'stage': stage, 'mode': mode, 'seconds': entry[0],
+                 'bytes': entry[1], 'calls': entry[2],
+                 'mb_per_s': entry[1] / entry[0] / 1e6 if entry[0] > 0 else None,
+                 'histogram': entry[3].to_dict()}
+                for (stage, mode), entry in sorted(Metrics._stages.items())
+            ]
+            files = [
+                {'operation': operation, 'mode': mode, 'ok': entry['ok'],
+                 'error': entry['error'], 'bytes': entry['bytes'],
+                 'histogram': entry['histogram'].to_dict()}
+                for (operation, mode), entry in sorted(Metrics._files.items())
+            ]
+        return {'timestamp': time.time(), 'stages': stages, 'files': files}
+
+    @staticmethod
+    def _labels(**labels) -> str:
+        return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+    @staticmethod
+    def _histogram_lines(name: str, histogram: dict, labels: dict) -> list:
+        lines = []
+        for bound, count in histogram['buckets']:
+            le = bound if bound == '+Inf' else repr(float(bound))
+            lines.append(f'{name}_bucket{{{Metrics._labels(**labels, le=le)}}} {count}')
+        lines.append(f'{name}_sum{{{Metrics._labels(**labels)}}} {histogram["sum"]!r}')
+        lines.append(f'{name}_count{{{Metrics._labels(**labels)}}} {histogram["count"]}')
+        return lines
+
+    @staticmethod
+    def to_prometheus(snapshot: dict = None) -> str:
+        """Текстовый формат экспозиции Prometheus"""
+        snapshot = snapshot or Metrics.snapshot()
+        prefix = Metrics.PREFIX
+        lines = []
+
+        def header(name, kind, text):
+            lines.append(f'# HELP {name} {text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        counters = (
+            ('stage_seconds_total', 'seconds', 'Time spent in a processing stage'),
+            ('stage_bytes_total', 'bytes', 'Bytes handled by a processing stage'),
+            ('stage_calls_total', 'calls', 'Calls of a processing stage')
+        )
+        for suffix, field, text in counters:
+            name = f'{prefix}_{suffix}'
+            header(name, 'counter', text)
+            for entry in snapshot['stages']:
+                labels = Metrics._labels(stage=entry['stage'], mode=entry['mode'])
+                lines.append(f'{name}{{{labels}}} {entry[field]!r}')
+
+        name = f'{prefix}_stage_call_seconds'
+        header(name, 'histogram', 'Duration of a single stage call')
+        for entry in snapshot['stages']:
+            lines += Metrics._histogram_lines(
+                name, entry['histogram'], {'stage': entry['stage'], 'mode': entry['mode']}
+            )
+
+        name = f'{prefix}_files_total'
+        header(name, 'counter', 'Processed files by result')
+        for entry in snapshot['files']:
+            for status in ('ok', 'error'):
+                labels = Metrics._labels(operation=entry['operation'],
+                                         mode=entry['mode'], status=status)
+                lines.append(f'{name}{{{labels}}} {entry[status]}')
+
+        name = f'{prefix}_file_bytes_total'
+        header(name, 'counter', 'Input bytes of successfully processed files')
+        for entry in snapshot['files']:
+            labels = Metrics._labels(operation=entry['operation'], mode=entry['mode'])
+            lines.append(f'{name}{{{labels}}} {entry["bytes"]}')
+
+        name = f'{prefix}_file_seconds'
+        header(name, 'histogram', 'Wall time to process one file')
+        for entry in snapshot['files']:
+            lines += Metrics._histogram_lines(
+                name, entry['histogram'],
+                {'operation': entry['operation'], 'mode': entry['mode']}
+            )
+
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def write(path: str, fmt: str = None):
+        """
+        Выгрузка метрик в файл: 'prometheus' (textfile collector) или 'json'
+
+        Формат по умолчанию определяется расширением (.prom - Prometheus).
+        Файл заменяется атомарно, чтобы node_exporter не прочитал его наполовину.
+        """
+        if fmt is None:
+            fmt = 'prometheus' if path.endswith('.prom') else 'json'
+        if fmt == 'prometheus':
+            content = Metrics.to_prometheus()
+        elif fmt == 'json':
+            content = json.dumps(Metrics.snapshot(), indent=2) + '\n'
+        else:
+            raise ValueError(f"Unsupported metrics format: {fmt}")
+
+        if path == '-':
+            print(content, end='')
+            return
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.metrics.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
@@ -1,6 +1,29 @@
-from .cbc_mode import CBCMode
-from .cfb_mode import CFBMode
-from .ofb_mode import OFBMode
-from .ctr_mode import CTRMode
+import importlib
 
-__all__ = ['CBCMode', 'CFBMode', 'OFBMode', 'CTRMode']
\ No newline at end of file
+# Класс режима импортируется при первом обращении (PEP 562): CipherCore
+# загружает только модуль выбранного режима
+_EXPORTS = {
+    'CBCMode': '.cbc_mode',
+    'CFBMode': '.cfb_mode',
+    'OFBMode': '.ofb_mode',
+    'CTRMode': '.ctr_mode',
+    'NativeCBCMode': '.native_mode',
+    'NativeCFBMode': '.native_mode',
+    'NativeOFBMode': '.native_mode',
+    'NativeCTRMode': '.native_mode'
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -5,10 +5,33 @@ from Crypto.Cipher import AES
 class BaseMode(ABC):
     BLOCK_SIZE = 16
 
-    def __init__(self, key: bytes, iv: bytes):
+    def __init__(self, key: bytes, iv: bytes, cipher=None):
+        """
+        Args:
+            cipher: готовый объект AES ECB для этого ключа (например, из
+                    KeyScheduleCache), чтобы не разворачивать ключ повторно
+        """
         self.key = key
         self.iv = iv
-        self._cipher = AES.new(key, AES.MODE_ECB)
+        self._cipher = cipher or AES.new(key, AES.MODE_ECB)
+        self.reset()
+
+    def reset(self):
+        """Сброс состояния сцепления к исходному IV"""
+        self._state = self.iv
+
+    def set_iv(self, iv: bytes):
+        """Новый IV для следующего сообщения (объект ECB с расписанием ключей сохраняется)"""
+        self.iv = iv
+        self.reset()
+
+    def get_state(self):
+        """Текущее состояние сцепления (позволяет продолжить поток с этого места)"""
+        return self._state
+
+    def set_state(self, state):
+        """Восстановление состояния сцепления, например для обработки с середины потока"""
+        self._state = state
 
     def _split_into_blocks(self, data: bytes, pad: bool = True) -> list:
         """Разделение данных на блоки"""
@@ -18,6 +41,32 @@ class BaseMode(ABC):
         return [data[i:i + self.BLOCK_SIZE]
                 for i in range(0, len(data), self.BLOCK_SIZE)]
 
+    def _check_chunk(self, data: bytes, final: bool):
+        """Промежуточные фрагменты потока должны быть кратны размеру блока"""
+        if not final and len(data) % self.BLOCK_SIZE != 0:
+            raise ValueError(
+                "Intermediate chunk length must be multiple of block size"
+            )
+
+    @staticmethod
+    def _xor_bytes(a, b) -> bytes:
+        """
+        XOR двух буферов целиком через длинную арифметику (на скорости C)
+
+        Принимает bytes, bytearray и memoryview. Как и zip(), результат
+        обрезается по длине более короткого операнда.
+        """
+        length = min(len(a), len(b))
+        if length == 0:
+            return b''
+        if len(a) != length:
+            a = a[:length]
+        if len(b) != length:
+            b = b[:length]
+        # Порядок байтов не влияет на XOR, а little-endian преобразуется быстрее
+        result = int.from_bytes(a, 'little') ^ int.from_bytes(b, 'little')
+        return result.to_bytes(length, 'little')
+
     def _encrypt_block(self, block: bytes) -> bytes:
         """Шифрование одного блока в ECB режиме"""
         return self._cipher.encrypt(block)
@@ -26,12 +75,28 @@ class BaseMode(ABC):
         """Дешифрование одного блока в ECB режиме"""
         return self._cipher.decrypt(block)
 
-    @abstractmethod
     def encrypt(self, data: bytes) -> bytes:
-        """Абстрактный метод шифрования"""
+        """Однократное шифрование сообщения, всегда начиная с исходного IV"""
+        self.reset()
+        return self.encrypt_chunk(data, final=True)
+
+    def decrypt(self, data: bytes) -> bytes:
+        """Однократное дешифрование сообщения, всегда начиная с исходного IV"""
+        self.reset()
+        return self.decrypt_chunk(data, final=True)
+
+    @abstractmethod
+    def encrypt_chunk(self, data: bytes, final: bool = False) -> bytes:
+        """
+        Потоковое шифрование очередного фрагмента.
+        Состояние сцепления сохраняется между вызовами.
+        """
         pass
 
     @abstractmethod
-    def decrypt(self, data: bytes) -> bytes:
-        """Абстрактный метод дешифрования"""
-        pass
\ No newline at end of file
+    def decrypt_chunk(self, data: bytes, final: bool = False) -> bytes:
+        """
+        Потоковое дешифрование очередного фрагмента.
+        Состояние сцепления сохраняется между вызовами.
+        """
+        pass
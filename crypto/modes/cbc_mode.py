@@ -1,37 +1,49 @@
 from Crypto.Util.Padding import pad, unpad
+from crypto.metrics import Metrics
 from .base_mode import BaseMode
 
+_pad = Metrics.timed('pad', 'cbc', pad)
+_unpad = Metrics.timed('pad', 'cbc', unpad)
+
 
 class CBCMode(BaseMode):
-    def encrypt(self, data: bytes) -> bytes:
-        """Шифрование в режиме CBC с PKCS7 паддингом"""
-        padded_data = pad(data, self.BLOCK_SIZE)
-        blocks = self._split_into_blocks(padded_data)
+    def encrypt_chunk(self, data: bytes, final: bool = False) -> bytes:
+        """Шифрование фрагмента в режиме CBC (PKCS7 паддинг только для последнего)"""
+        self._check_chunk(data, final)
+        if final:
+            data = _pad(bytes(data), self.BLOCK_SIZE)
+
+        blocks = self._split_into_blocks(data)
         cipher_blocks = []
-        prev = self.iv
+        prev = self._state
 
         for block in blocks:
-            xored = bytes(a ^ b for a, b in zip(block, prev))
+            xored = self._xor_bytes(block, prev)
             encrypted_block = self._encrypt_block(xored)
             cipher_blocks.append(encrypted_block)
             prev = encrypted_block
 
+        self._state = prev
         return b''.join(cipher_blocks)
 
-    def decrypt(self, data: bytes) -> bytes:
-        """Дешифрование в режиме CBC с удалением PKCS7 паддинга"""
+    def decrypt_chunk(self, data: bytes, final: bool = False) -> bytes:
+        """
+        Дешифрование фрагмента в режиме CBC (удаление паддинга в последнем)
+
+        Каждый блок открытого текста зависит только от уже известного
+        шифртекста: P[i] = D(C[i]) XOR C[i-1]. Поэтому все блоки фрагмента
+        расшифровываются одним вызовом ECB и складываются по XOR
+        со сдвинутым на блок шифртекстом.
+        """
         if len(data) % self.BLOCK_SIZE != 0:
             raise ValueError("Data length must be multiple of block size")
 
-        blocks = self._split_into_blocks(data)
-        plain_blocks = []
-        prev = self.iv
-
-        for block in blocks:
-            decrypted_block = self._decrypt_block(block)
-            plain_block = bytes(a ^ b for a, b in zip(decrypted_block, prev))
-            plain_blocks.append(plain_block)
-            prev = block
+        plaintext = b''
+        if data:
+            shifted = self._state + data[:-self.BLOCK_SIZE]
+            plaintext = self._xor_bytes(self._cipher.decrypt(data), shifted)
+            self._state = bytes(data[-self.BLOCK_SIZE:])
 
-        plaintext = b''.join(plain_blocks)
-        return unpad(plaintext, self.BLOCK_SIZE)
\ No newline at end of file
+        if final:
+            return _unpad(plaintext, self.BLOCK_SIZE)
+        return plaintext
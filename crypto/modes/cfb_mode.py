@@ -2,30 +2,35 @@ from .base_mode import BaseMode
 
 
 class CFBMode(BaseMode):
-    def encrypt(self, data: bytes) -> bytes:
-        """Шифрование в режиме CFB (полный блок)"""
+    def encrypt_chunk(self, data: bytes, final: bool = False) -> bytes:
+        """Шифрование фрагмента в режиме CFB (полный блок)"""
+        self._check_chunk(data, final)
         blocks = self._split_into_blocks(data, pad=False)
         cipher_blocks = []
-        prev = self.iv
+        prev = self._state
 
         for block in blocks:
             encrypted_prev = self._encrypt_block(prev)
-            cipher_block = bytes(a ^ b for a, b in zip(block, encrypted_prev))
+            cipher_block = self._xor_bytes(block, encrypted_prev)
             cipher_blocks.append(cipher_block)
             prev = cipher_block
 
+        self._state = prev
         return b''.join(cipher_blocks)
 
-    def decrypt(self, data: bytes) -> bytes:
-        """Дешифрование в режиме CFB (полный блок)"""
-        blocks = self._split_into_blocks(data, pad=False)
-        plain_blocks = []
-        prev = self.iv
+    def decrypt_chunk(self, data: bytes, final: bool = False) -> bytes:
+        """
+        Дешифрование фрагмента в режиме CFB (полный блок)
 
-        for block in blocks:
-            encrypted_prev = self._encrypt_block(prev)
-            plain_block = bytes(a ^ b for a, b in zip(block, encrypted_prev))
-            plain_blocks.append(plain_block)
-            prev = block
+        P[i] = C[i] XOR E(C[i-1]): гамма для всего фрагмента получается
+        одним вызовом ECB над сдвинутым на блок шифртекстом.
+        """
+        self._check_chunk(data, final)
+        if not data:
+            return b''
 
-        return b''.join(plain_blocks)
\ No newline at end of file
+        last_block_start = (len(data) - 1) // self.BLOCK_SIZE * self.BLOCK_SIZE
+        shifted = self._state + data[:last_block_start]
+        plaintext = self._xor_bytes(data, self._cipher.encrypt(shifted))
+        self._state = bytes(data[last_block_start:])
+        return plaintext
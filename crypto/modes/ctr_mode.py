@@ -2,25 +2,102 @@ from .base_mode import BaseMode
 
 
 class CTRMode(BaseMode):
-    def encrypt(self, data: bytes) -> bytes:
-        """Шифрование в режиме CTR"""
-        blocks = self._split_into_blocks(data, pad=False)
-        cipher_blocks = []
+    # Сколько блоков счетчика шифруется одним вызовом ECB (1 МиБ гаммы)
+    BATCH_BLOCKS = 65536
 
-        for i, block in enumerate(blocks):
-            counter = self._increment_counter(self.iv, i)
-            encrypted_counter = self._encrypt_block(counter)
-            cipher_block = bytes(a ^ b for a, b in zip(block, encrypted_counter))
-            cipher_blocks.append(cipher_block)
+    _COUNTER_MODULUS = 2 ** 128
+    _template = None
 
-        return b''.join(cipher_blocks)
+    def reset(self):
+        """Сброс счетчика блоков к началу потока"""
+        self._block_index = 0
 
-    def decrypt(self, data: bytes) -> bytes:
-        """Дешифрование в режиме CTR (идентично шифрованию)"""
-        return self.encrypt(data)
+    def seek(self, block_index: int):
+        """Переход к произвольному блоку потока (блоки CTR независимы)"""
+        if block_index < 0:
+            raise ValueError("Block index must be non-negative")
+        self._block_index = block_index
+
+    def get_state(self) -> int:
+        """Состояние CTR - номер следующего блока потока"""
+        return self._block_index
+
+    def set_state(self, state: int):
+        """Восстановление номера следующего блока потока"""
+        self.seek(state)
+
+    def encrypt_chunk(self, data: bytes, final: bool = False) -> bytes:
+        """Шифрование фрагмента в режиме CTR"""
+        self._check_chunk(data, final)
+        view = memoryview(data)
+        batch_size = self.BATCH_BLOCKS * self.BLOCK_SIZE
+        result = []
+
+        for offset in range(0, len(view), batch_size):
+            part = view[offset:offset + batch_size]
+            block_count = -(-len(part) // self.BLOCK_SIZE)
+            keystream = self._keystream(self._block_index, block_count)
+            result.append(self._xor_bytes(part, keystream))
+            self._block_index += block_count
+
+        return b''.join(result)
+
+    def decrypt_chunk(self, data: bytes, final: bool = False) -> bytes:
+        """Дешифрование фрагмента в режиме CTR (идентично шифрованию)"""
+        return self.encrypt_chunk(data, final)
+
+    def _keystream(self, start_index: int, block_count: int) -> bytes:
+        """Гамма для блоков [start_index, start_index + block_count) одним вызовом ECB"""
+        return self._cipher.encrypt(self._counter_blocks(start_index, block_count))
+
+    def _counter_blocks(self, start_index: int, block_count: int) -> bytes:
+        """
+        Последовательные блоки счетчика одним буфером
+
+        Буфер из n блоков со значениями c, c+1, ..., c+n-1 - это число
+        c * (1, 1, ..., 1) + (0, 1, ..., n-1) в системе счисления 2^128,
+        поэтому он собирается целочисленной арифметикой без цикла по блокам.
+        При переполнении 2^128 (как в _increment_counter) буфер строится
+        из двух частей.
+        """
+        counter = (int.from_bytes(self.iv, byteorder='big') + start_index) \
+            % self._COUNTER_MODULUS
+
+        if counter + block_count > self._COUNTER_MODULUS:
+            run = self._COUNTER_MODULUS - counter
+            return (self._counter_blocks(start_index, run) +
+                    self._counter_blocks(start_index + run, block_count - run))
+
+        ones, offsets = CTRMode._counter_template(block_count)
+        return (counter * ones + offsets).to_bytes(
+            block_count * self.BLOCK_SIZE, byteorder='big'
+        )
+
+    @classmethod
+    def _counter_template(cls, block_count: int) -> tuple:
+        """Кэшируемые множители (1, ..., 1) и смещения (0, ..., n-1) для n блоков"""
+        template = cls._template
+        if template is None or template[0] < block_count:
+            size = max(block_count, cls.BATCH_BLOCKS)
+            ones = int.from_bytes(
+                (1).to_bytes(cls.BLOCK_SIZE, byteorder='big') * size, byteorder='big'
+            )
+            offsets = int.from_bytes(
+                b''.join(i.to_bytes(cls.BLOCK_SIZE, byteorder='big')
+                         for i in range(size)),
+                byteorder='big'
+            )
+            template = (size, ones, offsets)
+            cls._template = template
+
+        size, ones, offsets = template
+        if size == block_count:
+            return ones, offsets
+        shift = (size - block_count) * cls.BLOCK_SIZE * 8
+        return ones >> shift, offsets >> shift
 
     def _increment_counter(self, iv: bytes, increment: int) -> bytes:
         """Инкремент счетчика (big-endian)"""
         counter_int = int.from_bytes(iv, byteorder='big')
         counter_int = (counter_int + increment) % (2 ** 128)
-        return counter_int.to_bytes(16, byteorder='big')
\ No newline at end of file
+        return counter_int.to_bytes(16, byteorder='big')
@@ -0,0 +1,204 @@
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad, unpad
+from crypto.metrics import Metrics
+from .base_mode import BaseMode
+
+_pad = Metrics.timed('pad', 'cbc', pad)
+_unpad = Metrics.timed('pad', 'cbc', unpad)
+
+
+class _NativeMode(BaseMode):
+    """
+    Общая часть нативных режимов: объект pycryptodome живет между фрагментами
+
+    AES.new разворачивает ключ заново (около 10 мкс - как шифрование 4 КиБ),
+    а pycryptodome не умеет создать объект CBC/CFB/OFB/CTR из готового
+    расписания ключей. Поэтому объект режима сохраняется и сам продолжает
+    сцепление на следующем фрагменте потока, пока IV и состояние совпадают с
+    теми, на которых он остановился. После reset/set_state/set_iv, смены
+    направления или последнего фрагмента создается новый объект.
+    """
+
+    _engine = None
+    _engine_position = None
+
+    def _create_engine(self):
+        raise NotImplementedError
+
+    def _native(self, encrypt: bool = True):
+        """Объект pycryptodome для текущего состояния (сохраненный или новый)"""
+        position = (encrypt, self.iv, self.get_state())
+        if self._engine is None or self._engine_position != position:
+            self._engine = self._create_engine()
+        # До _keep_engine объект считается занятым: при исключении он не переиспользуется
+        self._engine_position = None
+        return self._engine
+
+    def _keep_engine(self, encrypt: bool, final: bool):
+        """Запомнить, на каком состоянии остановился объект (после обновления _state)"""
+        if final:
+            self._engine = None
+        else:
+            self._engine_position = (encrypt, self.iv, self.get_state())
+
+
+class NativeCBCMode(_NativeMode):
+    """
+    CBC на нативной реализации pycryptodome (AES.MODE_CBC)
+
+    Состояние сцепления совпадает с CBCMode (последний блок шифртекста),
+    поэтому фрагменты, get_state/set_state и параллельные диапазоны
+    взаимозаменяемы с эталонной реализацией.
+    """
+
+    def _create_engine(self):
+        return AES.new(self.key, AES.MODE_CBC, iv=self._state)
+
+    def encrypt_chunk(self, data: bytes, final: bool = False) -> bytes:
+        """Шифрование фрагмента в режиме CBC (PKCS7 паддинг только для последнего)"""
+        self._check_chunk(data, final)
+        if final:
+            data = _pad(bytes(data), self.BLOCK_SIZE)
+        if not data:
+            return b''
+
+        ciphertext = self._native(True).encrypt(data)
+        self._state = ciphertext[-self.BLOCK_SIZE:]
+        self._keep_engine(True, final)
+        return ciphertext
+
+    def decrypt_chunk(self, data: bytes, final: bool = False) -> bytes:
+        """Дешифрование фрагмента в режиме CBC (удаление паддинга в последнем)"""
+        if len(data) % self.BLOCK_SIZE != 0:
+            raise ValueError("Data length must be multiple of block size")
+
+        plaintext = b''
+        if data:
+            plaintext = self._native(False).decrypt(data)
+            self._state = bytes(data[-self.BLOCK_SIZE:])
+            self._keep_engine(False, final)
+
+        if final:
+            return _unpad(plaintext, self.BLOCK_SIZE)
+        return plaintext
+
+
+class NativeCFBMode(_NativeMode):
+    """CFB с сегментом 128 бит на нативной реализации (AES.MODE_CFB)"""
+
+    SEGMENT_SIZE = 128
+
+    def _create_engine(self):
+        return AES.new(self.key, AES.MODE_CFB, iv=self._state,
+                       segment_size=self.SEGMENT_SIZE)
+
+    def _last_block(self, data: bytes) -> bytes:
+        """Новое состояние, как в CFBMode: последний (возможно неполный) блок шифртекста"""
+        return bytes(data[(len(data) - 1) // self.BLOCK_SIZE * self.BLOCK_SIZE:])
+
+    def encrypt_chunk(self, data: bytes, final: bool = False) -> bytes:
+        """Шифрование фрагмента в режиме CFB (полный блок)"""
+        self._check_chunk(data, final)
+        if not data:
+            return b''
+
+        ciphertext = self._native(True).encrypt(data)
+        self._state = self._last_block(ciphertext)
+        self._keep_engine(True, final)
+        return ciphertext
+
+    def decrypt_chunk(self, data: bytes, final: bool = False) -> bytes:
+        """Дешифрование фрагмента в режиме CFB (полный блок)"""
+        self._check_chunk(data, final)
+        if not data:
+            return b''
+
+        plaintext = self._native(False).decrypt(data)
+        self._state = self._last_block(data)
+        self._keep_engine(False, final)
+        return plaintext
+
+
+class NativeOFBMode(_NativeMode):
+    """OFB на нативной реализации (AES.MODE_OFB)"""
+
+    def _create_engine(self):
+        return AES.new(self.key, AES.MODE_OFB, iv=self._state)
+
+    def encrypt_chunk(self, data: bytes, final: bool = False) -> bytes:
+        """Шифрование фрагмента в режиме OFB"""
+        self._check_chunk(data, final)
+        if not data:
+            return b''
+
+        result = self._native().encrypt(data)
+
+        # Состояние, как в OFBMode, - последний блок гаммы. Для полного
+        # блока это XOR входа и выхода, для неполного хвоста - E(предыдущий блок гаммы)
+        last_block_start = (len(data) - 1) // self.BLOCK_SIZE * self.BLOCK_SIZE
+        if len(data) - last_block_start == self.BLOCK_SIZE:
+            self._state = self._xor_bytes(data[last_block_start:],
+                                          result[last_block_start:])
+        else:
+            previous = self._state
+            if last_block_start:
+                previous = self._xor_bytes(
+                    data[last_block_start - self.BLOCK_SIZE:last_block_start],
+                    result[last_block_start - self.BLOCK_SIZE:last_block_start]
+                )
+            self._state = self._encrypt_block(previous)
+        self._keep_engine(True, final)
+        return result
+
+    def decrypt_chunk(self, data: bytes, final: bool = False) -> bytes:
+        """Дешифрование фрагмента в режиме OFB (идентично шифрованию)"""
+        return self.encrypt_chunk(data, final)
+
+
+class NativeCTRMode(_NativeMode):
+    """
+    CTR на нативной реализации (AES.MODE_CTR)
+
+    Весь 128-битный IV - big-endian счетчик (nonce=b''), как в
+    CTRMode._increment_counter. Состояние - номер следующего блока потока.
+    """
+
+    _COUNTER_MODULUS = 2 ** 128
+
+    def _create_engine(self):
+        counter = (int.from_bytes(self.iv, byteorder='big') + self._block_index) \
+            % self._COUNTER_MODULUS
+        return AES.new(self.key, AES.MODE_CTR, nonce=b'', initial_value=counter)
+
+    def reset(self):
+        """Сброс счетчика блоков к началу потока"""
+        self._block_index = 0
+
+    def seek(self, block_index: int):
+        """Переход к произвольному блоку потока (блоки CTR независимы)"""
+        if block_index < 0:
+            raise ValueError("Block index must be non-negative")
+        self._block_index = block_index
+
+    def get_state(self) -> int:
+        """Состояние CTR - номер следующего блока потока"""
+        return self._block_index
+
+    def set_state(self, state: int):
+        """Восстановление номера следующего блока потока"""
+        self.seek(state)
+
+    def encrypt_chunk(self, data: bytes, final: bool = False) -> bytes:
+        """Шифрование фрагмента в режиме CTR"""
+        self._check_chunk(data, final)
+        if not data:
+            return b''
+
+        result = self._native().encrypt(data)
+        self._block_index += -(-len(data) // self.BLOCK_SIZE)
+        self._keep_engine(True, final)
+        return result
+
+    def decrypt_chunk(self, data: bytes, final: bool = False) -> bytes:
+        """Дешифрование фрагмента в режиме CTR (идентично шифрованию)"""
+        return self.encrypt_chunk(data, final)
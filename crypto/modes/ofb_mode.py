@@ -2,19 +2,21 @@ from .base_mode import BaseMode
 
 
 class OFBMode(BaseMode):
-    def encrypt(self, data: bytes) -> bytes:
-        """Шифрование в режиме OFB"""
-        blocks = self._split_into_blocks(data, pad=False)
-        cipher_blocks = []
-        keystream_block = self.iv
+    def encrypt_chunk(self, data: bytes, final: bool = False) -> bytes:
+        """Шифрование фрагмента в режиме OFB"""
+        self._check_chunk(data, final)
+        block_count = -(-len(data) // self.BLOCK_SIZE)
+        keystream_blocks = []
+        keystream_block = self._state
 
-        for block in blocks:
+        for _ in range(block_count):
             keystream_block = self._encrypt_block(keystream_block)
-            cipher_block = bytes(a ^ b for a, b in zip(block, keystream_block))
-            cipher_blocks.append(cipher_block)
+            keystream_blocks.append(keystream_block)
 
-        return b''.join(cipher_blocks)
+        self._state = keystream_block
+        # Гамма для всего фрагмента накладывается одной операцией XOR
+        return self._xor_bytes(data, b''.join(keystream_blocks))
 
-    def decrypt(self, data: bytes) -> bytes:
-        """Дешифрование в режиме OFB (идентично шифрованию)"""
-        return self.encrypt(data)
\ No newline at end of file
+    def decrypt_chunk(self, data: bytes, final: bool = False) -> bytes:
+        """Дешифрование фрагмента в режиме OFB (идентично шифрованию)"""
+        return self.encrypt_chunk(data, final)
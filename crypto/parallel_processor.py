@@ -0,0 +1,197 @@
+import mmap
+import os
+import stat
+from crypto.cipher_core import CipherCore
+from crypto.crypto_logger import CryptoLogger
+from crypto.output_file import OutputFile
+from Crypto.Util.Padding import unpad
+
+
+def _process_range(mode: str, encrypt: bool, key: bytes, iv: bytes, state,
+                   input_path: str, output_path: str, in_offset: int,
+                   out_offset: int, length: int, chunk_size: int) -> int:
+    """
+    Обработка диапазона файла (выполняется в процессе пула)
+
+    Входной и выходной файлы отображаются в память, поэтому данные не
+    передаются между процессами. Состояние начала диапазона передается явно:
+    для CTR - номер блока (счетчик IV + i), для CBC/CFB при дешифровании -
+    предшествующий блок шифртекста. Паддинг CBC снимается вызывающей стороной.
+    """
+    cipher = CipherCore(key, mode, iv)
+    cipher.set_state(state)
+    transform = cipher.encrypt_chunk if encrypt else cipher.decrypt_chunk
+
+    with open(input_path, 'rb') as infile, open(output_path, 'r+b') as outfile:
+        with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as source, \
+                mmap.mmap(outfile.fileno(), 0, access=mmap.ACCESS_WRITE) as target:
+            if len(source) < in_offset + length:
+                raise ValueError("Input file shrank during processing")
+            if len(target) < out_offset + length:
+                raise ValueError("Output file is smaller than the range being written")
+            for position in range(0, length, chunk_size):
+                size = min(chunk_size, length - position)
+                start = in_offset + position
+                # Невыровненным может быть только хвост потока в CFB/CTR
+                final = size % CipherCore.BLOCK_SIZE != 0
+                target[out_offset + position:out_offset + position + size] = \
+                    transform(source[start:start + size], final)
+
+    return length
+
+
+class ParallelProcessor:
+    """
+    Многопроцессная обработка файлов
+
+    Шифрование распараллеливается только в CTR (блоки независимы).
+    Дешифрование CBC и CFB тоже параллельно: каждый блок открытого текста
+    зависит только от уже известного шифртекста.
+    """
+
+    ENCRYPT_MODES = ('ctr',)
+    DECRYPT_MODES = ('ctr', 'cbc', 'cfb')
+    MIN_RANGE_SIZE = 4 * 1024 * 1024  # меньшие диапазоны не окупают пул
+    RANGES_PER_JOB = 4  # несколько диапазонов на процесс для балансировки
+
+    @staticmethod
+    def supports(mode: str, encrypt: bool) -> bool:
+        """Поддерживает ли режим параллельную обработку операции"""
+        if encrypt:
+            return mode in ParallelProcessor.ENCRYPT_MODES
+        return mode in ParallelProcessor.DECRYPT_MODES
+
+    @staticmethod
+    def can_map(input_path: str, output_path: str) -> bool:
+        """
+        Можно ли отобразить вход и выход в память: вход - обычный файл,
+        выход - обычный файл или еще не создан (не устройство и не канал)
+        """
+        try:
+            if not stat.S_ISREG(os.stat(input_path).st_mode):
+                return False
+            return not os.path.exists(output_path) or \
+                stat.S_ISREG(os.stat(output_path).st_mode)
+        except OSError:
+            return False
+
+    @staticmethod
+    def split_ranges(total_size: int, jobs: int, chunk_size: int) -> list:
+        """
+        Разбиение потока на диапазоны (смещение, длина)
+
+        Границы диапазонов кратны chunk_size (а значит и размеру блока),
+        поэтому каждый диапазон начинается с границы блока.
+        """
+        target = -(-total_size // (jobs * ParallelProcessor.RANGES_PER_JOB))
+        range_size = max(target, ParallelProcessor.MIN_RANGE_SIZE, chunk_size)
+        range_size = -(-range_size // chunk_size) * chunk_size
+        return [(offset, min(range_size, total_size - offset))
+                for offset in range(0, total_size, range_size)]
+
+    @staticmethod
+    def process_file(input_path: str, output_path: str, key: bytes, mode: str,
+                     encrypt: bool, iv: bytes = None, jobs: int = None,
+                     chunk_size: int = 1024 * 1024, prefix: bytes = b'',
+                     data_offset: int = 0):
+        """
+        Параллельная обработка файла в пуле процессов
+
+        Результат побайтно совпадает с последовательной обработкой
+        FileProcessor: при шифровании IV записывается в начало файла,
+        при дешифровании читается из файла, если не передан явно.
+        prefix записывается перед IV (заголовок KDF), data_offset - число
+        байт заголовка, пропускаемых во входном файле.
+        """
+        if not ParallelProcessor.supports(mode, encrypt):
+            operation = "encryption" if encrypt else "decryption"
+            raise ValueError(
+                f"Parallel {operation} is not supported for mode: {mode}"
+            )
+
+        if not ParallelProcessor.can_map(input_path, output_path):
+            raise ValueError(
+                "Parallel processing needs a regular input file and a regular output file"
+            )
+        jobs = jobs or os.cpu_count() or 1
+        # Диапазоны строятся по размеру на момент начала: дописанное позже не обрабатывается
+        file_size = os.path.getsize(input_path)
+
+        if encrypt:
+            iv = CipherCore(key, mode).get_iv()
+            in_offset, header = 0, prefix + iv
+        elif iv is None:
+            with open(input_path, 'rb') as infile:
+                infile.seek(data_offset)
+                iv = infile.read(CipherCore.BLOCK_SIZE)
+            if len(iv) != CipherCore.BLOCK_SIZE:
+                raise ValueError(
+                    f"Invalid IV in file: expected 16 bytes, got {len(iv)}"
+                )
+            in_offset, header = data_offset + CipherCore.BLOCK_SIZE, b''
+        else:
+            in_offset, header = data_offset, b''
+
+        payload_size = file_size - in_offset
+        if mode == 'cbc' and (payload_size == 0 or
+                              payload_size % CipherCore.BLOCK_SIZE != 0):
+            raise ValueError("Data length must be multiple of block size")
+
+        # Выходной файл создается сразу нужного размера, процессы пишут в свои диапазоны
+        with open(output_path, 'wb') as outfile:
+            OutputFile.preallocate(outfile, len(header) + payload_size)
+            outfile.write(header)
+
+        ranges = ParallelProcessor.split_ranges(payload_size, jobs, chunk_size)
+        tasks = []
+        with open(input_path, 'rb') as infile:
+            for offset, length in ranges:
+                tasks.append((mode, encrypt, key, iv,
+                              ParallelProcessor._range_state(infile, mode, iv,
+                                                             in_offset, offset),
+                              input_path, output_path, in_offset + offset,
+                              len(header) + offset, length, chunk_size))
+
+        if len(tasks) <= 1 or jobs == 1:
+            for task in tasks:
+                _process_range(*task)
+        else:
+            # multiprocessing загружается только при параллельной обработке
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=min(jobs, len(tasks)),
+                                     initializer=CipherCore.init_worker,
+                                     initargs=(CipherCore.worker_state(mode),)) as pool:
+                futures = [pool.submit(_process_range, *task) for task in tasks]
+                for future in futures:
+                    future.result()
+
+        if mode == 'cbc':
+            payload_size = ParallelProcessor._strip_padding(output_path)
+
+        CryptoLogger.log(
+            f"Parallel {'encryption' if encrypt else 'decryption'}: "
+            f"{payload_size} bytes in {len(tasks)} ranges, {jobs} jobs "
+            f"(mode: {mode}, iv: {iv.hex()})",
+            False
+        )
+
+    @staticmethod
+    def _range_state(infile, mode: str, iv: bytes, in_offset: int, offset: int):
+        """Состояние начала диапазона: номер блока CTR или предыдущий блок шифртекста"""
+        if mode == 'ctr':
+            return offset // CipherCore.BLOCK_SIZE
+        if offset == 0:
+            return iv
+        infile.seek(in_offset + offset - CipherCore.BLOCK_SIZE)
+        return infile.read(CipherCore.BLOCK_SIZE)
+
+    @staticmethod
+    def _strip_padding(output_path: str) -> int:
+        """Снятие PKCS7 паддинга с расшифрованного файла, возвращает итоговый размер"""
+        with open(output_path, 'r+b') as outfile:
+            outfile.seek(-CipherCore.BLOCK_SIZE, os.SEEK_END)
+            last_block = outfile.read(CipherCore.BLOCK_SIZE)
+            size = outfile.tell() - CipherCore.BLOCK_SIZE + \
+                len(unpad(last_block, CipherCore.BLOCK_SIZE))
+            outfile.truncate(size)
+        return size
@@ -0,0 +1,203 @@
+"""
+Профилирование операций CLI (--profile)
+
+cProfile пишет файл pstats (snakeviz, python -m pstats), выборочный
+профилировщик - свернутые стеки (collapsed, для flamegraph.pl/speedscope).
+В обоих случаях печатаются самые затратные функции и распределение
+времени по модулям (crypto.modes.*, crypto.generator, crypto.key_generator,
+pycryptodome, стандартная библиотека). tracemalloc дополнительно
+сообщает пиковое потребление памяти и места выделения.
+"""
+
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+PROFILERS = ('cprofile', 'sample')
+SAMPLE_INTERVAL = 0.005  # секунды между снимками стека
+
+_PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_STDLIB = os.path.dirname(os.__file__)
+
+# Классы, которые удобнее видеть вместо имени модуля
+_MODULE_LABELS = {
+    'crypto.generator': 'crypto.generator (Generator)',
+    'crypto.key_generator': 'crypto.key_generator (KeyGenerator)',
+    'crypto.kdf': 'crypto.kdf (KeyDerivation)'
+}
+
+
+def module_of(filename: str) -> str:
+    """Модуль, к которому относится функция, по имени файла"""
+    if filename in ('~', '') or filename.startswith('<'):
+        return 'builtins'
+    path = os.path.abspath(filename)
+    if path.startswith(_PACKAGE_ROOT + os.sep):
+        relative = os.path.relpath(path, _PACKAGE_ROOT)
+        module = os.path.splitext(relative)[0].replace(os.sep, '.')
+        if module.endswith('.__init__'):
+            module = module[:-len('.__init__')]
+        return _MODULE_LABELS.get(module, module)
+    if f'{os.sep}Crypto{os.sep}' in path:
+        return 'Crypto (pycryptodome)'
+    if path.startswith(_STDLIB):
+        return 'stdlib'
+    return 'other'
+
+
+def _function_label(filename: str, line: int, name: str) -> str:
+    if filename in ('~', ''):
+        return name
+    return f"{module_of(filename)}:{name}:{line}"
+
+
+class _StackSampler:
+    """
+    Выборочный профилировщик на sys._current_frames
+
+    Фоновый поток каждые interval секунд снимает стек профилируемого
+    потока. Вызовы C (AES pycryptodome, hashlib) видны как время в
+    вызывающей их функции Python.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._worker = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                # Кадры самого профилировщика в стеки не попадают
+                if code.co_filename != __file__:
+                    stack.append(_function_label(code.co_filename,
+                                                 code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._worker.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._worker.join()
+
+    def write_collapsed(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+
+    def report(self, top: int, out):
+        total = sum(self.stacks.values())
+        if not total:
+            print("No samples collected (operation too short)", file=out)
+            return
+        own = Counter()
+        inclusive = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for module in {label.split(':', 1)[0] for label in stack}:
+                inclusive[module] += count
+
+        print(f"{total} samples, {self.interval * 1000:.0f} ms interval", file=out)
+        print(f"\n{'self %':>7}  function", file=out)
+        for label, count in own.most_common(top):
+            print(f"{count * 100 / total:7.1f}  {label}", file=out)
+        print(f"\n{'total %':>7}  module (inclusive)", file=out)
+        for module, count in inclusive.most_common(top):
+            print(f"{count * 100 / total:7.1f}  {module}", file=out)
+
+
+def _report_cprofile(profile: cProfile.Profile, top: int, out):
+    stats = pstats.Stats(profile, stream=out)
+    total = stats.total_tt or 1e-12
+    entries = []
+    by_module = Counter()
+    for (filename, line, name), (_, calls, own, cumulative, _) in stats.stats.items():
+        entries.append((own, cumulative, calls, _function_label(filename, line, name)))
+        by_module[module_of(filename)] += own
+
+    print(f"{stats.total_calls} calls, {total:.3f} s", file=out)
+    print(f"\n{'own s':>8} {'cum s':>8} {'calls':>9}  function", file=out)
+    for own, cumulative, calls, label in sorted(entries, reverse=True)[:top]:
+        print(f"{own:8.3f} {cumulative:8.3f} {calls:9d}  {label}", file=out)
+    print(f"\n{'own %':>7}  module", file=out)
+    for module, own in by_module.most_common(top):
+        print(f"{own * 100 / total:7.1f}  {module}", file=out)
+
+
+def _report_memory(snapshot, peak: int, top: int, out):
+    print(f"\nPeak traced memory: {peak / 1024 / 1024:.2f} MiB", file=out)
+    print("Largest allocation sites still alive:", file=out)
+    for stat in snapshot.statistics('lineno')[:top]:
+        frame = stat.traceback[0]
+        module = module_of(frame.filename)
+        if module in ('stdlib', 'other', 'Crypto (pycryptodome)'):
+            module = f"{module} {os.path.basename(frame.filename)}"
+        print(f"{stat.size / 1024:10.1f} KiB  {stat.count:7d} blocks  "
+              f"{module}:{frame.lineno}", file=out)
+
+
+def run(func, output_path: str, profiler: str = 'cprofile', top: int = 15,
+        memory: bool = False, out=None):
+    """
+    Выполнение func() под профилировщиком
+
+    Args:
+        func: профилируемая операция
+        output_path: файл pstats (cprofile) или свернутых стеков (sample)
+        profiler: 'cprofile' или 'sample'
+        top: число строк в отчетах
+        memory: дополнительно трассировать выделения памяти (tracemalloc
+                заметно замедляет работу, время в отчете завышено)
+        out: поток отчета (по умолчанию stderr)
+
+    Returns:
+        результат func(); отчет печатается и при исключении
+    """
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unsupported profiler: {profiler}. "
+                         f"Supported: {', '.join(PROFILERS)}")
+    out = out or sys.stderr
+
+    if memory:
+        tracemalloc.start()
+    profile = None
+    sampler = None
+    start = time.perf_counter()
+    try:
+        if profiler == 'cprofile':
+            profile = cProfile.Profile()
+            return profile.runcall(func)
+        sampler = _StackSampler()
+        with sampler:
+            return func()
+    finally:
+        elapsed = time.perf_counter() - start
+        if profile is not None:
+            profile.dump_stats(output_path)
+            print(f"\nProfile ({elapsed:.3f} s wall), pstats written to {output_path}",
+                  file=out)
+            _report_cprofile(profile, top, out)
+        elif sampler is not None:
+            sampler.write_collapsed(output_path)
+            print(f"\nProfile ({elapsed:.3f} s wall), collapsed stacks written to "
+                  f"{output_path}", file=out)
+            sampler.report(top, out)
+        if memory:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            _report_memory(snapshot, peak, top, out)
@@ -0,0 +1,260 @@
+import hashlib
+import hmac
+import json
+import os
+from crypto.authenticator import StreamAuthenticator
+from crypto.cipher_core import CipherCore
+from crypto.crypto_logger import CryptoLogger
+from crypto.kdf import KeyDerivation
+from crypto.metrics import Metrics
+
+
+class Checkpoint:
+    """
+    Файл контрольной точки рядом с результатом (<output>.ckpt, JSON)
+
+    Хранит смещения во входном и выходном файлах, состояние сцепления
+    режима (предыдущий блок или номер блока CTR), SHA-256 записанного
+    префикса результата и признаки входного файла (размер, mtime).
+    Ключ не сохраняется - только короткая проверочная метка HMAC.
+    """
+
+    VERSION = 1
+    SUFFIX = '.ckpt'
+    _KEY_CHECK_LABEL = b'CryptoCore checkpoint key check'
+
+    @staticmethod
+    def path_for(output_path: str) -> str:
+        return output_path + Checkpoint.SUFFIX
+
+    @staticmethod
+    def key_check(key: bytes) -> str:
+        return hmac.digest(key, Checkpoint._KEY_CHECK_LABEL, 'sha256')[:16].hex()
+
+    @staticmethod
+    def save(path: str, data: dict):
+        """Атомарная запись: временный файл, fsync, переименование, fsync каталога"""
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+        directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+    @staticmethod
+    def load(path: str) -> dict:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != Checkpoint.VERSION:
+            raise ValueError(f"Unsupported checkpoint version: {data.get('version')}")
+        return data
+
+    @staticmethod
+    def remove(path: str):
+        for stale in (path, path + '.tmp'):
+            if os.path.exists(stale):
+                os.remove(stale)
+
+    @staticmethod
+    def encode_state(state):
+        return state.hex() if isinstance(state, (bytes, bytearray)) else state
+
+    @staticmethod
+    def decode_state(state):
+        return bytes.fromhex(state) if isinstance(state, str) else state
+
+
+class ResumableEncryptor:
+    """
+    Шифрование с контрольными точками и продолжением после сбоя
+
+    Формат результата совпадает с обычным FileProcessor (заголовок KDF,
+    IV, шифртекст, тег --auth), а продолженный запуск дает файл, побайтно
+    совпадающий с непрерывным. Контрольная точка фиксируется только после
+    fsync выходного файла, поэтому все данные до output_offset на диске.
+    """
+
+    CHECKPOINT_INTERVAL = 64 * 1024 * 1024  # байт открытого текста между точками
+    _HASH_READ_SIZE = 4 * 1024 * 1024
+
+    @staticmethod
+    def _input_identity(input_path: str) -> dict:
+        file_stat = os.stat(input_path)
+        return {'input_size': file_stat.st_size, 'input_mtime_ns': file_stat.st_mtime_ns}
+
+    @staticmethod
+    def _validate(checkpoint: dict, input_path: str, mode: str, output_path: str,
+                  authenticate: bool):
+        """Совпадают ли вход, режим, --auth и выходной файл с сохраненной точкой"""
+        identity = ResumableEncryptor._input_identity(input_path)
+        if checkpoint['input_size'] != identity['input_size'] or \
+                checkpoint['input_mtime_ns'] != identity['input_mtime_ns']:
+            raise ValueError("Cannot resume: input file changed since the checkpoint")
+        if checkpoint['mode'] != mode:
+            raise ValueError(
+                f"Cannot resume: checkpoint was written for mode {checkpoint['mode']}"
+            )
+        if checkpoint['authenticated'] != authenticate:
+            raise ValueError(
+                "Cannot resume: checkpoint was written "
+                f"{'with' if checkpoint['authenticated'] else 'without'} --auth"
+            )
+        if not os.path.exists(output_path) or \
+                os.path.getsize(output_path) < checkpoint['output_offset']:
+            raise ValueError("Cannot resume: output is missing or shorter than checkpoint")
+
+    @staticmethod
+    def _rehash_prefix(outfile, length: int, authenticator):
+        """
+        SHA-256 (и MAC) уже записанного префикса результата
+
+        Состояние hashlib/hmac не сериализуется, поэтому при продолжении
+        префикс перечитывается: этот же проход проверяет его целостность
+        и восстанавливает хеш и MAC для дальнейшей записи.
+        """
+        digest = hashlib.sha256()
+        outfile.seek(0)
+        remaining = length
+        while remaining > 0:
+            data = outfile.read(min(ResumableEncryptor._HASH_READ_SIZE, remaining))
+            if not data:
+                break
+            digest.update(data)
+            if authenticator is not None:
+                authenticator.update(data)
+            remaining -= len(data)
+        return digest
+
+    @staticmethod
+    def encrypt_file(input_path: str, output_path: str, key: bytes, mode: str,
+                     chunk_size: int, header_prefix: bytes = b'',
+                     authenticate: bool = False, resume: bool = False,
+                     password: str = None,
+                     checkpoint_interval: int = CHECKPOINT_INTERVAL):
+        """
+        Шифрование с периодическими контрольными точками
+
+        Args:
+            header_prefix: заголовок KDF для нового запуска
+            resume: продолжить по контрольной точке, если она есть
+            password: при продолжении ключ восстанавливается по заголовку
+                      KDF в начале уже записанного результата
+            checkpoint_interval: объем открытого текста между точками
+        """
+        checkpoint_path = Checkpoint.path_for(output_path)
+        checkpoint = None
+        if resume and os.path.exists(checkpoint_path):
+            checkpoint = Checkpoint.load(checkpoint_path)
+            ResumableEncryptor._validate(checkpoint, input_path, mode, output_path,
+                                         authenticate)
+        elif resume:
+            CryptoLogger.log(
+                f"No checkpoint found at {checkpoint_path}, starting from the beginning",
+                False
+            )
+
+        if checkpoint is not None:
+            if password is not None:
+                with open(output_path, 'rb') as existing:
+                    key = KeyDerivation.recover(password, existing)
+            if checkpoint['key_check'] != Checkpoint.key_check(key):
+                raise ValueError("Cannot resume: key differs from the checkpoint")
+            chunk_size = checkpoint['chunk_size']
+            iv = bytes.fromhex(checkpoint['iv']) if checkpoint['iv'] else None
+            cipher = CipherCore(key, mode, iv)
+            cipher.set_state(Checkpoint.decode_state(checkpoint['state']))
+        else:
+            cipher = CipherCore(key, mode)
+
+        authenticator = StreamAuthenticator(key) if authenticate else None
+        transform = Metrics.timed('cipher', mode, cipher.encrypt_chunk)
+        if authenticator is not None:
+            transform = authenticator.wrap_encrypt(transform)
+
+        record = {
+            'version': Checkpoint.VERSION,
+            'input_path': os.path.abspath(input_path),
+            **ResumableEncryptor._input_identity(input_path),
+            'mode': mode,
+            'iv': cipher.get_iv().hex() if cipher.get_iv() else None,
+            'chunk_size': chunk_size,
+            'authenticated': authenticate,
+            'key_check': Checkpoint.key_check(key)
+        }
+        digest = hashlib.sha256()
+
+        with open(input_path, 'rb') as infile, \
+                open(output_path, 'r+b' if checkpoint else 'w+b') as outfile:
+            if checkpoint is not None:
+                # Незафиксированный хвост после последней точки отбрасывается
+                output_offset = checkpoint['output_offset']
+                outfile.truncate(output_offset)
+                digest = ResumableEncryptor._rehash_prefix(outfile, output_offset,
+                                                           authenticator)
+                if not hmac.compare_digest(digest.hexdigest(),
+                                           checkpoint['prefix_sha256']):
+                    raise ValueError("Cannot resume: output prefix does not match checkpoint")
+                outfile.seek(output_offset)
+                infile.seek(checkpoint['input_offset'])
+                CryptoLogger.log(
+                    f"Resuming encryption at input offset {checkpoint['input_offset']} "
+                    f"({checkpoint['input_offset'] * 100 // max(1, record['input_size'])}%)",
+                    False
+                )
+            else:
+                header = header_prefix + (cipher.get_iv() or b'')
+                outfile.write(header)
+                digest.update(header)
+                if authenticator is not None:
+                    authenticator.update(header)
+
+            def commit(input_offset: int):
+                outfile.flush()
+                os.fsync(outfile.fileno())
+                Checkpoint.save(checkpoint_path, {
+                    **record,
+                    'input_offset': input_offset,
+                    'output_offset': outfile.tell(),
+                    'state': Checkpoint.encode_state(cipher.get_state()),
+                    'prefix_sha256': digest.hexdigest()
+                })
+
+            if checkpoint is None:
+                commit(0)
+
+            read = Metrics.timed('read', mode, infile.read)
+            write = Metrics.timed('write', mode, outfile.write, count_argument=True)
+            since_commit = 0
+            chunk = read(chunk_size)
+            while True:
+                next_chunk = read(chunk_size)
+                final = not next_chunk
+                result = transform(chunk, final)
+                write(result)
+                digest.update(result)
+                if final:
+                    break
+
+                since_commit += len(chunk)
+                if since_commit >= checkpoint_interval:
+                    # next_chunk уже прочитан, но еще не зашифрован
+                    commit(infile.tell() - len(next_chunk))
+                    since_commit = 0
+                chunk = next_chunk
+
+            if authenticator is not None:
+                outfile.write(authenticator.finalize())
+            outfile.flush()
+            os.fsync(outfile.fileno())
+
+        Checkpoint.remove(checkpoint_path)
+        CryptoLogger.log(
+            f"Resumable encryption finished (mode: {mode}, checkpoint removed)",
+            False
+        )
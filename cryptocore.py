@@ -5,23 +5,29 @@ CryptoCore CLI Tool
 """
 
 import argparse
+import getpass
+import json
 import sys
 import os
 from pathlib import Path
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '.'))
 
-from crypto.file_processor import FileProcessor
+# Здесь только то, что нужно для разбора аргументов: обработчики файлов,
+# контейнер, пакетная обработка и метрики импортируются при использовании
+from crypto.cipher_core import CipherCore
 from crypto.crypto_logger import CryptoLogger
+from crypto.kdf import KeyDerivation
 
 
 class CryptoCoreCLI:
     """Класс для обработки командной строки CryptoCore с поддержкой новых режимов"""
 
     @staticmethod
-    def parse_arguments():
+    def parse_arguments(argv: list = None, prog: str = None):
         """Парсинг аргументов командной строки с поддержкой новых режимов"""
         parser = argparse.ArgumentParser(
+            prog=prog,
             description='CryptoCore - Cryptographic File Encryption/Decryption Tool',
             epilog='Examples:\n'
                    '  Encryption with CBC mode:\n'
@@ -32,7 +38,33 @@ class CryptoCoreCLI:
                    '    cryptocore --algorithm aes --mode cbc --decrypt \\\n'
                    '               --key 00112233445566778899aabbccddeeff \\\n'
                    '               --iv AABBCCDDEEFF00112233445566778899 \\\n'
-                   '               --input ciphertext.bin --output decrypted.txt',
+                   '               --input ciphertext.bin --output decrypted.txt\n\n'
+                   '  Encryption with a password (scrypt, calibrated to 250 ms):\n'
+                   '    cryptocore --algorithm aes --mode ctr --encrypt \\\n'
+                   '               --password - --kdf scrypt \\\n'
+                   '               --input plaintext.txt --output ciphertext.bin\n\n'
+                   '  Container with chunk index (decryption detects it, --mode optional):\n'
+                   '    cryptocore --algorithm aes --mode ctr --encrypt --container \\\n'
+                   '               --key 00112233445566778899aabbccddeeff \\\n'
+                   '               --input plaintext.txt --output ciphertext.cccf\n'
+                   '    cryptocore inspect ciphertext.cccf\n\n'
+                   '  Resumable encryption of a large file (rerun with --resume after a failure):\n'
+                   '    cryptocore --algorithm aes --mode ctr --encrypt --checkpoint \\\n'
+                   '               --key 00112233445566778899aabbccddeeff \\\n'
+                   '               --input disk.img --output disk.img.enc\n\n'
+                   '  Metrics for node_exporter textfile collector:\n'
+                   '    cryptocore --algorithm aes --mode ctr --encrypt --key ... \\\n'
+                   '               --input data/ --metrics /var/lib/node_exporter/cryptocore.prom\n\n'
+                   '  Profile a slow run (pstats + top functions by module):\n'
+                   '    cryptocore --algorithm aes --mode cbc --encrypt --key ... \\\n'
+                   '               --input big.bin --profile cryptocore.pstats\n\n'
+                   '  Thousands of jobs from a JSONL manifest in one process:\n'
+                   '    cryptocore run-manifest jobs.jsonl --concurrency 8 --results results.jsonl\n\n'
+                   '  Same operation through a running daemon (see cryptocore serve --help):\n'
+                   '    cryptocore client --algorithm aes --mode ctr --encrypt \\\n'
+                   '               --key @backup --input data.bin --output data.bin.enc\n\n'
+                   '  Throughput benchmark (see cryptocore bench --help):\n'
+                   '    cryptocore bench --json baseline.json',
             formatter_class=argparse.RawDescriptionHelpFormatter
         )
 
@@ -46,9 +78,9 @@ class CryptoCoreCLI:
 
         parser.add_argument(
             '--mode',
-            required=True,
             choices=['ecb', 'cbc', 'cfb', 'ofb', 'ctr'],
-            help='Encryption mode'
+            help='Encryption mode (optional when decrypting a container: '
+                 'the mode is read from its header)'
         )
 
         # Взаимоисключающие флаги операции
@@ -64,21 +96,66 @@ class CryptoCoreCLI:
             help='Perform decryption operation'
         )
 
-        parser.add_argument(
+        # Ключ задается явно или получается из пароля
+        key_group = parser.add_mutually_exclusive_group(required=True)
+        key_group.add_argument(
             '--key',
-            required=True,
             help='Encryption key as hexadecimal string (16, 24, or 32 bytes for AES)'
         )
+        key_group.add_argument(
+            '--password',
+            help='Derive the key from a password ("-" to prompt). The KDF, its '
+                 'parameters and the salt are stored in the file header'
+        )
+
+        parser.add_argument(
+            '--kdf',
+            default=KeyDerivation.DEFAULT_KDF,
+            choices=list(KeyDerivation.KDF_IDS),
+            help='Password KDF for encryption (default: pbkdf2-sha256). '
+                 'Decryption reads the KDF from the file header'
+        )
+
+        parser.add_argument(
+            '--kdf-target-ms',
+            type=float,
+            default=KeyDerivation.TARGET_LATENCY * 1000,
+            help='Calibrate KDF cost to this derivation time on the current '
+                 'machine (default: 250)'
+        )
+
+        parser.add_argument(
+            '--key-size',
+            type=int,
+            default=128,
+            choices=[128, 192, 256],
+            help='Size in bits of the key derived from --password (default: 128)'
+        )
 
         parser.add_argument(
             '--input',
             required=True,
-            help='Path to input file'
+            help='Path to input file or directory (directories are processed recursively)'
         )
 
         parser.add_argument(
             '--output',
-            help='Path to output file (default: generated based on operation)'
+            help='Path to output file or directory (default: generated based on operation)'
+        )
+
+        parser.add_argument(
+            '--include',
+            action='append',
+            metavar='GLOB',
+            help='Directory input: process only files matching the glob '
+                 '(relative path or file name, may be repeated)'
+        )
+
+        parser.add_argument(
+            '--exclude',
+            action='append',
+            metavar='GLOB',
+            help='Directory input: skip files matching the glob (may be repeated)'
         )
 
         parser.add_argument(
@@ -86,7 +163,135 @@ class CryptoCoreCLI:
             help='Initialization vector as hexadecimal string (for decryption only)'
         )
 
-        return parser.parse_args()
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Streaming chunk size in bytes, multiple of 16 (default: 1 MiB). '
+                 'Bounds peak memory usage regardless of file size'
+        )
+
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=1,
+            help='Number of worker processes for modes with independent blocks '
+                 '(ctr; also cbc/cfb decryption). Output is identical to the '
+                 'single-process run. For directory input: number of files '
+                 'processed in parallel'
+        )
+
+        parser.add_argument(
+            '--auth',
+            action='store_true',
+            help='Authenticated encryption (encrypt-then-MAC): an HMAC-SHA256 tag '
+                 'over header, IV and ciphertext is computed in the same pass and '
+                 'appended. On decryption the tag is verified before the output '
+                 'file is created. Must be given for both operations'
+        )
+
+        parser.add_argument(
+            '--container',
+            action='store_true',
+            help='Write a self-describing container (header with mode, key size, '
+                 'IV, chunk size and KDF parameters; independently encrypted '
+                 'chunks; trailing chunk index). Containers are detected '
+                 'automatically on decryption, raw IV + ciphertext files still work'
+        )
+
+        parser.add_argument(
+            '--checkpoint',
+            action='store_true',
+            help='Resumable encryption: periodically fsync the output and a '
+                 '<output>.ckpt sidecar (offsets, chaining state, hash of the '
+                 'written prefix). On failure the partial output is kept'
+        )
+
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Continue an interrupted --checkpoint encryption from its last '
+                 'checkpoint (same input, key or password and mode). The result '
+                 'is identical to an uninterrupted run. Implies --checkpoint'
+        )
+
+        parser.add_argument(
+            '--checkpoint-interval',
+            type=int,
+            metavar='MIB',
+            help='Plaintext MiB between checkpoints (default: 64)'
+        )
+
+        parser.add_argument(
+            '--fsync',
+            action='store_true',
+            help='fsync the output before it atomically replaces --output '
+                 '(outputs are always written to a temporary file in the same '
+                 'directory and renamed on success)'
+        )
+
+        parser.add_argument(
+            '--backend',
+            default=CipherCore.DEFAULT_BACKEND,
+            choices=list(CipherCore.BACKENDS),
+            help='Cipher mode implementation: native (pycryptodome), reference '
+                 '(pure Python crypto.modes) or auto (native after a one-time '
+                 'differential self-check; default)'
+        )
+
+        parser.add_argument(
+            '--metrics',
+            metavar='PATH',
+            help='Write per-stage metrics (read, cipher, pad, write, kdf, rng: '
+                 'time, bytes, call histograms; per-file histograms) after the '
+                 'operation. *.prom gives a Prometheus textfile for '
+                 'node_exporter, other paths or - give JSON'
+        )
+
+        parser.add_argument(
+            '--metrics-format',
+            choices=['json', 'prometheus'],
+            help='Metrics format (default: by --metrics extension)'
+        )
+
+        parser.add_argument(
+            '--profile',
+            metavar='PATH',
+            help='Run the operation under a profiler, write pstats (cprofile) or '
+                 'collapsed stacks (sample) to PATH and print the top functions '
+                 'and time per module to stderr'
+        )
+
+        parser.add_argument(
+            '--profiler',
+            choices=['cprofile', 'sample'],
+            default='cprofile',
+            help='cprofile: deterministic, every call (default); sample: stack '
+                 'sampling every 5 ms, low overhead, flamegraph-ready output'
+        )
+
+        parser.add_argument(
+            '--profile-top',
+            type=int,
+            default=15,
+            metavar='N',
+            help='Rows in the profile report (default: %(default)s)'
+        )
+
+        parser.add_argument(
+            '--profile-memory',
+            action='store_true',
+            help='Also trace allocations with tracemalloc and report the peak '
+                 '(slows the operation down noticeably)'
+        )
+
+        parser.add_argument(
+            '--no-mmap',
+            action='store_true',
+            help='Disable memory-mapped I/O and always use buffered streaming reads'
+        )
+
+        return parser.parse_args(argv)
 
     @staticmethod
     def validate_hex_key(key_str: str) -> bytes:
@@ -141,6 +346,37 @@ class CryptoCoreCLI:
         except ValueError as e:
             raise ValueError(f"Invalid hex IV: {e}")
 
+    @staticmethod
+    def read_password(password: str) -> str:
+        """
+        Пароль из аргумента или интерактивный ввод для "-"
+        """
+        if password == '-':
+            password = getpass.getpass('Password: ')
+        if not password:
+            raise ValueError("Password must not be empty")
+        return password
+
+    @staticmethod
+    def kdf_options(args, password: str) -> dict:
+        """
+        Параметры получения ключа из пароля для FileProcessor/BatchProcessor
+        """
+        if password is None:
+            return {}
+
+        kdf_params = None
+        if args.encrypt:
+            kdf_params = KeyDerivation.calibrate(args.kdf, args.kdf_target_ms / 1000)
+            print(f"KDF: {args.kdf}, parameters: {kdf_params} "
+                  f"(calibrated to {args.kdf_target_ms:.0f} ms)")
+        return {
+            'password': password,
+            'kdf': args.kdf,
+            'kdf_params': kdf_params,
+            'key_length': args.key_size // 8
+        }
+
     @staticmethod
     def generate_default_output_path(input_path: str, encrypt: bool, mode: str) -> str:
         """
@@ -159,14 +395,71 @@ class CryptoCoreCLI:
 
         return str(input_path.with_name(input_path.stem + suffix))
 
+    @staticmethod
+    def process_directory(args, key_bytes: bytes, iv_bytes: bytes,
+                          kdf_options: dict = None) -> bool:
+        """
+        Пакетная обработка каталога с выводом сводки
+        """
+        from crypto.batch_processor import BatchProcessor
+        summary = BatchProcessor.process_directory(
+            input_dir=args.input,
+            output_dir=args.output,
+            key=key_bytes,
+            mode=args.mode,
+            encrypt=args.encrypt,
+            iv=iv_bytes,
+            include=args.include,
+            exclude=args.exclude,
+            jobs=args.jobs,
+            chunk_size=args.chunk_size,
+            authenticate=args.auth,
+            container=args.container,
+            sync=args.fsync,
+            **(kdf_options or {})
+        )
+
+        print(f"Batch summary: {summary['succeeded']}/{summary['files']} files, "
+              f"{summary['bytes']} bytes in {summary['elapsed']:.2f} s "
+              f"({summary['throughput_mbps']:.2f} Mbps)")
+        print(f"Output directory: {summary['output_dir']}")
+        for path, error in summary['failures']:
+            print(f"Failed: {path}: {error}", file=sys.stderr)
+
+        return summary['failed'] == 0
+
+    @staticmethod
+    def inspect(paths: list) -> bool:
+        """
+        Вывод заголовка и индекса контейнеров в JSON (без ключа и расшифровки)
+        """
+        from crypto.container import Container
+        success = True
+        for path in paths:
+            if not Container.is_container(path):
+                print(f"Error: {path} is not a container "
+                      f"(raw IV + ciphertext files carry no metadata)", file=sys.stderr)
+                success = False
+                continue
+            print(json.dumps(Container.inspect(path), indent=2))
+        return success
+
     @staticmethod
     def process_operation(args):
         """
         Обработка криптографической операции с поддержкой новых режимов
         """
+        from crypto.container import Container
+        from crypto.file_processor import FileProcessor
+
         try:
-            # Валидация ключа
-            key_bytes = CryptoCoreCLI.validate_hex_key(args.key)
+            # Валидация ключа или пароля
+            key_bytes = None
+            password = None
+            if args.password is not None:
+                password = CryptoCoreCLI.read_password(args.password)
+            else:
+                key_bytes = CryptoCoreCLI.validate_hex_key(args.key)
 
             # Валидация IV
             iv_bytes = None
@@ -177,6 +470,31 @@ class CryptoCoreCLI:
                 else:
                     iv_bytes = CryptoCoreCLI.validate_hex_iv(args.iv)
 
+            if args.mode is None and (args.encrypt or (
+                    os.path.isfile(args.input) and
+                    not Container.is_container(args.input))):
+                raise ValueError("--mode is required (only containers record their mode)")
+
+            # Выбор реализации режимов наследуется процессами пула
+            CipherCore.DEFAULT_BACKEND = args.backend
+
+            if args.jobs < 1:
+                raise ValueError("Number of jobs must be at least 1")
+
+            if args.kdf_target_ms <= 0:
+                raise ValueError("KDF target time must be positive")
+
+            if args.checkpoint_interval is not None and args.checkpoint_interval < 1:
+                raise ValueError("Checkpoint interval must be at least 1 MiB")
+
+            kdf_options = CryptoCoreCLI.kdf_options(args, password)
+
+            if os.path.isdir(args.input):
+                if args.checkpoint or args.resume:
+                    raise ValueError("--checkpoint/--resume apply to a single file")
+                return CryptoCoreCLI.process_directory(args, key_bytes, iv_bytes,
+                                                       kdf_options)
+
             # Генерация выходного файла если не указан
             output_path = args.output
             if not output_path:
@@ -200,11 +518,26 @@ class CryptoCoreCLI:
                 key=key_bytes,
                 mode=args.mode,
                 encrypt=args.encrypt,
-                iv=iv_bytes
+                iv=iv_bytes,
+                chunk_size=args.chunk_size,
+                jobs=args.jobs,
+                use_mmap=not args.no_mmap,
+                authenticate=args.auth,
+                container=args.container,
+                checkpoint=args.checkpoint,
+                resume=args.resume,
+                checkpoint_interval=(args.checkpoint_interval * 1024 * 1024
+                                     if args.checkpoint_interval else None),
+                sync=args.fsync,
+                **kdf_options
             )
 
             print(f"Operation successful: {args.input} -> {output_path}")
-            print(f"Mode: {args.mode}, Key: {args.key}")
+            if password is not None:
+                print(f"Mode: {args.mode or 'from container'}, "
+                      f"Key: derived from password")
+            else:
+                print(f"Mode: {args.mode or 'from container'}, Key: {args.key}")
             if iv_bytes and args.decrypt:
                 print(f"IV used: {iv_bytes.hex()}")
 
@@ -214,13 +547,171 @@ class CryptoCoreCLI:
             print(f"Error: {e}", file=sys.stderr)
             return False
 
+        finally:
+            if args.metrics:
+                CryptoCoreCLI.write_metrics(args.metrics, args.metrics_format)
+
+    @staticmethod
+    def process_remote(args, socket_path: str) -> bool:
+        """
+        Та же операция через демон cryptocore serve
+
+        --key @NAME ссылается на ключ, загруженный демоном (--key-file);
+        --input - передает stdin в кадре и пишет результат в --output или stdout.
+        """
+        from crypto import daemon
+
+        try:
+            if args.profile or args.metrics:
+                print("Warning: --profile/--metrics are ignored in client mode "
+                      "(see cryptocore client --stats)", file=sys.stderr)
+
+            header = {
+                'op': 'encrypt' if args.encrypt else 'decrypt',
+                'mode': args.mode,
+                'chunk_size': args.chunk_size,
+                'jobs': args.jobs,
+                'mmap': not args.no_mmap,
+                'auth': args.auth,
+                'container': args.container,
+                'checkpoint': args.checkpoint,
+                'resume': args.resume,
+                'checkpoint_interval': args.checkpoint_interval,
+                'fsync': args.fsync
+            }
+            if args.password is not None:
+                header.update({
+                    'password': CryptoCoreCLI.read_password(args.password),
+                    'kdf': args.kdf,
+                    'kdf_target_ms': args.kdf_target_ms,
+                    'key_length': args.key_size // 8
+                })
+            elif args.key.startswith('@'):
+                header['key_ref'] = args.key[1:]
+            else:
+                header['key'] = CryptoCoreCLI.validate_hex_key(args.key).hex()
+
+            if args.iv:
+                if args.encrypt:
+                    print("Warning: IV provided for encryption will be ignored",
+                          file=sys.stderr)
+                else:
+                    header['iv'] = CryptoCoreCLI.validate_hex_iv(args.iv).hex()
+
+            payload = b''
+            output_path = args.output
+            if args.input == '-':
+                payload = sys.stdin.buffer.read()
+            else:
+                if os.path.isdir(args.input):
+                    raise ValueError("Directories are processed without the daemon")
+                if not os.path.exists(args.input):
+                    raise FileNotFoundError(f"Input file not found: {args.input}")
+                if not output_path:
+                    output_path = CryptoCoreCLI.generate_default_output_path(
+                        args.input, args.encrypt, args.mode
+                    )
+                    print(f"Output file not specified. Using default: {output_path}")
+                header['input'] = os.path.abspath(args.input)
+                header['output'] = os.path.abspath(output_path)
+
+            try:
+                response, data = daemon.request(socket_path, header, payload)
+            except OSError as e:
+                raise ConnectionError(f"cannot reach daemon at {socket_path}: {e}")
+            if not response.get('ok'):
+                raise ValueError(response.get('error', 'request failed'))
+
+            if args.input == '-':
+                if output_path and output_path != '-':
+                    with open(output_path, 'wb') as f:
+                        f.write(data)
+                else:
+                    sys.stdout.buffer.write(data)
+                    sys.stdout.buffer.flush()
+                    return True
+                print(f"Operation successful: stdin -> {output_path}", file=sys.stderr)
+            else:
+                print(f"Operation successful: {args.input} -> {output_path}")
+            print(f"Daemon latency: {response['latency_ms']:.1f} ms "
+                  f"(queue depth {response['queue_depth']})", file=sys.stderr)
+            return True
+
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return False
+
+    @staticmethod
+    def client(argv: list) -> bool:
+        """
+        `cryptocore client`: флаги обычного CLI плюс --socket, либо --stats/--shutdown
+        """
+        from crypto import daemon
+
+        parser = argparse.ArgumentParser(prog='cryptocore client', add_help=False)
+        parser.add_argument('--socket', default=daemon.default_socket_path())
+        parser.add_argument('--stats', action='store_true')
+        parser.add_argument('--shutdown', action='store_true')
+        options, rest = parser.parse_known_args(argv)
+
+        if options.stats or options.shutdown:
+            try:
+                response, _ = daemon.request(
+                    options.socket, {'op': 'stats' if options.stats else 'shutdown'}
+                )
+            except OSError as e:
+                print(f"Error: cannot reach daemon at {options.socket}: {e}",
+                      file=sys.stderr)
+                return False
+            if options.stats:
+                print(json.dumps(response['stats'], indent=2))
+            return response.get('ok', False)
+
+        args = CryptoCoreCLI.parse_arguments(
+            rest, 'cryptocore client [--socket PATH] [--stats | --shutdown]'
+        )
+        return CryptoCoreCLI.process_remote(args, options.socket)
+
+    @staticmethod
+    def write_metrics(path: str, fmt: str = None):
+        """Выгрузка метрик операции (ошибка выгрузки не меняет результат операции)"""
+        from crypto.metrics import Metrics
+        try:
+            Metrics.write(path, fmt)
+        except (OSError, ValueError) as e:
+            print(f"Warning: cannot write metrics to {path}: {e}", file=sys.stderr)
+
 
 def main():
     """Главная функция CLI"""
+    if len(sys.argv) > 1 and sys.argv[1] == 'bench':
+        from crypto.benchmark import bench_main
+        sys.exit(bench_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == 'inspect':
+        if len(sys.argv) < 3:
+            print("Usage: cryptocore inspect FILE [FILE ...]", file=sys.stderr)
+            sys.exit(2)
+        sys.exit(0 if CryptoCoreCLI.inspect(sys.argv[2:]) else 1)
+    if len(sys.argv) > 1 and sys.argv[1] == 'run-manifest':
+        from crypto.manifest import manifest_main
+        sys.exit(manifest_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        from crypto.daemon import serve_main
+        sys.exit(serve_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == 'client':
+        CryptoLogger.setup_logging()
+        sys.exit(0 if CryptoCoreCLI.client(sys.argv[2:]) else 1)
+
     try:
         CryptoLogger.setup_logging()
         args = CryptoCoreCLI.parse_arguments()
-        success = CryptoCoreCLI.process_operation(args)
+        if args.profile:
+            from crypto import profiler
+            success = profiler.run(lambda: CryptoCoreCLI.process_operation(args),
+                                   args.profile, args.profiler, args.profile_top,
+                                   args.profile_memory)
+        else:
+            success = CryptoCoreCLI.process_operation(args)
         sys.exit(0 if success else 1)
 
     except KeyboardInterrupt:
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from crypto import differential
+
+
+class _Python38Random(random.Random):
+    """Random без randbytes, как в Python 3.7/3.8"""
+
+    def randbytes(self, n):
+        raise AttributeError('randbytes')
+
+
+@pytest.mark.parametrize('mode', list(differential.MODE_PAIRS))
+def test_native_modes_match_reference(mode):
+    result = differential.run((mode,), trials=40, max_length=2048, seed=1)
+    assert result['failures'] == []
+
+
+def test_random_case_without_randbytes():
+    rng = _Python38Random(7)
+    for mode in differential.MODE_PAIRS:
+        for _ in range(20):
+            key, iv, data, splits = differential._random_case(rng, mode, 256)
+            assert len(key) in (16, 24, 32)
+            assert len(iv) == differential.BLOCK_SIZE
+            assert sum(splits) == len(data)
+
+
+def test_random_case_is_reproducible():
+    first = differential._random_case(random.Random(3), 'ctr', 1024)
+    second = differential._random_case(random.Random(3), 'ctr', 1024)
+    assert first == second
+
+
+def test_check_case_reports_mismatch(monkeypatch):
+    reference_class, native_class = differential.MODE_PAIRS['ctr']
+
+    class Broken(native_class):
+        def encrypt(self, data):
+            return bytes(len(data) + 1)
+
+    monkeypatch.setitem(differential.MODE_PAIRS, 'ctr', (reference_class, Broken))
+    problems = differential.check_case('ctr', bytes(16), bytes(16), b'data', [4])
+    assert 'encrypt' in problems
+
+
+@pytest.mark.parametrize('mode', list(differential.MODE_PAIRS))
+def test_known_answers(mode):
+    reference_class, native_class = differential.MODE_PAIRS[mode]
+    assert differential.known_answers_match(mode)
+    assert differential.known_answers_match(mode, reference_class)
+
+
+def test_known_answers_detect_mismatch():
+    reference_class, native_class = differential.MODE_PAIRS['cbc']
+
+    class Broken(native_class):
+        def encrypt_chunk(self, data, final=False):
+            result = super().encrypt_chunk(data, final)
+            return result[:-1] + bytes([result[-1] ^ 1])
+
+    assert not differential.known_answers_match('cbc', Broken)
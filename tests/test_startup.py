@@ -0,0 +1,14 @@
+import os
+
+from crypto import benchmark
+
+# Как --startup-budget-scale у cryptocore bench --startup: запас для медленных машин CI
+BUDGET_SCALE = float(os.environ.get('CRYPTOCORE_STARTUP_BUDGET_SCALE', '1'))
+
+
+def test_import_time_within_budget():
+    rows = benchmark.measure_startup(repeat=3, budget_scale=BUDGET_SCALE)
+    assert [row['module'] for row in rows] == list(benchmark.STARTUP_BUDGETS_MS)
+    over = {row['module']: round(row['median_ms'], 1)
+            for row in rows if row['over_budget']}
+    assert not over, f"import time over budget (ms): {over}"